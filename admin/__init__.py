@@ -2,10 +2,14 @@ from superapp.apps.email.admin.email_address import EmailAddressAdmin
 from superapp.apps.email.admin.email import EmailAdmin
 from superapp.apps.email.admin.contact import ContactAdmin
 from superapp.apps.email.admin.thread import ThreadAdmin
+from superapp.apps.email.admin.sync_state import FolderSyncStateAdmin
+from superapp.apps.email.admin.attachment import AttachmentAdmin
 
 __all__ = [
     'EmailAddressAdmin',
     'EmailAdmin',
     'ContactAdmin',
     'ThreadAdmin',
+    'FolderSyncStateAdmin',
+    'AttachmentAdmin',
 ]
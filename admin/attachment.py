@@ -0,0 +1,24 @@
+from django.contrib import admin
+from superapp.apps.admin_portal.admin import SuperAppModelAdmin
+from superapp.apps.admin_portal.sites import superapp_admin_site
+from superapp.apps.email.models import Attachment
+
+
+@admin.register(Attachment, site=superapp_admin_site)
+class AttachmentAdmin(SuperAppModelAdmin):
+    list_display = ['filename', 'content_type', 'size', 'email', 'created_at']
+    list_filter = ['content_type']
+    search_fields = ['filename', 'sha256', 'email__subject']
+    readonly_fields = ['created_at', 'updated_at', 'size', 'sha256', 'blob']
+    autocomplete_fields = ['email']
+    fieldsets = (
+        (None, {
+            'fields': ('email', 'filename', 'content_type', 'content_id')
+        }),
+        ('Content', {
+            'fields': ('size', 'sha256', 'blob')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at')
+        }),
+    )
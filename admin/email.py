@@ -1,17 +1,21 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
 from django.utils.html import format_html
 from superapp.apps.admin_portal.admin import SuperAppModelAdmin
 from superapp.apps.admin_portal.sites import superapp_admin_site
 from superapp.apps.email.models import Email
+from superapp.apps.email.tasks import load_email_bodies
 
 
 @admin.register(Email, site=superapp_admin_site)
 class EmailAdmin(SuperAppModelAdmin):
     list_display = ['subject', 'from_email', 'direction', 'status', 'created_at']
-    list_filter = ['direction', 'status']
+    list_filter = ['direction', 'status', 'body_status', 'is_read', 'is_flagged', 'is_deleted']
     search_fields = ['subject', 'from_email', 'from_name', 'to_emails']
     readonly_fields = ['created_at', 'updated_at', 'sent_at', 'delivered_at', 'message_id', 
-                      'in_reply_to', 'references', 'raw_message', 'body_text', 'html_preview']
+                      'in_reply_to', 'references', 'raw_message', 'body_text', 'html_preview',
+                      'body_status', 'size', 'imap_folder', 'imap_uid', 'flags', 'raw_blob',
+                      'snippet', 'charset', 'language', 'processed_at']
     autocomplete_fields = ['email_address', 'contact', 'thread']
     fieldsets = (
         (None, {
@@ -21,23 +25,42 @@ class EmailAdmin(SuperAppModelAdmin):
             'fields': ('from_email', 'from_name', 'to_emails', 'cc_emails', 'bcc_emails', 'contact')
         }),
         ('Content', {
-            'fields': ('subject', 'body_html', 'html_preview', 'attachments')
+            'fields': ('subject', 'snippet', 'body_status', 'body_html', 'html_preview', 'attachments')
+        }),
+        ('Flags', {
+            'fields': ('is_read', 'is_answered', 'is_flagged', 'is_deleted', 'flags')
         }),
         ('Metadata', {
-            'fields': ('message_id', 'in_reply_to', 'references', 'headers', 'metadata')
+            'fields': ('message_id', 'in_reply_to', 'references', 'headers', 'metadata',
+                       'size', 'charset', 'language', 'imap_folder', 'imap_uid')
         }),
         ('Timestamps', {
-            'fields': ('created_at', 'updated_at', 'sent_at', 'delivered_at')
+            'fields': ('created_at', 'updated_at', 'sent_at', 'delivered_at', 'processed_at')
         }),
         ('Error Information', {
             'fields': ('error_code', 'error_message')
         }),
         ('Raw Data', {
-            'fields': ('raw_message',),
+            'fields': ('raw_blob', 'raw_message'),
             'classes': ('collapse',)
         }),
     )
     
+    def get_object(self, request, object_id, from_field=None):
+        """Queue the body download of emails synced headers-first when they are opened"""
+        obj = super().get_object(request, object_id, from_field)
+        if obj is not None and obj.body_status == 'pending':
+            # Fetching from the IMAP server here would hold up the page
+            email_ids = [str(obj.id)]
+            transaction.on_commit(lambda: load_email_bodies.delay(email_ids))
+            if request.method == 'GET':
+                self.message_user(
+                    request,
+                    "The body of this email is being downloaded, reload the page shortly",
+                    messages.INFO
+                )
+        return obj
+    
     def html_preview(self, obj):
         """Display HTML preview with proper styling"""
         if not obj.body_html:
@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django import forms
 
@@ -6,6 +6,8 @@ from superapp.apps.admin_portal.admin import SuperAppModelAdmin
 from superapp.apps.admin_portal.sites import superapp_admin_site
 from superapp.apps.admin_portal.widgets import PasswordToggleWidget
 from superapp.apps.email.models import EmailAddress
+from superapp.apps.email.services.imap_pool import connection_pool
+from superapp.apps.email.tasks import sync_email_account
 
 
 class EmailAddressForm(forms.ModelForm):
@@ -25,6 +27,7 @@ class EmailAddressAdmin(SuperAppModelAdmin):
     list_filter = ['is_active', 'smtp_connection_type', 'imap_connection_type']
     search_fields = ['email', 'name', 'smtp_server']
     readonly_fields = ['created_at', 'updated_at', 'aws_ses_help_text',]
+    actions = ['sync_now', 'test_imap_connection']
     fieldsets = (
         (None, {
             'fields': ('email', 'name', 'is_active')
@@ -34,7 +37,7 @@ class EmailAddressAdmin(SuperAppModelAdmin):
         }),
         ('IMAP Configuration', {
             'fields': ('imap_connection_type', 'imap_server', 'imap_port', 'imap_username', 'imap_password', 
-                      'use_idle', 'idle_folder')
+                      'use_idle', 'idle_folder', 'sync_folders')
         }),
         ('AWS SES Setup Guide', {
             'fields': ('aws_ses_help_text',),
@@ -46,6 +49,33 @@ class EmailAddressAdmin(SuperAppModelAdmin):
         }),
     )
     
+    @admin.action(description='Sync now')
+    def sync_now(self, request, queryset):
+        """
+        Queue a sync of every folder of the selected accounts
+        
+        A first sync can take longer than a web request may, so it runs as a task.
+        """
+        for email_address in queryset:
+            try:
+                sync_email_account.delay(str(email_address.id), all_folders=True)
+                self.message_user(request, f"Queued a sync of {email_address.email}")
+            except Exception as e:
+                self.message_user(request, f"Error queueing a sync of {email_address.email}: {str(e)}", messages.ERROR)
+    
+    @admin.action(description='Test IMAP connection')
+    def test_imap_connection(self, request, queryset):
+        """
+        Borrow a pooled connection with INBOX selected for every selected account
+        """
+        for email_address in queryset:
+            try:
+                with connection_pool.connection(email_address, folder='INBOX') as client:
+                    client.noop()
+                self.message_user(request, f"IMAP connection for {email_address.email} works")
+            except Exception as e:
+                self.message_user(request, f"IMAP connection for {email_address.email} failed: {str(e)}", messages.ERROR)
+    
     def aws_ses_help_text(self, obj):
         """
         Display help text for AWS SES setup with Tailwind CSS styling that works in both light and dark modes
@@ -0,0 +1,32 @@
+from django.contrib import admin
+from superapp.apps.admin_portal.admin import SuperAppModelAdmin
+from superapp.apps.admin_portal.sites import superapp_admin_site
+from superapp.apps.email.models import FolderSyncState
+
+
+@admin.register(FolderSyncState, site=superapp_admin_site)
+class FolderSyncStateAdmin(SuperAppModelAdmin):
+    list_display = ['email_address', 'folder', 'special_use', 'last_uid', 'poll_interval', 'last_synced_at', 'next_sync_at']
+    search_fields = ['email_address__email', 'folder']
+    readonly_fields = ['created_at', 'updated_at', 'last_synced_at']
+    autocomplete_fields = ['email_address']
+    fieldsets = (
+        (None, {
+            'fields': ('email_address', 'folder', 'special_use')
+        }),
+        ('Checkpoint', {
+            'fields': ('uid_validity', 'last_uid', 'highest_modseq', 'failed_uids', 'last_synced_at')
+        }),
+        ('Schedule', {
+            'fields': ('poll_interval', 'next_sync_at')
+        }),
+        ('Backfill', {
+            'fields': (
+                'backfill_uid', 'backfill_total', 'backfill_done',
+                'backfill_started_at', 'backfill_completed_at', 'backfill_lease_until', 'backfill_lease_owner'
+            )
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at')
+        }),
+    )
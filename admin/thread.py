@@ -9,7 +9,7 @@ class ThreadAdmin(SuperAppModelAdmin):
     list_display = ['subject', 'email_address', 'contact', 'is_active', 'is_archived', 'last_message_at', 'created_at']
     list_filter = ['is_active', 'is_archived']
     search_fields = ['subject', 'participants']
-    readonly_fields = ['created_at', 'updated_at', 'last_message_at']
+    readonly_fields = ['created_at', 'updated_at', 'last_message_at', 'subject_hash']
     autocomplete_fields = ['email_address', 'contact']
     fieldsets = (
         (None, {
@@ -19,7 +19,7 @@ class ThreadAdmin(SuperAppModelAdmin):
             'fields': ('participants',)
         }),
         ('Metadata', {
-            'fields': ('metadata',)
+            'fields': ('subject_hash', 'metadata')
         }),
         ('Timestamps', {
             'fields': ('last_message_at', 'created_at', 'updated_at')
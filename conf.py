@@ -0,0 +1,105 @@
+from django.conf import settings
+
+
+DEFAULTS = {
+    # Number of messages requested per UID FETCH command while syncing
+    'EMAIL_SYNC_FETCH_BATCH_SIZE': 200,
+    # Fetch only headers, structure and size during sync and download bodies later
+    'EMAIL_SYNC_HEADERS_FIRST': False,
+    # Bytes requested per partial FETCH, smaller messages are downloaded and parsed in one piece
+    'EMAIL_SYNC_STREAM_CHUNK_SIZE': 1024 * 1024,
+    # Bytes of a streamed MIME part kept in memory before it spills to a temporary file
+    'EMAIL_SYNC_SPOOL_MAX_MEMORY': 1024 * 1024,
+    # Bytes downloaded at most per message, larger messages are stored truncated
+    'EMAIL_SYNC_MAX_MESSAGE_SIZE': 50 * 1024 * 1024,
+    # Bytes decoded at most per text or HTML body part
+    'EMAIL_SYNC_MAX_BODY_SIZE': 5 * 1024 * 1024,
+    # Alias in STORAGES of the backend holding raw messages (None = MEDIA_ROOT/email/raw on the filesystem)
+    'EMAIL_RAW_MESSAGE_STORAGE': None,
+    # Compression of newly stored raw messages: 'gzip' or 'zstd' (requires zstandard)
+    'EMAIL_RAW_MESSAGE_COMPRESSION': 'gzip',
+    # Alias in STORAGES of the backend holding attachments (None = MEDIA_ROOT/email/attachments on the filesystem)
+    'EMAIL_ATTACHMENT_STORAGE': None,
+    # Converter used by html_to_text: 'htmlparser', 'beautifulsoup' or the dotted path of a callable
+    'EMAIL_HTML_TO_TEXT_BACKEND': 'htmlparser',
+    # Converted HTML bodies memoized by each process (0 = no in-process memoization)
+    'EMAIL_HTML_TO_TEXT_LRU_SIZE': 256,
+    # Alias in CACHES sharing converted HTML bodies between processes (None = not shared)
+    'EMAIL_HTML_TO_TEXT_CACHE': None,
+    # Number of emails handled by one post-processing task
+    'EMAIL_POSTPROCESS_BATCH_SIZE': 100,
+    # Unprocessed emails the periodic sweep catches up on in one pass
+    'EMAIL_POSTPROCESS_SWEEP_LIMIT': 5000,
+    # Seconds a new email is left to its own post-processing task before the sweep takes it
+    'EMAIL_POSTPROCESS_SWEEP_DELAY': 600,
+    # Characters kept in the snippet shown in email lists (at most 255)
+    'EMAIL_SNIPPET_LENGTH': 200,
+    # Message-IDs whose thread each process remembers (0 = always ask the database)
+    'EMAIL_THREADING_CACHE_SIZE': 10000,
+    # Thread replies without References or In-Reply-To by normalized subject and participants
+    'EMAIL_THREADING_SUBJECT_FALLBACK': False,
+    # Seconds since the last message of a thread during which replies are matched by subject
+    'EMAIL_THREADING_SUBJECT_WINDOW': 14 * 24 * 3600,
+    # Email addresses whose contact each process remembers (0 = always ask the database)
+    'EMAIL_CONTACT_CACHE_SIZE': 10000,
+    # Leave the history of newly found folders to the backfill, the sync only imports new messages.
+    # Disabled, the first sync of a folder imports its whole history in one unbounded pass
+    'EMAIL_SYNC_BACKFILL_HISTORY': True,
+    # Messages the backfill fetches and checkpoints at once
+    'EMAIL_BACKFILL_CHUNK_SIZE': 200,
+    # Upper bound in messages per second for each backfill worker (0 = unlimited)
+    'EMAIL_BACKFILL_MAX_RATE': 20,
+    # Seconds a periodic backfill pass runs before it stops at the next checkpoint
+    'EMAIL_BACKFILL_TIME_LIMIT': 240,
+    # Worker processes parsing fetched messages (0 = parse in the syncing process)
+    'EMAIL_SYNC_PARSE_WORKERS': 0,
+    # Number of accounts synced in parallel by sync_all_accounts (1 = one by one)
+    'EMAIL_SYNC_MAX_WORKERS': 1,
+    # Maximum number of accounts of the same IMAP server synced at once
+    'EMAIL_SYNC_MAX_CONNECTIONS_PER_HOST': 4,
+    # Time budget in seconds for syncing one account in a concurrent pass
+    'EMAIL_SYNC_ACCOUNT_TIMEOUT': 240,
+    # Socket timeout in seconds for IMAP connections used by the sync
+    'EMAIL_SYNC_SOCKET_TIMEOUT': 60,
+    # Engine used by the periodic sync task: 'blocking' or 'asyncio'
+    'EMAIL_SYNC_ENGINE': 'blocking',
+    # Number of accounts the asyncio engine syncs at once
+    'EMAIL_SYNC_ASYNC_MAX_CONCURRENCY': 100,
+    # Poll interval in seconds of busy folders, INBOX is always synced at this rate
+    'EMAIL_SYNC_FOLDER_MIN_INTERVAL': 240,
+    # Upper bound in seconds for the backed off poll interval of quiet folders
+    'EMAIL_SYNC_FOLDER_MAX_INTERVAL': 6 * 3600,
+    # Threads of the IDLE supervisor parsing new mail, shared by all monitored accounts
+    'EMAIL_IDLE_SYNC_WORKERS': 4,
+    # Seconds an IDLE command runs before it is renewed, below the 30 minute server limit
+    'EMAIL_IDLE_RENEW_INTERVAL': 29 * 60,
+    # Seconds after a fetch on an IDLE connection during which announcements are collected into one fetch, 0 fetches each at once
+    'EMAIL_IDLE_DEBOUNCE': 2,
+    # Seconds between heartbeats of an idle_sync worker, which also rebalance the accounts between workers
+    'EMAIL_IDLE_HEARTBEAT_INTERVAL': 5,
+    # Seconds after the last heartbeat before other idle_sync workers take over a worker's accounts
+    'EMAIL_IDLE_LEASE_DURATION': 20,
+    # Announce saved and deleted email addresses to idle_sync workers with PostgreSQL LISTEN/NOTIFY
+    'EMAIL_IDLE_PUSH_CHANGES': True,
+    # Logged-in IMAP connections kept per account by each worker process (0 = no pooling)
+    'EMAIL_IMAP_POOL_MAX_IDLE_PER_ACCOUNT': 2,
+    # Seconds a pooled connection may stay unused before it is closed
+    'EMAIL_IMAP_POOL_IDLE_TIMEOUT': 900,
+    # Seconds after which a pooled connection is closed regardless of use
+    'EMAIL_IMAP_POOL_MAX_LIFETIME': 3600,
+    # Seconds a pooled connection may stay unused before it is checked with NOOP
+    'EMAIL_IMAP_POOL_HEALTH_CHECK_AFTER': 30,
+}
+
+
+def get_setting(name):
+    """
+    Read an email app setting, falling back to the app default
+    
+    Args:
+        name: Name of the setting
+        
+    Returns:
+        The project override if present, otherwise the default value
+    """
+    return getattr(settings, name, DEFAULTS[name])
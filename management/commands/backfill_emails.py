@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from superapp.apps.email.services.backfill import EmailBackfillService
+
+
+class Command(BaseCommand):
+    help = 'Import the history of email accounts newest first in resumable chunks'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email-address-id',
+            type=str,
+            help='UUID of the email address to backfill (optional)'
+        )
+        parser.add_argument(
+            '--start',
+            action='store_true',
+            help='Hand the history of folders that were never synced to the backfill first'
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Only report the progress and ETA of every backfill'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Messages fetched and checkpointed at once (defaults to EMAIL_BACKFILL_CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--max-rate',
+            type=float,
+            help='Upper bound in messages per second, 0 for unlimited (defaults to EMAIL_BACKFILL_MAX_RATE)'
+        )
+        parser.add_argument(
+            '--time-limit',
+            type=int,
+            default=0,
+            help='Seconds to run before stopping at the next checkpoint, 0 runs until done'
+        )
+    
+    def handle(self, *args, **options):
+        service = EmailBackfillService(
+            email_address_id=options.get('email_address_id'),
+            chunk_size=options.get('chunk_size'),
+            max_rate=options.get('max_rate'),
+            time_limit=options['time_limit'],
+            progress_callback=lambda progress: self.stdout.write(str(progress))
+        )
+        
+        if not options.get('status'):
+            self.stdout.write("Backfilling email history...")
+            service.backfill_all_accounts(start=options.get('start', False))
+        
+        progress = service.get_progress()
+        if not progress:
+            self.stdout.write("No backfills found")
+            return
+        
+        for folder_progress in progress:
+            self.stdout.write(str(folder_progress))
+        
+        if all(folder_progress.completed for folder_progress in progress):
+            self.stdout.write(self.style.SUCCESS("All backfills are completed"))
+        else:
+            self.stdout.write(self.style.WARNING("Backfills are still pending, run the command again to continue"))
@@ -0,0 +1,114 @@
+import email
+import os
+import statistics
+import time
+from email import policy
+from django.core.management.base import BaseCommand, CommandError
+from superapp.apps.email.models import Email
+from superapp.apps.email.services.html_text import BACKENDS, get_backend
+
+
+class Command(BaseCommand):
+    help = 'Compare the speed and output of the html_to_text backends'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            type=str,
+            help='Directory of .html or .eml files to use as corpus (default: stored HTML bodies)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=200,
+            help='Number of stored HTML bodies used when no path is given'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of times each document is converted by each backend'
+        )
+        parser.add_argument(
+            '--backend',
+            action='append',
+            dest='backends',
+            help='Backend to benchmark, may be repeated (default: all built-in backends)'
+        )
+    
+    def handle(self, *args, **options):
+        corpus = self.load_corpus(options.get('path'), options['limit'])
+        if not corpus:
+            raise CommandError("No HTML documents found")
+        
+        backends = options.get('backends') or list(BACKENDS)
+        repeat = max(1, options['repeat'])
+        total_size = sum(len(html) for html in corpus)
+        
+        self.stdout.write(f"Converting {len(corpus)} documents ({total_size} characters) {repeat} times...")
+        
+        # Outputs are compared against the tree based reference converter
+        reference = [get_backend('beautifulsoup')(html) for html in corpus]
+        
+        for name in backends:
+            convert = get_backend(name)
+            timings = []
+            mismatches = 0
+            
+            for html, expected in zip(corpus, reference):
+                best = None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    text = convert(html)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                timings.append(best)
+                if text != expected:
+                    mismatches += 1
+            
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f"{name}: total {sum(timings) * 1000:.1f} ms, "
+                f"mean {statistics.mean(timings) * 1000:.2f} ms, "
+                f"p95 {p95 * 1000:.2f} ms, "
+                f"max {timings[-1] * 1000:.2f} ms, "
+                f"{mismatches} mismatches"
+            )
+        
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
+    
+    def load_corpus(self, path, limit):
+        """
+        Collect the HTML documents to convert
+        
+        Args:
+            path: Directory of .html, .htm or .eml files, or None for stored emails
+            limit: Number of stored emails used when no path is given
+            
+        Returns:
+            List of HTML strings
+        """
+        if not path:
+            bodies = Email.objects.exclude(body_html='').order_by('-created_at').values_list('body_html', flat=True)
+            return list(bodies[:limit])
+        
+        if not os.path.isdir(path):
+            raise CommandError(f"{path} is not a directory")
+        
+        corpus = []
+        for filename in sorted(os.listdir(path)):
+            file_path = os.path.join(path, filename)
+            extension = os.path.splitext(filename)[1].lower()
+            
+            if extension in ('.html', '.htm'):
+                with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                    corpus.append(f.read())
+            elif extension == '.eml':
+                with open(file_path, 'rb') as f:
+                    msg = email.message_from_binary_file(f, policy=policy.default)
+                body = msg.get_body(preferencelist=('html',))
+                if body is not None:
+                    corpus.append(body.get_content())
+        
+        return corpus
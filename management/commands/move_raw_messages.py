@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from superapp.apps.email.models import Email
+from superapp.apps.email.services.blobs import raw_message_store
+
+
+class Command(BaseCommand):
+    help = 'Move raw messages stored on email rows into the raw message store'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of emails moved per transaction'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Maximum number of emails to move (optional)'
+        )
+    
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        limit = options.get('limit')
+        
+        pending = Email.objects.filter(raw_blob='').exclude(legacy_raw_message='').order_by('pk')
+        moved = 0
+        last_pk = None
+        
+        self.stdout.write("Moving raw messages into the raw message store...")
+        
+        while limit is None or moved < limit:
+            size = batch_size if limit is None else min(batch_size, limit - moved)
+            
+            # Keyset pagination keeps each batch query cheap on large tables
+            batch = pending if last_pk is None else pending.filter(pk__gt=last_pk)
+            emails = list(batch.only('pk', 'raw_blob', 'legacy_raw_message')[:size])
+            if not emails:
+                break
+            
+            now = timezone.now()
+            for email_obj in emails:
+                email_obj.raw_blob = raw_message_store.save(email_obj.legacy_raw_message)
+                email_obj.legacy_raw_message = ''
+                email_obj.updated_at = now
+            
+            Email.objects.bulk_update(emails, ['raw_blob', 'legacy_raw_message', 'updated_at'])
+            
+            moved += len(emails)
+            last_pk = emails[-1].pk
+            self.stdout.write(f"Moved {moved} raw messages")
+        
+        self.stdout.write(self.style.SUCCESS(f"Successfully moved {moved} raw messages"))
@@ -1,21 +1,43 @@
+import asyncio
 from django.core.management.base import BaseCommand
 from superapp.apps.email.services.sync import EmailSyncService
+from superapp.apps.email.services.async_sync import AsyncEmailSyncService
 from superapp.apps.email.models import EmailAddress
 
 
 class Command(BaseCommand):
     help = 'Synchronize emails from IMAP servers'
-
+    
     def add_arguments(self, parser):
         parser.add_argument(
             '--email-address-id',
             type=str,
             help='UUID of the email address to sync (optional)'
         )
-
+        parser.add_argument(
+            '--async',
+            action='store_true',
+            dest='use_async',
+            help='Sync all accounts concurrently on a single asyncio event loop'
+        )
+        parser.add_argument(
+            '--all-folders',
+            action='store_true',
+            help='Sync every folder, including quiet folders whose next poll is not due yet'
+        )
+    
     def handle(self, *args, **options):
         email_address_id = options.get('email_address_id')
         
+        if options.get('use_async'):
+            self.stdout.write("Syncing emails with the asyncio engine...")
+            asyncio.run(AsyncEmailSyncService(
+                email_address_id=email_address_id,
+                all_folders=options.get('all_folders', False)
+            ).sync_all_accounts())
+            self.stdout.write(self.style.SUCCESS("Successfully synced emails"))
+            return
+        
         if email_address_id:
             try:
                 email_address = EmailAddress.objects.get(id=email_address_id)
@@ -23,7 +45,8 @@ class Command(BaseCommand):
                 service = EmailSyncService(
                     email_address_id=email_address_id,
                     force_tls=options.get('force_tls', False),
-                    force_ssl=options.get('force_ssl', False)
+                    force_ssl=options.get('force_ssl', False),
+                    all_folders=options.get('all_folders', False)
                 )
                 service.sync_all_accounts()
                 self.stdout.write(self.style.SUCCESS(f"Successfully synced emails for {email_address.email}"))
@@ -31,6 +54,6 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR(f"Email address with ID {email_address_id} does not exist"))
         else:
             self.stdout.write("Syncing emails for all active email addresses...")
-            service = EmailSyncService()
+            service = EmailSyncService(all_folders=options.get('all_folders', False))
             service.sync_all_accounts()
             self.stdout.write(self.style.SUCCESS("Successfully synced emails for all active email addresses"))
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.8 on 2026-10-17 03:23
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0004_emailaddress_idle_folder_emailaddress_use_idle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FolderSyncState',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('folder', models.CharField(default='INBOX', max_length=255, verbose_name='folder')),
+                ('uid_validity', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='UIDVALIDITY')),
+                ('last_uid', models.PositiveBigIntegerField(default=0, verbose_name='last synced UID')),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True, verbose_name='last synced at')),
+                ('email_address', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_states', to='email.emailaddress', verbose_name='email address')),
+            ],
+            options={
+                'verbose_name': 'folder sync state',
+                'verbose_name_plural': 'folder sync states',
+                'ordering': ['email_address', 'folder'],
+                'constraints': [models.UniqueConstraint(fields=('email_address', 'folder'), name='email_foldersyncstate_unique_folder')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.8 on 2026-10-17 03:25
+
+import logging
+from django.db import migrations, models
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+# Fields of a removed copy that fill in the kept copy where it has none
+MERGED_FIELDS = [
+    'thread_id', 'contact_id', 'body_text', 'body_html', 'raw_message',
+    'attachments', 'headers', 'in_reply_to', 'references'
+]
+
+
+def remove_duplicate_message_ids(apps, schema_editor):
+    """
+    Merge messages imported more than once per account into their oldest copy
+    
+    The oldest copy takes the thread, contact and content of the other
+    copies where it has none, the other copies are then deleted. No other
+    table references emails at this point.
+    """
+    Email = apps.get_model('email', 'Email')
+    
+    duplicates = (
+        Email.objects.exclude(message_id='')
+        .values('email_address_id', 'message_id')
+        .annotate(copies=Count('id'))
+        .filter(copies__gt=1)
+    )
+    
+    removed = 0
+    for duplicate in duplicates.iterator():
+        keep, *others = Email.objects.filter(
+            email_address_id=duplicate['email_address_id'],
+            message_id=duplicate['message_id']
+        ).order_by('created_at')
+        
+        values = {}
+        for name in MERGED_FIELDS:
+            if getattr(keep, name):
+                continue
+            value = next((getattr(other, name) for other in others if getattr(other, name)), None)
+            if value:
+                values[name] = value
+        
+        if values:
+            Email.objects.filter(id=keep.id).update(**values)
+        
+        Email.objects.filter(id__in=[other.id for other in others]).delete()
+        removed += len(others)
+    
+    if removed:
+        logger.warning(f"Merged and removed {removed} duplicate emails before adding the Message-ID constraint")
+
+
+def keep_merged_duplicates(apps, schema_editor):
+    """
+    Leave the merged emails in place, the removed copies cannot be restored
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0005_foldersyncstate'),
+    ]
+    
+    operations = [
+        migrations.RunPython(remove_duplicate_message_ids, keep_merged_duplicates),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(fields=['email_address', 'message_id'], name='email_email_message_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='email',
+            constraint=models.UniqueConstraint(condition=models.Q(('message_id', ''), _negated=True), fields=('email_address', 'message_id'), name='email_email_unique_message_id'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.8 on 2026-10-17 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0006_email_message_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='body_status',
+            field=models.CharField(choices=[('complete', 'Complete'), ('pending', 'Pending download')], default='complete', max_length=10, verbose_name='body status'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='imap_folder',
+            field=models.CharField(blank=True, max_length=255, verbose_name='IMAP folder'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='imap_uid',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='IMAP UID'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='size',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='size'),
+        ),
+        migrations.AddIndex(
+            model_name='email',
+            index=models.Index(fields=['email_address', 'imap_folder', 'imap_uid'], name='email_email_imap_uid_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.8 on 2026-10-17 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0007_email_headers_first'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='flags',
+            field=models.JSONField(blank=True, default=list, verbose_name='flags'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='is_answered',
+            field=models.BooleanField(default=False, verbose_name='answered'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='is_deleted',
+            field=models.BooleanField(default=False, verbose_name='deleted'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='is_flagged',
+            field=models.BooleanField(default=False, verbose_name='flagged'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='is_read',
+            field=models.BooleanField(default=False, verbose_name='read'),
+        ),
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='highest_modseq',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='highest MODSEQ'),
+        ),
+    ]
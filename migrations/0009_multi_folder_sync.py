@@ -0,0 +1,33 @@
+# Generated by Django 5.1.8 on 2026-10-17 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0008_email_flags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailaddress',
+            name='sync_folders',
+            field=models.JSONField(blank=True, default=list, help_text='IMAP folders to sync, leave empty to discover them with LIST (skips All Mail, Drafts, Junk and Trash)', verbose_name='sync folders'),
+        ),
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='next_sync_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='next sync at'),
+        ),
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='poll_interval',
+            field=models.PositiveIntegerField(default=0, help_text='Seconds', verbose_name='poll interval'),
+        ),
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='special_use',
+            field=models.CharField(blank=True, max_length=50, verbose_name='special use'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-17 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0009_multi_folder_sync'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='email',
+            name='body_status',
+            field=models.CharField(choices=[('complete', 'Complete'), ('pending', 'Pending download'), ('truncated', 'Truncated')], default='complete', max_length=10, verbose_name='body status'),
+        ),
+    ]
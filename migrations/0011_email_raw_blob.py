@@ -0,0 +1,32 @@
+# Generated by Django 5.1.8 on 2026-10-17 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0010_email_body_truncated'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='raw_blob',
+            field=models.CharField(blank=True, max_length=255, verbose_name='raw message blob'),
+        ),
+        # The column keeps its name, existing rows are moved by the move_raw_messages command
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='email',
+                    name='raw_message',
+                ),
+                migrations.AddField(
+                    model_name='email',
+                    name='legacy_raw_message',
+                    field=models.TextField(blank=True, db_column='raw_message', verbose_name='legacy raw message'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.8 on 2026-10-17 03:48
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0011_email_raw_blob'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='Attachment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('filename', models.CharField(blank=True, max_length=255, verbose_name='filename')),
+                ('content_type', models.CharField(default='application/octet-stream', max_length=255, verbose_name='content type')),
+                ('content_id', models.CharField(blank=True, max_length=255, verbose_name='content ID')),
+                ('size', models.PositiveBigIntegerField(default=0, verbose_name='size')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('blob', models.CharField(max_length=255, verbose_name='blob')),
+                ('email', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachment_files', to='email.email', verbose_name='email')),
+            ],
+            options={
+                'verbose_name': 'attachment',
+                'verbose_name_plural': 'attachments',
+                'ordering': ['email', 'created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.8 on 2026-10-17 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0012_attachment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='charset',
+            field=models.CharField(blank=True, max_length=40, verbose_name='charset'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='language',
+            field=models.CharField(blank=True, max_length=16, verbose_name='language'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='processed at'),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='snippet',
+            field=models.CharField(blank=True, max_length=255, verbose_name='snippet'),
+        ),
+    ]
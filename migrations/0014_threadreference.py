@@ -0,0 +1,67 @@
+# Generated by Django 5.1.8 on 2026-10-17 04:00
+
+import django.db.models.deletion
+import re
+import uuid
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def index_thread_references(apps, schema_editor):
+    """
+    Index the Message-IDs of stored emails and of the messages they reference
+    """
+    Email = apps.get_model('email', 'Email')
+    ThreadReference = apps.get_model('email', 'ThreadReference')
+    
+    emails = Email.objects.filter(thread__isnull=False).order_by('created_at').values_list(
+        'email_address_id', 'thread_id', 'message_id', 'in_reply_to', 'references'
+    )
+    
+    # Stored messages are indexed first, so their own thread wins over threads merely referencing them
+    for own_ids in (True, False):
+        batch = []
+        for email_address_id, thread_id, message_id, in_reply_to, references in emails.iterator():
+            if own_ids:
+                message_ids = [message_id] if message_id else []
+            else:
+                message_ids = re.findall(r'<[^>]+>', f"{in_reply_to} {references}")
+            
+            batch.extend(
+                ThreadReference(email_address_id=email_address_id, message_id=reference_id[:255], thread_id=thread_id)
+                for reference_id in message_ids
+            )
+            if len(batch) >= BATCH_SIZE:
+                ThreadReference.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        
+        ThreadReference.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0013_email_postprocess'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='ThreadReference',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('message_id', models.CharField(max_length=255, verbose_name='message ID')),
+                ('email_address', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thread_references', to='email.emailaddress', verbose_name='email address')),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_references', to='email.thread', verbose_name='thread')),
+            ],
+            options={
+                'verbose_name': 'thread reference',
+                'verbose_name_plural': 'thread references',
+                'ordering': ['email_address', 'message_id'],
+                'constraints': [models.UniqueConstraint(fields=('email_address', 'message_id'), name='email_threadreference_unique_message_id')],
+            },
+        ),
+        migrations.RunPython(index_thread_references, migrations.RunPython.noop),
+    ]
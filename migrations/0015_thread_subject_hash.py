@@ -0,0 +1,58 @@
+# Generated by Django 5.1.8 on 2026-10-17 04:03
+
+import hashlib
+import re
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Copy of superapp.apps.email.utils.SUBJECT_PREFIX_RE as of this migration
+SUBJECT_PREFIX_RE = re.compile(
+    r'^\s*(?:(?:re|fw|fwd|aw|wg|sv|vs|antw|doorst|tr|rif|r|enc|odp|res|rv)\s*(?:\[\d+\]|\(\d+\))?\s*[:\uff1a]\s*)+',
+    re.IGNORECASE
+)
+
+
+def subject_hash(subject):
+    """
+    Hash of the normalized subject, frozen copy of superapp.apps.email.utils.subject_hash
+    """
+    subject = SUBJECT_PREFIX_RE.sub('', subject or '')
+    return hashlib.sha256(' '.join(subject.split()).casefold().encode('utf-8')).hexdigest()
+
+
+def hash_thread_subjects(apps, schema_editor):
+    """
+    Store the normalized subject hash of existing threads
+    """
+    Thread = apps.get_model('email', 'Thread')
+    
+    batch = []
+    for thread in Thread.objects.only('id', 'subject').iterator():
+        thread.subject_hash = subject_hash(thread.subject)
+        batch.append(thread)
+        if len(batch) >= BATCH_SIZE:
+            Thread.objects.bulk_update(batch, ['subject_hash'])
+            batch = []
+    
+    Thread.objects.bulk_update(batch, ['subject_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0014_threadreference'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='subject_hash',
+            field=models.CharField(blank=True, max_length=64, verbose_name='subject hash'),
+        ),
+        migrations.RunPython(hash_thread_subjects, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['email_address', 'subject_hash', 'last_message_at'], name='email_thread_subject_hash_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.8 on 2026-10-17 05:12
+
+from collections import defaultdict
+from django.db import migrations
+
+
+def normalize_contact_emails(apps, schema_editor):
+    """
+    Merge contacts whose addresses only differ in case and store addresses lowercase
+    
+    The oldest contact of each address is kept, emails and threads of the
+    others are moved to it.
+    """
+    Contact = apps.get_model('email', 'Contact')
+    Email = apps.get_model('email', 'Email')
+    Thread = apps.get_model('email', 'Thread')
+    
+    contacts = defaultdict(list)
+    for contact in Contact.objects.only('id', 'email', 'name', 'created_at').order_by('created_at').iterator():
+        contacts[contact.email.strip().lower()].append(contact)
+    
+    for email, duplicates in contacts.items():
+        keep, others = duplicates[0], duplicates[1:]
+        
+        if others:
+            other_ids = [contact.id for contact in others]
+            Email.objects.filter(contact_id__in=other_ids).update(contact_id=keep.id)
+            Thread.objects.filter(contact_id__in=other_ids).update(contact_id=keep.id)
+            Contact.objects.filter(id__in=other_ids).delete()
+        
+        name = keep.name or next((contact.name for contact in others if contact.name), '')
+        if keep.email != email or keep.name != name:
+            Contact.objects.filter(id=keep.id).update(email=email, name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0015_thread_subject_hash'),
+    ]
+    
+    operations = [
+        migrations.RunPython(normalize_contact_emails, migrations.RunPython.noop),
+    ]
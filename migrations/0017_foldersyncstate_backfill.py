@@ -0,0 +1,43 @@
+# Generated by Django 5.1.8 on 2026-10-17 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0016_normalize_contact_emails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='backfill_completed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='backfill completed at'),
+        ),
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='backfill_done',
+            field=models.PositiveIntegerField(default=0, verbose_name='backfill done'),
+        ),
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='backfill_lease_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='backfill lease until'),
+        ),
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='backfill_started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='backfill started at'),
+        ),
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='backfill_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='backfill total'),
+        ),
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='backfill_uid',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='backfill UID'),
+        ),
+    ]
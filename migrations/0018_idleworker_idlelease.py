@@ -0,0 +1,46 @@
+# Generated by Django 5.1.8 on 2026-10-17 04:18
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0017_foldersyncstate_backfill'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='IdleWorker',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('name', models.CharField(max_length=255, verbose_name='name')),
+                ('heartbeat_at', models.DateTimeField(db_index=True, verbose_name='heartbeat at')),
+            ],
+            options={
+                'verbose_name': 'IDLE worker',
+                'verbose_name_plural': 'IDLE workers',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='IdleLease',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='expires at')),
+                ('email_address', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='idle_lease', to='email.emailaddress', verbose_name='email address')),
+                ('worker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leases', to='email.idleworker', verbose_name='worker')),
+            ],
+            options={
+                'verbose_name': 'IDLE lease',
+                'verbose_name_plural': 'IDLE leases',
+                'ordering': ['expires_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-17 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0018_idleworker_idlelease'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='backfill_lease_owner',
+            field=models.CharField(blank=True, max_length=32, verbose_name='backfill lease owner'),
+        ),
+    ]
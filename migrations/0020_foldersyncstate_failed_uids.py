@@ -0,0 +1,18 @@
+# Generated by Django 5.1.8 on 2026-10-17 04:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email', '0019_foldersyncstate_backfill_lease_owner'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='foldersyncstate',
+            name='failed_uids',
+            field=models.JSONField(blank=True, default=dict, verbose_name='failed UIDs'),
+        ),
+    ]
@@ -2,10 +2,20 @@ from superapp.apps.email.models.email_address import EmailAddress
 from superapp.apps.email.models.email import Email
 from superapp.apps.email.models.contact import Contact
 from superapp.apps.email.models.thread import Thread
+from superapp.apps.email.models.thread_reference import ThreadReference
+from superapp.apps.email.models.sync_state import FolderSyncState
+from superapp.apps.email.models.attachment import Attachment
+from superapp.apps.email.models.idle_worker import IdleWorker
+from superapp.apps.email.models.idle_lease import IdleLease
 
 __all__ = [
     'EmailAddress',
     'Email',
     'Contact',
     'Thread',
+    'ThreadReference',
+    'FolderSyncState',
+    'Attachment',
+    'IdleWorker',
+    'IdleLease',
 ]
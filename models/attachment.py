@@ -0,0 +1,46 @@
+import uuid
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class Attachment(models.Model):
+    """
+    File attached to an email, with its content in the attachment store
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+    
+    email = models.ForeignKey(
+        'email.Email',
+        on_delete=models.CASCADE,
+        related_name='attachment_files',
+        verbose_name=_("email")
+    )
+    
+    filename = models.CharField(_("filename"), max_length=255, blank=True)
+    content_type = models.CharField(_("content type"), max_length=255, default='application/octet-stream')
+    content_id = models.CharField(_("content ID"), max_length=255, blank=True)  # Referenced by cid: URLs of inline images
+    size = models.PositiveBigIntegerField(_("size"), default=0)
+    
+    # Identical files share one blob, named after their SHA-256
+    sha256 = models.CharField(_("SHA-256"), max_length=64, db_index=True)
+    blob = models.CharField(_("blob"), max_length=255)
+    
+    class Meta:
+        verbose_name = _("attachment")
+        verbose_name_plural = _("attachments")
+        ordering = ['email', 'created_at']
+    
+    def __str__(self):
+        return self.filename or self.sha256
+    
+    def open(self):
+        """
+        Open the content for reading in chunks
+        
+        Returns:
+            Binary file object
+        """
+        from superapp.apps.email.services.blobs import attachment_store
+        return attachment_store.open_stream(self.blob)
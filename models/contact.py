@@ -33,3 +33,8 @@ class Contact(models.Model):
     
     def __str__(self):
         return f"{self.name} <{self.email}>" if self.name else self.email
+    
+    def save(self, *args, **kwargs):
+        # Addresses are stored lowercase, so differently cased headers find the same contact
+        self.email = self.email.strip().lower()
+        super().save(*args, **kwargs)
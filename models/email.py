@@ -6,6 +6,15 @@ from django.dispatch import receiver
 from django.utils import timezone
 
 
+class EmailManager(models.Manager):
+    """
+    Manager leaving the raw messages of rows stored before the raw message store out of queries
+    """
+    
+    def get_queryset(self):
+        return super().get_queryset().defer('legacy_raw_message')
+
+
 class Email(models.Model):
     """
     Email model for storing sent and received emails
@@ -24,6 +33,12 @@ class Email(models.Model):
         ('received', _('Received')),
     )
     
+    BODY_STATUS_CHOICES = (
+        ('complete', _('Complete')),
+        ('pending', _('Pending download')),
+        ('truncated', _('Truncated')),
+    )
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created_at = models.DateTimeField(_("created at"), auto_now_add=True)
     updated_at = models.DateTimeField(_("updated at"), auto_now=True)
@@ -74,6 +89,19 @@ class Email(models.Model):
     subject = models.CharField(_("subject"), max_length=255)
     body_text = models.TextField(_("body text"), blank=True)
     body_html = models.TextField(_("body HTML"), blank=True)
+    body_status = models.CharField(
+        _("body status"),
+        max_length=10,
+        choices=BODY_STATUS_CHOICES,
+        default='complete'
+    )
+    size = models.PositiveIntegerField(_("size"), null=True, blank=True)
+    charset = models.CharField(_("charset"), max_length=40, blank=True)
+    
+    # Derived from the body after the email is stored, see services/postprocess.py
+    snippet = models.CharField(_("snippet"), max_length=255, blank=True)
+    language = models.CharField(_("language"), max_length=16, blank=True)
+    processed_at = models.DateTimeField(_("processed at"), null=True, blank=True)
     
     # Attachments can be handled through a separate model or file field
     attachments = models.JSONField(_("attachments"), default=list, blank=True)  # List of attachment metadata
@@ -100,17 +128,71 @@ class Email(models.Model):
         verbose_name=_("contact")
     )
     
-    # Raw email data
-    raw_message = models.TextField(_("raw message"), blank=True)
+    # Raw email data, kept compressed in the raw message store
+    raw_blob = models.CharField(_("raw message blob"), max_length=255, blank=True)
+    # Raw email data of rows stored inline, moved to the store by the move_raw_messages command
+    legacy_raw_message = models.TextField(_("legacy raw message"), db_column='raw_message', blank=True)
+    
+    # Location of incoming emails on the IMAP server
+    imap_folder = models.CharField(_("IMAP folder"), max_length=255, blank=True)
+    imap_uid = models.PositiveBigIntegerField(_("IMAP UID"), null=True, blank=True)
+    
+    # IMAP flags of incoming emails, mirrored from the server on every sync
+    flags = models.JSONField(_("flags"), default=list, blank=True)
+    is_read = models.BooleanField(_("read"), default=False)
+    is_answered = models.BooleanField(_("answered"), default=False)
+    is_flagged = models.BooleanField(_("flagged"), default=False)
+    is_deleted = models.BooleanField(_("deleted"), default=False)  # \Deleted flag or expunged from the server
     
     class Meta:
         verbose_name = _("email")
         verbose_name_plural = _("emails")
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['email_address', 'message_id'], name='email_email_message_id_idx'),
+            models.Index(fields=['email_address', 'imap_folder', 'imap_uid'], name='email_email_imap_uid_idx'),
+        ]
+        constraints = [
+            # Drafts have no Message-ID until they are delivered
+            models.UniqueConstraint(
+                fields=['email_address', 'message_id'],
+                condition=~models.Q(message_id=''),
+                name='email_email_unique_message_id',
+            ),
+        ]
+    
+    objects = EmailManager()
     
     def __str__(self):
         return f"{self.subject} ({self.get_direction_display()})"
     
+    @property
+    def raw_message(self):
+        """
+        Raw RFC 822 message, loaded from the raw message store on first access
+        """
+        if not hasattr(self, '_raw_message'):
+            if self.raw_blob:
+                from superapp.apps.email.services.blobs import raw_message_store
+                self._raw_message = raw_message_store.open(self.raw_blob).decode('utf-8', errors='replace')
+            else:
+                self._raw_message = self.legacy_raw_message
+        return self._raw_message
+    
+    def load_body(self):
+        """
+        Download the body of an email synced headers-first, if still pending,
+        and derive its text body and snippet
+        """
+        if self.body_status == 'pending':
+            from superapp.apps.email.services.body import EmailBodyService
+            EmailBodyService().load_bodies([self])
+        
+        # Derive the text body now rather than waiting for the background stage
+        if self.body_status != 'pending' and self.processed_at is None:
+            from superapp.apps.email.services.postprocess import EmailPostProcessService
+            EmailPostProcessService().process([self])
+    
     def save(self, *args, **kwargs):
         # If this is a new outgoing email without a thread, create one
         if not self.pk and self.direction == 'outgoing' and not self.thread:
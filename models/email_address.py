@@ -54,6 +54,9 @@ class EmailAddress(models.Model):
                                   help_text=_("Enable real-time synchronization using IMAP IDLE"))
     idle_folder = models.CharField(_("IDLE folder"), max_length=255, default="INBOX", 
                                   help_text=_("IMAP folder to monitor with IDLE"))
+    sync_folders = models.JSONField(_("sync folders"), default=list, blank=True,
+                                    help_text=_("IMAP folders to sync, leave empty to discover them "
+                                                "with LIST (skips All Mail, Drafts, Junk and Trash)"))
     
     class Meta:
         verbose_name = _("email address")
@@ -0,0 +1,37 @@
+import uuid
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class IdleLease(models.Model):
+    """
+    Ownership of an account's IDLE connection by one worker
+    
+    The owner renews the lease with every heartbeat, other workers may
+    take the account over once it expired.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+    
+    email_address = models.OneToOneField(
+        'email.EmailAddress',
+        on_delete=models.CASCADE,
+        related_name='idle_lease',
+        verbose_name=_("email address")
+    )
+    worker = models.ForeignKey(
+        'email.IdleWorker',
+        on_delete=models.CASCADE,
+        related_name='leases',
+        verbose_name=_("worker")
+    )
+    expires_at = models.DateTimeField(_("expires at"), db_index=True)
+    
+    class Meta:
+        verbose_name = _("IDLE lease")
+        verbose_name_plural = _("IDLE leases")
+        ordering = ['expires_at']
+    
+    def __str__(self):
+        return f"{self.email_address} -> {self.worker}"
@@ -0,0 +1,26 @@
+import uuid
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class IdleWorker(models.Model):
+    """
+    Running idle_sync process, kept alive by its heartbeats
+    
+    Accounts are spread over the live workers by consistent hashing, a
+    worker whose heartbeat stopped is removed together with its leases.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+    
+    name = models.CharField(_("name"), max_length=255)  # e.g. host:pid
+    heartbeat_at = models.DateTimeField(_("heartbeat at"), db_index=True)
+    
+    class Meta:
+        verbose_name = _("IDLE worker")
+        verbose_name_plural = _("IDLE workers")
+        ordering = ['created_at']
+    
+    def __str__(self):
+        return self.name
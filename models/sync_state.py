@@ -0,0 +1,130 @@
+import uuid
+from datetime import timedelta
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class FolderSyncState(models.Model):
+    """
+    Incremental sync checkpoint for a single IMAP folder of an email address
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+    
+    email_address = models.ForeignKey(
+        'email.EmailAddress',
+        on_delete=models.CASCADE,
+        related_name='sync_states',
+        verbose_name=_("email address")
+    )
+    folder = models.CharField(_("folder"), max_length=255, default="INBOX")
+    special_use = models.CharField(_("special use"), max_length=50, blank=True)  # e.g. \Sent, \Archive
+    
+    # UIDs are only meaningful for the UIDVALIDITY they were issued under
+    uid_validity = models.PositiveBigIntegerField(_("UIDVALIDITY"), null=True, blank=True)
+    last_uid = models.PositiveBigIntegerField(_("last synced UID"), default=0)
+    # CONDSTORE mod-sequence up to which flag changes have been applied
+    highest_modseq = models.PositiveBigIntegerField(_("highest MODSEQ"), null=True, blank=True)
+    
+    last_synced_at = models.DateTimeField(_("last synced at"), null=True, blank=True)
+    # Messages below the checkpoint that failed to parse or to be stored, by UID with their failed attempts, are fetched again
+    failed_uids = models.JSONField(_("failed UIDs"), default=dict, blank=True)
+    
+    # Quiet folders are polled less and less often, busy ones every pass
+    poll_interval = models.PositiveIntegerField(_("poll interval"), default=0, help_text=_("Seconds"))
+    next_sync_at = models.DateTimeField(_("next sync at"), null=True, blank=True)
+    
+    # History below backfill_uid is imported newest first by the backfill, apart from the incremental sync
+    backfill_uid = models.PositiveBigIntegerField(_("backfill UID"), null=True, blank=True)
+    backfill_total = models.PositiveIntegerField(_("backfill total"), default=0)
+    backfill_done = models.PositiveIntegerField(_("backfill done"), default=0)
+    backfill_started_at = models.DateTimeField(_("backfill started at"), null=True, blank=True)
+    backfill_completed_at = models.DateTimeField(_("backfill completed at"), null=True, blank=True)
+    # Set while a backfill worker owns the folder, so workers never backfill it twice
+    backfill_lease_until = models.DateTimeField(_("backfill lease until"), null=True, blank=True)
+    backfill_lease_owner = models.CharField(_("backfill lease owner"), max_length=32, blank=True)
+    
+    class Meta:
+        verbose_name = _("folder sync state")
+        verbose_name_plural = _("folder sync states")
+        ordering = ['email_address', 'folder']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['email_address', 'folder'],
+                name='email_foldersyncstate_unique_folder',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.email_address} / {self.folder}"
+    
+    def reset(self, uid_validity):
+        """
+        Drop the checkpoint after the server changed UIDVALIDITY
+        
+        Args:
+            uid_validity: The new UIDVALIDITY reported by the server
+        """
+        self.uid_validity = uid_validity
+        self.last_uid = 0
+        self.highest_modseq = None
+        self.failed_uids = {}
+        self.backfill_uid = None
+        self.backfill_total = 0
+        self.backfill_done = 0
+        self.backfill_started_at = None
+        self.backfill_completed_at = None
+    
+    def start_backfill(self, uid_next):
+        """
+        Hand the history of the folder to the backfill
+        
+        The incremental sync continues from uid_next, the backfill imports
+        everything below it.
+        
+        Args:
+            uid_next: UIDNEXT reported by the server
+        """
+        self.last_uid = uid_next - 1
+        self.backfill_uid = uid_next
+        self.backfill_total = 0
+        self.backfill_done = 0
+        self.backfill_started_at = timezone.now()
+        self.backfill_completed_at = None
+    
+    def retry_uids(self):
+        """
+        UIDs of the messages that failed to parse or to be stored and are fetched again
+        """
+        return sorted(int(uid) for uid in self.failed_uids)
+    
+    @property
+    def backfill_pending(self):
+        """
+        Whether history below backfill_uid still has to be imported
+        """
+        return self.backfill_uid is not None and self.backfill_completed_at is None
+    
+    def is_due(self, now=None):
+        """
+        Whether the folder should be synced in the current pass
+        """
+        return self.next_sync_at is None or self.next_sync_at <= (now or timezone.now())
+    
+    def schedule_next(self, active, min_interval, max_interval):
+        """
+        Schedule the next sync, backing off while the folder stays quiet
+        
+        Args:
+            active: Whether the last sync found new messages or flag changes
+            min_interval: Poll interval in seconds of busy folders
+            max_interval: Upper bound in seconds for quiet folders
+        """
+        if active or not self.poll_interval:
+            self.poll_interval = min_interval
+        else:
+            self.poll_interval = min(self.poll_interval * 2, max_interval)
+        
+        self.next_sync_at = timezone.now() + timedelta(seconds=self.poll_interval)
@@ -12,6 +12,8 @@ class Thread(models.Model):
     updated_at = models.DateTimeField(_("updated at"), auto_now=True)
     
     subject = models.CharField(_("subject"), max_length=255)
+    # Hash of the subject without Re:/Fwd: prefixes, matched when replies carry no References
+    subject_hash = models.CharField(_("subject hash"), max_length=64, blank=True)
     participants = models.JSONField(_("participants"), default=list)  # List of email addresses
     
     # Reference to the email address that owns this thread
@@ -46,6 +48,19 @@ class Thread(models.Model):
         verbose_name = _("thread")
         verbose_name_plural = _("threads")
         ordering = ['-last_message_at', '-created_at']
+        indexes = [
+            models.Index(fields=['email_address', 'subject_hash', 'last_message_at'], name='email_thread_subject_hash_idx'),
+        ]
     
     def __str__(self):
         return self.subject
+    
+    def save(self, *args, **kwargs):
+        from superapp.apps.email.utils import subject_hash
+        
+        self.subject_hash = subject_hash(self.subject)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'subject' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'subject_hash'}
+        
+        super().save(*args, **kwargs)
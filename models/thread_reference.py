@@ -0,0 +1,43 @@
+import uuid
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class ThreadReference(models.Model):
+    """
+    Message-ID index of threads, including messages that were only referenced
+    
+    Referenced Message-IDs are indexed too, so a parent that arrives after
+    its replies finds their thread.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated at"), auto_now=True)
+    
+    email_address = models.ForeignKey(
+        'email.EmailAddress',
+        on_delete=models.CASCADE,
+        related_name='thread_references',
+        verbose_name=_("email address")
+    )
+    message_id = models.CharField(_("message ID"), max_length=255)
+    thread = models.ForeignKey(
+        'email.Thread',
+        on_delete=models.CASCADE,
+        related_name='message_references',
+        verbose_name=_("thread")
+    )
+    
+    class Meta:
+        verbose_name = _("thread reference")
+        verbose_name_plural = _("thread references")
+        ordering = ['email_address', 'message_id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['email_address', 'message_id'],
+                name='email_threadreference_unique_message_id',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.message_id} -> {self.thread_id}"
@@ -1,7 +1,11 @@
 from superapp.apps.email.services.sync import EmailSyncService
 from superapp.apps.email.services.delivery import EmailDeliveryService
+from superapp.apps.email.services.ingest import EmailIngestService
+from superapp.apps.email.services.body import EmailBodyService
 
 __all__ = [
     'EmailSyncService',
     'EmailDeliveryService',
+    'EmailIngestService',
+    'EmailBodyService',
 ]
@@ -0,0 +1,504 @@
+import asyncio
+import itertools
+import logging
+import re
+import ssl
+from imapclient import imap_utf7
+from imapclient.response_parser import parse_fetch_response, parse_response
+from superapp.apps.email.models import EmailAddress
+from superapp.apps.email.services.imap import SYNC_EXTENSIONS, parse_vanished
+
+logger = logging.getLogger(__name__)
+
+LITERAL_RE = re.compile(rb'\{(\d+)\}$')
+RESPONSE_CODE_RE = re.compile(rb'\[([A-Z-]+)(?: ([^\]]*))?\]')
+FETCH_RE = re.compile(rb'^(\d+) FETCH ')
+EXISTS_RE = re.compile(rb'^\d+ EXISTS$')
+
+# Seconds to wait for more responses once the first response of a burst arrived during IDLE
+IDLE_BURST_WAIT = 0.05
+
+# Errors of a broken connection, as opposed to errors of a single command or message
+CONNECTION_ERRORS = (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ssl.SSLError)
+
+
+class AsyncIMAPError(Exception):
+    """
+    Raised when the server answers a command with NO or BAD
+    """
+
+
+class AsyncIMAPClient:
+    """
+    Minimal asyncio IMAP client covering the commands used by the sync engine
+    
+    Responses are returned in the same shapes as IMAPClient so parsing and
+    persistence code can be shared between the blocking and asyncio paths.
+    All message numbers are UIDs.
+    """
+    
+    def __init__(self, host, port=993, use_ssl=True, timeout=None, ssl_context=None):
+        """
+        Initialize the client
+        
+        Args:
+            host: IMAP server host name
+            port: IMAP server port
+            use_ssl: Connect with implicit TLS
+            timeout: Optional timeout in seconds for every server response
+            ssl_context: Optional SSL context for TLS, defaults to ssl.create_default_context()
+        """
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.reader = None
+        self.writer = None
+        self.sync_extension = None
+        self.vanished = []
+        self._tags = itertools.count(1)
+        self._idle_tag = None
+        self._idle_responses = []
+        self.mailbox_updates = []
+    
+    async def connect(self):
+        """
+        Open the connection and read the server greeting
+        """
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=self._ssl_context() if self.use_ssl else None
+            ),
+            self.timeout
+        )
+        await self._read_line()
+    
+    async def starttls(self):
+        """
+        Upgrade a plain connection with STARTTLS
+        
+        The certificate must be valid for the host name, like with implicit TLS.
+        """
+        await self._command(b'STARTTLS')
+        await self.writer.start_tls(self._ssl_context(), server_hostname=self.host)
+    
+    def _ssl_context(self):
+        """
+        SSL context verifying the server certificate
+        """
+        return self.ssl_context or ssl.create_default_context()
+    
+    async def login(self, username, password):
+        """
+        Authenticate with LOGIN
+        """
+        await self._command(b'LOGIN ' + self._quote(username) + b' ' + self._quote(password))
+    
+    async def capabilities(self):
+        """
+        Run CAPABILITY
+        
+        Returns:
+            Tuple of capability names as bytes
+        """
+        untagged, _ = await self._command(b'CAPABILITY')
+        
+        for line in untagged:
+            if isinstance(line, bytes) and line.upper().startswith(b'CAPABILITY '):
+                return tuple(line.upper().split()[1:])
+        
+        return ()
+    
+    async def enable(self, extension):
+        """
+        Run ENABLE for an extension
+        """
+        await self._command(b'ENABLE ' + extension.encode())
+    
+    async def list_folders(self):
+        """
+        Run LIST for every folder
+        
+        Returns:
+            List of (flags, delimiter, name) tuples shaped like IMAPClient.list_folders()
+        """
+        untagged, _ = await self._command(b'LIST "" "*"')
+        
+        folders = []
+        for line in untagged:
+            if isinstance(line, list):
+                # Folder name sent as a literal
+                (prefix, literal), rest = line[0], line[-1]
+                line = LITERAL_RE.sub(b'', prefix) + self._quote(literal) + rest
+            if not line.startswith(b'LIST '):
+                continue
+            
+            flags, delimiter, name = parse_response([line[5:]])
+            if isinstance(name, int):
+                name = str(name).encode()
+            folders.append((flags, delimiter, imap_utf7.decode(name)))
+        
+        return folders
+    
+    async def select_folder(self, folder, readonly=False):
+        """
+        Select a folder
+        
+        Args:
+            folder: Folder name
+            readonly: Use EXAMINE instead of SELECT
+            
+        Returns:
+            Dictionary shaped like IMAPClient.select_folder()
+        """
+        command = b'EXAMINE ' if readonly else b'SELECT '
+        untagged, _ = await self._command(command + self._quote(imap_utf7.encode(folder)))
+        
+        # The sizes reported by SELECT describe the folder as it is now
+        self.mailbox_updates = []
+        
+        info = {}
+        for line in untagged:
+            if not isinstance(line, bytes):
+                continue
+            
+            parts = line.split(b' ', 1)
+            if len(parts) == 2 and parts[0].isdigit():
+                info[parts[1].strip()] = int(parts[0])
+                continue
+            
+            match = RESPONSE_CODE_RE.search(line)
+            if match:
+                key, value = match.group(1), match.group(2)
+                info[key] = int(value) if value and value.isdigit() else value
+        
+        return info
+    
+    async def search(self, criteria):
+        """
+        Run UID SEARCH
+        
+        Args:
+            criteria: List of search criteria, e.g. ['UID', '10:*']
+            
+        Returns:
+            List of matching UIDs
+        """
+        untagged, _ = await self._command(b'UID SEARCH ' + ' '.join(criteria).encode())
+        
+        uids = []
+        for line in untagged:
+            if isinstance(line, bytes) and line.startswith(b'SEARCH'):
+                uids.extend(int(uid) for uid in line.split()[1:])
+        
+        return uids
+    
+    async def fetch(self, messages, data_items, modifiers=None):
+        """
+        Run UID FETCH
+        
+        UID ranges reported in QRESYNC VANISHED responses are stored on
+        the vanished attribute.
+        
+        Args:
+            messages: UID sequence set string
+            data_items: List of FETCH data items
+            modifiers: Optional FETCH modifiers, e.g. ['CHANGEDSINCE 12']
+            
+        Returns:
+            Dictionary shaped like IMAPClient.fetch()
+        """
+        command = f"UID FETCH {messages} ({' '.join(data_items)})"
+        if modifiers:
+            command += f" ({' '.join(modifiers)})"
+        untagged, _ = await self._command(command.encode())
+        
+        self.vanished = []
+        
+        # Strip the "FETCH" keyword the same way imaplib does
+        normalized = []
+        for response in untagged:
+            if isinstance(response, bytes) and response.startswith(b'VANISHED '):
+                self.vanished.extend(parse_vanished(response[9:]))
+                continue
+            
+            items = response if isinstance(response, list) else [response]
+            head = items[0][0] if isinstance(items[0], tuple) else items[0]
+            if not FETCH_RE.match(head):
+                continue
+            
+            for index, item in enumerate(items):
+                if index == 0 and isinstance(item, tuple):
+                    item = (FETCH_RE.sub(rb'\1 ', item[0]), item[1])
+                elif index == 0:
+                    item = FETCH_RE.sub(rb'\1 ', item)
+                normalized.append(item)
+        
+        return dict(parse_fetch_response(normalized))
+    
+    @property
+    def idling(self):
+        """
+        Whether the connection is in IDLE
+        """
+        return self._idle_tag is not None
+    
+    async def idle(self):
+        """
+        Start IDLE and wait for the server to accept it
+        """
+        tag = f"A{next(self._tags):04d}".encode()
+        self.writer.write(tag + b' IDLE\r\n')
+        await self.writer.drain()
+        
+        while True:
+            line = await self._read_line()
+            
+            if line.startswith(b'+'):
+                self._idle_tag = tag
+                return
+            
+            if line.startswith(tag + b' '):
+                raise AsyncIMAPError(line[len(tag) + 1:].decode(errors='replace'))
+            
+            if line.startswith(b'* '):
+                self._idle_responses.append(self._parse_untagged(await self._read_literals(line[2:])))
+    
+    async def idle_check(self, timeout):
+        """
+        Wait for untagged responses while in IDLE
+        
+        Args:
+            timeout: Seconds to wait for the first response
+            
+        Returns:
+            List of responses shaped like IMAPClient.idle_check(), e.g. [(3, b'EXISTS')],
+            empty when the timeout passed without any
+        """
+        responses, self._idle_responses = self._idle_responses, []
+        if responses:
+            return responses
+        
+        wait = timeout
+        while True:
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), wait)
+            except asyncio.TimeoutError:
+                return responses
+            
+            if not line:
+                raise ConnectionError(f"Connection to {self.host} closed")
+            
+            line = line.rstrip(b'\r\n')
+            if line.startswith(b'* '):
+                responses.append(self._parse_untagged(await self._read_literals(line[2:])))
+            
+            # Servers send related responses in a burst, collect the rest of it
+            wait = IDLE_BURST_WAIT
+    
+    async def idle_done(self):
+        """
+        End IDLE
+        
+        Returns:
+            List of responses that arrived before the server ended IDLE
+        """
+        self.writer.write(b'DONE\r\n')
+        await self.writer.drain()
+        
+        tag, self._idle_tag = self._idle_tag, None
+        responses, self._idle_responses = self._idle_responses, []
+        
+        while True:
+            line = await self._read_line()
+            
+            if tag is not None and line.startswith(tag + b' '):
+                status = line[len(tag) + 1:]
+                if not status.startswith(b'OK'):
+                    raise AsyncIMAPError(status.decode(errors='replace'))
+                return responses
+            
+            if line.startswith(b'* '):
+                responses.append(self._parse_untagged(await self._read_literals(line[2:])))
+    
+    async def noop(self):
+        """
+        Send NOOP
+        """
+        return await self._command(b'NOOP')
+    
+    async def logout(self):
+        """
+        Send LOGOUT and close the connection
+        """
+        try:
+            await self._command(b'LOGOUT')
+        except Exception:
+            pass
+        finally:
+            await self.close()
+    
+    async def close(self):
+        """
+        Close the underlying connection without logging out
+        """
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+            self.reader = None
+    
+    async def _command(self, command):
+        """
+        Send a tagged command and collect its responses
+        
+        Untagged responses are returned as bytes, or as a list of
+        (prefix, literal) tuples and trailing bytes when they carry literals.
+        
+        Args:
+            command: Command without tag as bytes
+            
+        Returns:
+            Tuple of (untagged_responses, tagged_status_line)
+        """
+        tag = f"A{next(self._tags):04d}".encode()
+        self.writer.write(tag + b' ' + command + b'\r\n')
+        await self.writer.drain()
+        
+        untagged = []
+        while True:
+            line = await self._read_line()
+            
+            if line.startswith(tag + b' '):
+                status = line[len(tag) + 1:]
+                if not status.startswith(b'OK'):
+                    raise AsyncIMAPError(status.decode(errors='replace'))
+                return untagged, status
+            
+            if line.startswith(b'* '):
+                response = await self._read_literals(line[2:])
+                untagged.append(response)
+                
+                # Servers announce new messages in the responses of any command
+                if isinstance(response, bytes) and EXISTS_RE.match(response):
+                    self.mailbox_updates.append(self._parse_untagged(response))
+    
+    async def _read_literals(self, line):
+        """
+        Read the literals announced at the end of a response line
+        """
+        match = LITERAL_RE.search(line)
+        if not match:
+            return line
+        
+        parts = []
+        while match:
+            literal = await asyncio.wait_for(self.reader.readexactly(int(match.group(1))), self.timeout)
+            parts.append((line, literal))
+            line = await self._read_line()
+            match = LITERAL_RE.search(line)
+        
+        parts.append(line)
+        return parts
+    
+    async def _read_line(self):
+        """
+        Read one CRLF terminated line without the line ending
+        """
+        line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+        if not line:
+            raise ConnectionError(f"Connection to {self.host} closed")
+        return line.rstrip(b'\r\n')
+    
+    def _parse_untagged(self, response):
+        """
+        Split an untagged response into a tuple such as (3, b'EXISTS') or (b'OK', b'Still here')
+        """
+        if isinstance(response, list):
+            # Responses with literals are only reported by their first line
+            response = response[0][0]
+        
+        parts = response.split(b' ', 2)
+        if parts[0].isdigit():
+            return (int(parts[0]),) + tuple(parts[1:])
+        return tuple(parts)
+    
+    def _quote(self, value):
+        """
+        Quote a string argument
+        """
+        if isinstance(value, str):
+            value = value.encode()
+        return b'"' + value.replace(b'\\', b'\\\\').replace(b'"', b'\\"') + b'"'
+
+
+async def connect_imap_async(email_address, timeout=None):
+    """
+    Open an authenticated asyncio IMAP connection for an email address
+    
+    Args:
+        email_address: EmailAddress instance to connect with
+        timeout: Optional timeout in seconds for every server response
+        
+    Returns:
+        Logged-in AsyncIMAPClient instance, with sync_extension set to the
+        flag sync extension enabled on the connection
+    """
+    client = AsyncIMAPClient(
+        email_address.imap_server,
+        port=email_address.imap_port,
+        use_ssl=email_address.imap_connection_type == EmailAddress.SSL,
+        timeout=timeout
+    )
+    await client.connect()
+    
+    try:
+        if email_address.imap_connection_type == EmailAddress.TLS:
+            await client.starttls()
+        
+        await client.login(email_address.imap_username, email_address.imap_password)
+        client.sync_extension = await enable_sync_extension_async(client)
+    except Exception:
+        await client.close()
+        raise
+    
+    return client
+
+
+async def enable_sync_extension_async(client):
+    """
+    Enable QRESYNC, or CONDSTORE when QRESYNC is unavailable
+    
+    Args:
+        client: Logged-in AsyncIMAPClient instance
+        
+    Returns:
+        'QRESYNC', 'CONDSTORE' or None when the server supports neither
+    """
+    capabilities = await client.capabilities()
+    
+    for extension in SYNC_EXTENSIONS:
+        if extension.encode() not in capabilities:
+            continue
+        
+        if b'ENABLE' not in capabilities:
+            # CONDSTORE also turns on with the first CHANGEDSINCE, QRESYNC cannot
+            if extension == 'CONDSTORE':
+                return extension
+            continue
+        
+        try:
+            await client.enable(extension)
+        except AsyncIMAPError as e:
+            logger.warning(f"Could not enable {extension}: {str(e)}")
+            continue
+        
+        return extension
+    
+    return None
@@ -0,0 +1,347 @@
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.models import EmailAddress
+from superapp.apps.email.services.aioimap import CONNECTION_ERRORS, AsyncIMAPError, connect_imap_async
+from superapp.apps.email.services.flags import fetched_flags
+from superapp.apps.email.services.imap import format_uid_set
+from superapp.apps.email.services.mime import StreamingMIMEParser
+from superapp.apps.email.services.blobs import raw_message_store
+from superapp.apps.email.services.sync import FIRST_CHUNK_KEY, EmailSyncService
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEmailSyncService:
+    """
+    asyncio sync engine driving many IMAP accounts from one event loop
+    
+    Network I/O for every account is multiplexed on the event loop, parsing
+    runs on a thread pool and persistence goes through the same checkpoint
+    and ingest code as EmailSyncService.
+    """
+    
+    def __init__(self, email_address_id=None, fetch_batch_size=None, headers_first=None,
+                 max_concurrency=None, parse_workers=None, all_folders=False):
+        """
+        Initialize the async sync service
+        
+        Args:
+            email_address_id: Optional UUID of the email address to sync
+            fetch_batch_size: Messages per UID FETCH, defaults to EMAIL_SYNC_FETCH_BATCH_SIZE
+            headers_first: Only fetch headers and download bodies later,
+                defaults to EMAIL_SYNC_HEADERS_FIRST
+            max_concurrency: Accounts synced at once, defaults to EMAIL_SYNC_ASYNC_MAX_CONCURRENCY
+            parse_workers: Threads used for parsing, defaults to the executor default
+            all_folders: Also sync quiet folders whose next poll is not due yet
+        """
+        self.email_address_id = email_address_id
+        self.sync_service = EmailSyncService(
+            email_address_id=email_address_id,
+            fetch_batch_size=fetch_batch_size,
+            headers_first=headers_first,
+            all_folders=all_folders
+        )
+        self.max_concurrency = max_concurrency or get_setting('EMAIL_SYNC_ASYNC_MAX_CONCURRENCY')
+        self.parse_workers = parse_workers
+        self.parse_executor = None
+    
+    async def sync_all_accounts(self):
+        """
+        Synchronize all active email accounts concurrently
+        """
+        email_addresses = EmailAddress.objects.filter(is_active=True)
+        
+        if self.email_address_id:
+            email_addresses = email_addresses.filter(id=self.email_address_id)
+        
+        email_addresses = await sync_to_async(list)(email_addresses)
+        
+        account_slots = asyncio.Semaphore(self.max_concurrency)
+        per_host = get_setting('EMAIL_SYNC_MAX_CONNECTIONS_PER_HOST')
+        host_slots = defaultdict(lambda: asyncio.Semaphore(per_host))
+        
+        with ThreadPoolExecutor(max_workers=self.parse_workers, thread_name_prefix='email-parse') as executor:
+            self.parse_executor = executor
+            
+            try:
+                results = await asyncio.gather(
+                    *(
+                        self._sync_with_limits(
+                            email_address,
+                            account_slots,
+                            host_slots[(email_address.imap_server or '').lower()]
+                        )
+                        for email_address in email_addresses
+                    ),
+                    return_exceptions=True
+                )
+            finally:
+                self.parse_executor = None
+        
+        for email_address, result in zip(email_addresses, results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.error(f"Sync of {email_address.email} timed out, it resumes from its checkpoint next pass")
+            elif isinstance(result, BaseException):
+                logger.error(f"Error syncing account {email_address.email}: {str(result)}")
+    
+    async def sync_account(self, email_address):
+        """
+        Synchronize a single email account
+        
+        Args:
+            email_address: EmailAddress instance to sync
+        """
+        if not email_address.imap_server or not email_address.imap_username or not email_address.imap_password:
+            logger.warning(f"Skipping sync for {email_address.email}: Missing IMAP configuration")
+            return
+        
+        client = await connect_imap_async(email_address, timeout=get_setting('EMAIL_SYNC_SOCKET_TIMEOUT'))
+        
+        try:
+            listing = None if email_address.sync_folders else await client.list_folders()
+            folders = await sync_to_async(self.sync_service.get_sync_folders)(
+                email_address,
+                listing,
+                due_only=not self.sync_service.all_folders
+            )
+            
+            for folder in folders:
+                try:
+                    await self.sync_folder(client, email_address, folder)
+                except AsyncIMAPError as e:
+                    # The server refused this folder, the others can still be synced
+                    logger.error(f"Error syncing folder {folder} for {email_address.email}: {str(e)}")
+        finally:
+            await client.logout()
+    
+    async def sync_folder(self, client, email_address, folder):
+        """
+        Import the messages that arrived in a folder since the last checkpoint
+        
+        Args:
+            client: Logged-in AsyncIMAPClient instance
+            email_address: EmailAddress instance being synced
+            folder: Name of the IMAP folder to sync
+            
+        Returns:
+            Number of messages fetched from the server
+        """
+        sync_service = self.sync_service
+        
+        state = await sync_to_async(sync_service.get_folder_state)(email_address, folder)
+        
+        folder_info = await client.select_folder(folder, readonly=True)
+        has_new_messages = await sync_to_async(sync_service.apply_folder_info)(state, folder_info, email_address)
+        
+        flag_changes = await self.sync_flags(client, state, folder_info, email_address)
+        
+        if not has_new_messages and not state.failed_uids:
+            await sync_to_async(sync_service.finish_folder)(state, active=bool(flag_changes))
+            return 0
+        
+        uids = await self.import_new_messages(client, state, email_address, folder)
+        
+        await sync_to_async(sync_service.finish_folder)(state, active=bool(uids or flag_changes))
+        
+        return len(uids)
+    
+    async def sync_selected_folder(self, client, email_address, folder):
+        """
+        Import new messages of the folder that is already selected on a connection
+        
+        Used when IDLE announced new mail: the open connection stays selected
+        and flags are left to the regular sync, so only the SEARCH and FETCH
+        of the messages above the checkpoint go to the server.
+        
+        Args:
+            client: AsyncIMAPClient instance with the folder selected, out of IDLE
+            email_address: EmailAddress instance being synced
+            folder: Name of the selected IMAP folder
+            
+        Returns:
+            Number of messages fetched from the server
+        """
+        state = await sync_to_async(self.sync_service.get_folder_state)(email_address, folder)
+        
+        uids = await self.import_new_messages(client, state, email_address, folder)
+        if uids:
+            await sync_to_async(self.sync_service.finish_folder)(state, active=True)
+        
+        return len(uids)
+    
+    async def import_new_messages(self, client, state, email_address, folder):
+        """
+        Fetch, parse and store the messages above the checkpoint of a selected folder
+        
+        Messages that failed to parse in earlier passes are fetched again first.
+        
+        Args:
+            client: AsyncIMAPClient instance with the folder selected
+            state: FolderSyncState instance of the folder
+            email_address: EmailAddress instance being synced
+            folder: Name of the selected IMAP folder
+            
+        Returns:
+            Sorted list of the UIDs that were fetched
+        """
+        sync_service = self.sync_service
+        loop = asyncio.get_running_loop()
+        
+        # "UID n:*" always matches the highest UID, even when it is below n
+        uids = state.retry_uids() + sorted(
+            uid for uid in await client.search(['UID', f'{state.last_uid + 1}:*'])
+            if uid > state.last_uid
+        )
+        
+        for offset in range(0, len(uids), sync_service.fetch_batch_size):
+            chunk = uids[offset:offset + sync_service.fetch_batch_size]
+            response = await client.fetch(format_uid_set(chunk), sync_service.fetch_data_items)
+            
+            parsed_emails = await loop.run_in_executor(
+                self.parse_executor,
+                sync_service.parse_fetch_response,
+                chunk,
+                response,
+                folder,
+                email_address
+            )
+            parsed_emails += await self.stream_partial_messages(client, chunk, response, folder, email_address)
+            await sync_to_async(sync_service.store_chunk)(state, chunk, parsed_emails, email_address, response=response)
+        
+        return uids
+    
+    async def stream_partial_messages(self, client, uids, response, folder, email_address):
+        """
+        Download and parse the messages of a FETCH response that did not fit in one chunk
+        
+        Asyncio counterpart of EmailSyncService.stream_partial_messages().
+        
+        Args:
+            client: AsyncIMAPClient instance with the folder selected
+            uids: UIDs requested in the FETCH command
+            response: FETCH response mapping UID to fetched data
+            folder: Name of the IMAP folder the messages were fetched from
+            email_address: EmailAddress instance being synced
+            
+        Returns:
+            List of ParsedEmail instances
+        """
+        sync_service = self.sync_service
+        loop = asyncio.get_running_loop()
+        parsed_emails = []
+        
+        for uid in uids:
+            data = response.get(uid)
+            if not data or not sync_service.is_partial(data):
+                continue
+            
+            size = data[b'RFC822.SIZE']
+            limit = min(size, get_setting('EMAIL_SYNC_MAX_MESSAGE_SIZE'))
+            stream = StreamingMIMEParser(spool_max_memory=get_setting('EMAIL_SYNC_SPOOL_MAX_MEMORY'))
+            raw_writer = raw_message_store.writer()
+            
+            try:
+                stream.feed(data[FIRST_CHUNK_KEY])
+                raw_writer.write(data[FIRST_CHUNK_KEY])
+                
+                while stream.size < limit:
+                    length = min(sync_service.stream_chunk_size, limit - stream.size)
+                    chunk_response = await client.fetch(str(uid), [f'BODY.PEEK[]<{stream.size}.{length}>'])
+                    chunk = chunk_response.get(uid, {}).get(f'BODY[]<{stream.size}>'.encode())
+                    if not chunk:
+                        break
+                    await loop.run_in_executor(self.parse_executor, stream.feed, chunk)
+                    raw_writer.write(chunk)
+                
+                stream.close()
+                parsed = await loop.run_in_executor(
+                    self.parse_executor,
+                    lambda: sync_service.parser.parse_stream(
+                        stream,
+                        size=size,
+                        truncated=stream.size < size,
+                        max_body_size=get_setting('EMAIL_SYNC_MAX_BODY_SIZE')
+                    )
+                )
+                
+                if parsed is None:
+                    header_response = await client.fetch(str(uid), ['BODY.PEEK[HEADER]'])
+                    parsed = sync_service.parser.parse_headers(
+                        header_response.get(uid, {}).get(b'BODY[HEADER]', b''),
+                        size=size
+                    )
+                    parsed.body_status = 'truncated'
+                
+                # Truncated messages keep no raw copy
+                if stream.size >= size:
+                    parsed.raw_blob = await loop.run_in_executor(self.parse_executor, raw_writer.close)
+            except CONNECTION_ERRORS:
+                raise
+            except Exception as e:
+                # Parse and blob storage errors only lose this message
+                logger.error(f"Error streaming email {uid} from {folder} for {email_address.email}: {str(e)}")
+                continue
+            finally:
+                raw_writer.discard()
+                stream.release()
+            
+            parsed.imap_folder = folder
+            parsed.imap_uid = uid
+            parsed.flags = data.get(b'FLAGS', ())
+            parsed_emails.append(parsed)
+        
+        return parsed_emails
+    
+    async def sync_flags(self, client, state, folder_info, email_address):
+        """
+        Apply the flag changes and expunges since the last pass of a folder
+        
+        Asyncio counterpart of EmailFlagService.sync_flags(), only the IMAP
+        commands differ.
+        
+        Args:
+            client: AsyncIMAPClient instance with the folder selected
+            state: FolderSyncState instance of the folder, before new messages are imported
+            folder_info: Response of the SELECT or EXAMINE command
+            email_address: EmailAddress instance being synced
+            
+        Returns:
+            Number of emails whose flags changed or that were expunged
+        """
+        flag_service = self.sync_service.flag_service
+        extension = client.sync_extension
+        highest_modseq = folder_info.get(b'HIGHESTMODSEQ') if extension else None
+        request = flag_service.plan_fetch(state, highest_modseq, extension)
+        changes = 0
+        
+        if request is not None:
+            uid_set, modifiers = request
+            flags_by_uid = fetched_flags(await client.fetch(uid_set, ['FLAGS'], modifiers))
+            vanished = client.vanished if 'VANISHED' in modifiers else None
+            
+            if vanished is None:
+                # A FLAGS scan lists every message still present, CHANGEDSINCE only the changed ones
+                present = set(await client.search(['UID', uid_set])) if modifiers else set(flags_by_uid)
+                vanished = await sync_to_async(flag_service.find_expunged)(email_address, state, present)
+            
+            changes = await sync_to_async(flag_service.apply_changes)(
+                email_address, state.folder, flags_by_uid, vanished
+            )
+        
+        state.highest_modseq = highest_modseq
+        
+        return changes
+    
+    async def _sync_with_limits(self, email_address, account_slots, host_slot):
+        """
+        Sync one account within the concurrency limits and its time budget
+        """
+        async with account_slots, host_slot:
+            await asyncio.wait_for(
+                self.sync_account(email_address),
+                get_setting('EMAIL_SYNC_ACCOUNT_TIMEOUT')
+            )
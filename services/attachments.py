@@ -0,0 +1,45 @@
+import logging
+import mimetypes
+from superapp.apps.email.models import Attachment
+from superapp.apps.email.services.blobs import attachment_store
+
+logger = logging.getLogger(__name__)
+
+
+def attach_file(email_obj, fileobj, filename, content_type=None, content_id='', chunk_size=64 * 1024):
+    """
+    Attach a file to an outgoing email
+    
+    The file is copied into the attachment store in chunks and shares its
+    blob with every other attachment of the same content. Create the draft
+    and its attachments in one transaction, delivery is queued when it
+    commits.
+    
+    Args:
+        email_obj: Email instance the file is attached to
+        fileobj: Binary file object to read the content from
+        filename: Filename shown to the recipients
+        content_type: Optional MIME type, guessed from the filename by default
+        content_id: Optional Content-ID for images referenced from the HTML body
+        chunk_size: Bytes read from fileobj at a time
+        
+    Returns:
+        Attachment instance
+    """
+    writer = attachment_store.writer()
+    try:
+        for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+            writer.write(chunk)
+        blob = writer.close()
+    finally:
+        writer.discard()
+    
+    return Attachment.objects.create(
+        email=email_obj,
+        filename=filename,
+        content_type=content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        content_id=content_id,
+        size=writer.size,
+        sha256=writer.digest,
+        blob=blob
+    )
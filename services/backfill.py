@@ -0,0 +1,422 @@
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from django.db.models import Q
+from django.utils import timezone
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.models import EmailAddress, FolderSyncState
+from superapp.apps.email.services.imap import iter_fetch_chunks
+from superapp.apps.email.services.imap_pool import connection_pool
+from superapp.apps.email.services.sync import BACKFILL_FIELDS, EmailSyncService
+
+logger = logging.getLogger(__name__)
+
+# Seconds a backfill worker owns a folder, renewed after every chunk
+LEASE_DURATION = 600
+
+
+@dataclass
+class BackfillProgress:
+    """
+    Progress of the backfill of one folder
+    """
+    email: str
+    folder: str
+    done: int
+    total: int
+    rate: float = 0.0
+    completed: bool = False
+    
+    @property
+    def percent(self):
+        """
+        Share of the history imported so far, in percent
+        """
+        if self.completed or not self.total:
+            return 100.0 if self.completed else 0.0
+        return min(100.0, 100.0 * self.done / self.total)
+    
+    @property
+    def eta(self):
+        """
+        Estimated time left as a timedelta, or None while the rate is unknown
+        """
+        if self.completed:
+            return timedelta(0)
+        if not self.rate:
+            return None
+        return timedelta(seconds=int(max(self.total - self.done, 0) / self.rate))
+    
+    def __str__(self):
+        if self.completed:
+            return f"{self.email} / {self.folder}: completed, {self.done} messages"
+        
+        eta = self.eta
+        return (
+            f"{self.email} / {self.folder}: {self.done}/{self.total} messages ({self.percent:.1f}%), "
+            f"{self.rate:.1f} messages/s, ETA {eta if eta is not None else 'unknown'}"
+        )
+
+
+class EmailBackfillService(EmailSyncService):
+    """
+    Service importing the history of large mailboxes newest first
+    
+    The history of a folder is everything below its backfill UID. It is
+    imported in chunks of EMAIL_BACKFILL_CHUNK_SIZE messages, moving the
+    backfill UID down after every chunk so an interrupted backfill resumes
+    where it stopped. The incremental sync keeps importing new messages
+    above the checkpoint on its own connections, and a lease on the folder
+    keeps concurrent backfill workers from importing it twice.
+    """
+    
+    def __init__(self, email_address_id=None, chunk_size=None, max_rate=None, time_limit=None,
+                 progress_callback=None, **kwargs):
+        """
+        Initialize the backfill service
+        
+        Args:
+            email_address_id: Optional UUID of the email address to backfill
+            chunk_size: Messages fetched and checkpointed at once, defaults to EMAIL_BACKFILL_CHUNK_SIZE
+            max_rate: Upper bound in messages per second, defaults to
+                EMAIL_BACKFILL_MAX_RATE. A value of 0 disables the throttle.
+            time_limit: Seconds a pass may run before it stops at the next
+                checkpoint, defaults to EMAIL_BACKFILL_TIME_LIMIT. A value
+                of 0 runs until the history is imported.
+            progress_callback: Optional callable receiving a BackfillProgress after every chunk
+            **kwargs: Further arguments of EmailSyncService
+        """
+        super().__init__(
+            email_address_id=email_address_id,
+            fetch_batch_size=chunk_size or get_setting('EMAIL_BACKFILL_CHUNK_SIZE'),
+            **kwargs
+        )
+        self.max_rate = get_setting('EMAIL_BACKFILL_MAX_RATE') if max_rate is None else max_rate
+        self.time_limit = get_setting('EMAIL_BACKFILL_TIME_LIMIT') if time_limit is None else time_limit
+        self.progress_callback = progress_callback
+        # Identifies the leases of this worker, so it never renews or releases those of another
+        self.lease_owner = uuid.uuid4().hex
+    
+    def backfill_all_accounts(self, start=False):
+        """
+        Continue the pending backfills of all active email accounts
+        
+        Args:
+            start: First hand the history of folders that were never synced
+                to the backfill
+        """
+        email_addresses = EmailAddress.objects.filter(is_active=True)
+        
+        if self.email_address_id:
+            email_addresses = email_addresses.filter(id=self.email_address_id)
+        
+        if start:
+            for email_address in email_addresses:
+                try:
+                    self.start_backfill(email_address)
+                except Exception as e:
+                    logger.error(f"Error starting backfill of {email_address.email}: {str(e)}")
+        
+        email_addresses = email_addresses.filter(
+            sync_states__backfill_uid__isnull=False,
+            sync_states__backfill_completed_at__isnull=True
+        ).distinct()
+        
+        deadline = time.monotonic() + self.time_limit if self.time_limit else None
+        
+        for email_address in email_addresses:
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            
+            try:
+                self.backfill_account(email_address, deadline=deadline)
+            except Exception as e:
+                logger.error(f"Error backfilling account {email_address.email}: {str(e)}")
+    
+    def start_backfill(self, email_address):
+        """
+        Hand the history of folders that were never synced to the backfill
+        
+        Folders the incremental sync already imported from the start have no
+        history left to backfill and are skipped.
+        
+        Args:
+            email_address: EmailAddress instance to backfill
+            
+        Returns:
+            Number of folders whose backfill was started
+        """
+        if not email_address.imap_server or not email_address.imap_username or not email_address.imap_password:
+            logger.warning(f"Skipping backfill for {email_address.email}: Missing IMAP configuration")
+            return 0
+        
+        started = 0
+        
+        with connection_pool.connection(
+            email_address,
+            force_tls=self.force_tls,
+            force_ssl=self.force_ssl
+        ) as client:
+            listing = None if email_address.sync_folders else client.list_folders()
+            
+            for folder in self.get_sync_folders(email_address, listing, due_only=False):
+                state = self.get_folder_state(email_address, folder)
+                if state.last_uid or state.backfill_uid is not None:
+                    continue
+                
+                folder_info = client.select_folder(folder, readonly=True)
+                uid_next = folder_info.get(b'UIDNEXT')
+                if uid_next is None:
+                    logger.warning(f"Not backfilling {folder} for {email_address.email}: server reports no UIDNEXT")
+                    continue
+                
+                state.reset(folder_info.get(b'UIDVALIDITY'))
+                state.start_backfill(uid_next)
+                
+                # The incremental sync may have imported the folder in the meantime
+                fields = ['uid_validity', 'last_uid'] + BACKFILL_FIELDS
+                claimed = FolderSyncState.objects.filter(
+                    pk=state.pk,
+                    last_uid=0,
+                    backfill_uid__isnull=True
+                ).update(updated_at=timezone.now(), **{name: getattr(state, name) for name in fields})
+                
+                if claimed:
+                    started += 1
+                    logger.info(f"Started backfill of {folder} for {email_address.email} below UID {uid_next}")
+        
+        return started
+    
+    def backfill_account(self, email_address, deadline=None):
+        """
+        Continue the pending backfills of one account, INBOX first
+        
+        Args:
+            email_address: EmailAddress instance to backfill
+            deadline: Optional time.monotonic() value after which the
+                backfill stops at the next checkpoint
+                
+        Returns:
+            True when no backfill of the account is left, False when the
+            deadline stopped it or another worker holds a folder
+        """
+        states = sorted(
+            FolderSyncState.objects.filter(
+                email_address=email_address,
+                backfill_uid__isnull=False,
+                backfill_completed_at__isnull=True
+            ),
+            key=lambda state: state.folder != 'INBOX'
+        )
+        if not states:
+            return True
+        
+        finished = True
+        
+        with connection_pool.connection(
+            email_address,
+            force_tls=self.force_tls,
+            force_ssl=self.force_ssl
+        ) as client:
+            for state in states:
+                if not self.acquire_lease(state):
+                    logger.info(f"Backfill of {state.folder} for {email_address.email} is running elsewhere")
+                    finished = False
+                    continue
+                
+                try:
+                    if not self.backfill_folder(client, email_address, state, deadline=deadline):
+                        return False
+                finally:
+                    self.release_lease(state)
+        
+        return finished
+    
+    def backfill_folder(self, client, email_address, state, deadline=None):
+        """
+        Import the history of a folder newest first, one checkpointed chunk at a time
+        
+        Args:
+            client: Logged-in IMAPClient instance
+            email_address: EmailAddress instance being backfilled
+            state: FolderSyncState instance of the folder, leased by this worker
+            deadline: Optional time.monotonic() value after which the
+                backfill stops at the next checkpoint
+                
+        Returns:
+            True when the folder's backfill is finished, False when the deadline stopped it
+        """
+        folder_info = client.select_folder(state.folder, readonly=True)
+        if folder_info.get(b'UIDVALIDITY') != state.uid_validity:
+            # The incremental sync resets the checkpoint, which drops this backfill
+            logger.warning(f"UIDVALIDITY of {state.folder} changed for {email_address.email}, stopping its backfill")
+            return True
+        
+        uids = []
+        if state.backfill_uid > 1:
+            uids = sorted(
+                (uid for uid in client.search(['UID', f'1:{state.backfill_uid - 1}']) if uid < state.backfill_uid),
+                reverse=True
+            )
+        
+        if not state.backfill_total:
+            state.backfill_total = state.backfill_done + len(uids)
+        
+        started = time.monotonic()
+        fetched = 0
+        
+        for chunk, response in iter_fetch_chunks(client, uids, self.fetch_data_items, self.fetch_batch_size):
+            parsed_emails = self.parse_fetch_response(chunk, response, state.folder, email_address)
+            parsed_emails += self.stream_partial_messages(client, chunk, response, state.folder, email_address)
+            
+            result = self.store_emails(parsed_emails, email_address)
+            if self.headers_first and result.emails:
+                self._queue_body_download(result.emails)
+            self.record_failures(state, chunk, response, parsed_emails, email_address, unstored=result.failed)
+            
+            state.backfill_uid = min(chunk)
+            state.backfill_done += len(chunk)
+            if not self.save_checkpoint(state):
+                logger.warning(
+                    f"Checkpoint of {state.folder} for {email_address.email} was reset or its lease was taken over, "
+                    f"stopping its backfill"
+                )
+                return True
+            
+            fetched += len(chunk)
+            self.report_progress(email_address, state, fetched / max(time.monotonic() - started, 0.001))
+            
+            if chunk[-1] == uids[-1]:
+                break
+            
+            self.throttle(started, fetched)
+            
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+        
+        state.backfill_completed_at = timezone.now()
+        self.save_checkpoint(state)
+        self.report_progress(email_address, state)
+        
+        return True
+    
+    def save_checkpoint(self, state):
+        """
+        Store the backfill progress of a folder and renew its lease
+        
+        Args:
+            state: FolderSyncState instance of the backfilled folder
+            
+        Returns:
+            False when the folder's checkpoint was reset since the backfill
+            started, or another worker took over its expired lease
+        """
+        state.backfill_lease_until = timezone.now() + timedelta(seconds=LEASE_DURATION)
+        fields = BACKFILL_FIELDS + ['backfill_lease_until']
+        
+        # A changed UIDVALIDITY means the incremental sync dropped the backfill
+        return bool(FolderSyncState.objects.filter(
+            pk=state.pk,
+            uid_validity=state.uid_validity,
+            backfill_uid__isnull=False,
+            backfill_lease_owner=self.lease_owner
+        ).update(updated_at=timezone.now(), **{name: getattr(state, name) for name in fields}))
+    
+    def acquire_lease(self, state):
+        """
+        Take ownership of a folder's backfill unless another worker holds it
+        
+        Args:
+            state: FolderSyncState instance of the folder
+            
+        Returns:
+            True when the lease was acquired
+        """
+        now = timezone.now()
+        return bool(FolderSyncState.objects.filter(
+            Q(backfill_lease_until__isnull=True) | Q(backfill_lease_until__lt=now),
+            pk=state.pk
+        ).update(
+            backfill_lease_until=now + timedelta(seconds=LEASE_DURATION),
+            backfill_lease_owner=self.lease_owner
+        ))
+    
+    def release_lease(self, state):
+        """
+        Give up ownership of a folder's backfill, unless another worker took it over
+        
+        Args:
+            state: FolderSyncState instance of the folder
+        """
+        FolderSyncState.objects.filter(
+            pk=state.pk,
+            backfill_lease_owner=self.lease_owner
+        ).update(backfill_lease_until=None, backfill_lease_owner='')
+    
+    def throttle(self, started, fetched):
+        """
+        Sleep as long as needed to stay below the configured rate
+        
+        Args:
+            started: time.monotonic() value at which this pass over the folder started
+            fetched: Messages fetched since then
+        """
+        if not self.max_rate:
+            return
+        
+        delay = started + fetched / self.max_rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def report_progress(self, email_address, state, rate=0.0):
+        """
+        Log the progress of a folder and pass it to the progress callback
+        
+        Args:
+            email_address: EmailAddress instance being backfilled
+            state: FolderSyncState instance of the folder
+            rate: Messages per second imported in this pass
+        """
+        progress = BackfillProgress(
+            email=email_address.email,
+            folder=state.folder,
+            done=state.backfill_done,
+            total=state.backfill_total,
+            rate=rate,
+            completed=state.backfill_completed_at is not None
+        )
+        logger.info(f"Backfill {progress}")
+        
+        if self.progress_callback is not None:
+            self.progress_callback(progress)
+    
+    def get_progress(self):
+        """
+        Report the stored progress of all backfills
+        
+        The rate is averaged since each backfill started, including pauses
+        between passes.
+        
+        Returns:
+            List of BackfillProgress instances
+        """
+        states = FolderSyncState.objects.filter(backfill_uid__isnull=False).select_related('email_address')
+        if self.email_address_id:
+            states = states.filter(email_address_id=self.email_address_id)
+        
+        now = timezone.now()
+        progress = []
+        for state in states:
+            elapsed = (now - state.backfill_started_at).total_seconds() if state.backfill_started_at else 0
+            progress.append(BackfillProgress(
+                email=state.email_address.email,
+                folder=state.folder,
+                done=state.backfill_done,
+                total=state.backfill_total,
+                rate=state.backfill_done / elapsed if elapsed > 0 else 0.0,
+                completed=state.backfill_completed_at is not None
+            ))
+        
+        return progress
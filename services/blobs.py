@@ -0,0 +1,245 @@
+import gzip
+import hashlib
+import logging
+import os
+import zlib
+from tempfile import SpooledTemporaryFile
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from superapp.apps.email.conf import get_setting
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# File extension of the blobs written with each compression
+EXTENSIONS = {
+    'gzip': 'gz',
+    'zstd': 'zst',
+}
+
+
+class BlobWriter:
+    """
+    Incremental writer hashing and compressing a blob as it arrives
+    """
+    
+    def __init__(self, store):
+        """
+        Initialize the writer
+        
+        Args:
+            store: BlobStore the blob is written to
+        """
+        self.store = store
+        self.compression = store.compression
+        self.size = 0
+        self.digest = None
+        self._hash = hashlib.sha256()
+        self._spool = SpooledTemporaryFile(max_size=get_setting('EMAIL_SYNC_SPOOL_MAX_MEMORY'))
+        
+        if self.compression == 'zstd':
+            self._compressor = zstandard.ZstdCompressor().compressobj()
+        elif self.compression == 'gzip':
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(wbits=31)
+        else:
+            self._compressor = None
+    
+    def write(self, data):
+        """
+        Append the next chunk of the blob
+        
+        Args:
+            data: Bytes, or a string encoded as UTF-8
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        
+        self._hash.update(data)
+        self.size += len(data)
+        self._spool.write(self._compressor.compress(data) if self._compressor else data)
+    
+    def close(self):
+        """
+        Store the blob unless a blob with the same content already exists
+        
+        Returns:
+            Key of the blob in the store
+        """
+        try:
+            if self._compressor:
+                self._spool.write(self._compressor.flush())
+            
+            self.digest = self._hash.hexdigest()
+            key = self.store.key_for(self.digest, self.compression)
+            storage = self.store.storage
+            if not storage.exists(key):
+                self._spool.seek(0)
+                # A concurrent writer may have won the race, the storage then picks another name
+                key = storage.save(key, File(self._spool))
+            
+            return key
+        finally:
+            self._spool.close()
+    
+    def discard(self):
+        """
+        Drop the data written so far without storing it
+        """
+        self._spool.close()
+
+
+class BlobStore:
+    """
+    Content-addressed store on a Django storage backend
+    
+    Blobs are named after the SHA-256 of their uncompressed content, so a
+    message kept in several folders, or a file attached to many messages, is
+    stored once. The compression is part of the blob name, which keeps blobs
+    readable after the compression setting changes.
+    """
+    
+    def __init__(self, storage_setting, directory, compression_setting=None):
+        """
+        Initialize the store
+        
+        Args:
+            storage_setting: Name of the setting holding the alias in STORAGES
+            directory: Directory below MEDIA_ROOT/email used when no alias is configured
+            compression_setting: Optional name of the setting holding the compression
+        """
+        self.storage_setting = storage_setting
+        self.directory = directory
+        self.compression_setting = compression_setting
+    
+    @property
+    def storage(self):
+        """
+        Storage backend holding the blobs
+        """
+        alias = get_setting(self.storage_setting)
+        if alias:
+            return storages[alias]
+        
+        return FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'email', self.directory))
+    
+    @property
+    def compression(self):
+        """
+        Compression used for new blobs, None for uncompressed blobs
+        """
+        if not self.compression_setting:
+            return None
+        
+        compression = get_setting(self.compression_setting)
+        if compression not in EXTENSIONS:
+            raise ImproperlyConfigured(f"Unsupported {self.compression_setting}: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImproperlyConfigured(f"{self.compression_setting} 'zstd' requires the zstandard package")
+        
+        return compression
+    
+    def key_for(self, digest, compression):
+        """
+        Build the name of a blob
+        
+        Args:
+            digest: Hex SHA-256 of the uncompressed content
+            compression: Compression of the blob, or None
+            
+        Returns:
+            Blob name, spread over two directory levels
+        """
+        name = f"{digest[:2]}/{digest[2:4]}/{digest}"
+        return f"{name}.{EXTENSIONS[compression]}" if compression else name
+    
+    def writer(self):
+        """
+        Start writing a blob incrementally
+        
+        Returns:
+            BlobWriter instance
+        """
+        return BlobWriter(self)
+    
+    def save(self, content):
+        """
+        Store a blob
+        
+        Args:
+            content: Blob content as bytes or string
+            
+        Returns:
+            Key of the blob in the store
+        """
+        writer = self.writer()
+        writer.write(content)
+        return writer.close()
+    
+    def open_stream(self, key):
+        """
+        Open a blob for reading in chunks
+        
+        Args:
+            key: Key returned by save()
+            
+        Returns:
+            Binary file object yielding the uncompressed content
+        """
+        blob = self.storage.open(key, 'rb')
+        
+        if key.endswith(f".{EXTENSIONS['zstd']}"):
+            if zstandard is None:
+                blob.close()
+                raise ImproperlyConfigured(f"Reading {key} requires the zstandard package")
+            return zstandard.ZstdDecompressor().stream_reader(blob, closefd=True)
+        
+        if key.endswith(f".{EXTENSIONS['gzip']}"):
+            return gzip.GzipFile(fileobj=blob, mode='rb')
+        
+        return blob
+    
+    def open(self, key):
+        """
+        Load a blob
+        
+        Args:
+            key: Key returned by save()
+            
+        Returns:
+            Uncompressed content as bytes
+        """
+        with self.storage.open(key, 'rb') as blob:
+            data = blob.read()
+        
+        if key.endswith(f".{EXTENSIONS['zstd']}"):
+            if zstandard is None:
+                raise ImproperlyConfigured(f"Reading {key} requires the zstandard package")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        
+        if key.endswith(f".{EXTENSIONS['gzip']}"):
+            return gzip.decompress(data)
+        
+        return data
+    
+    def delete(self, key):
+        """
+        Delete a blob
+        
+        Blobs are shared by every message or attachment with the same
+        content, so callers must make sure nothing else references the key.
+        
+        Args:
+            key: Key returned by save()
+        """
+        self.storage.delete(key)
+
+
+raw_message_store = BlobStore('EMAIL_RAW_MESSAGE_STORAGE', 'raw', 'EMAIL_RAW_MESSAGE_COMPRESSION')
+attachment_store = BlobStore('EMAIL_ATTACHMENT_STORAGE', 'attachments')
@@ -0,0 +1,161 @@
+import logging
+from collections import defaultdict
+from django.utils import timezone
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.models import Email
+from superapp.apps.email.services.imap import iter_fetch_chunks
+from superapp.apps.email.services.imap_pool import connection_pool
+from superapp.apps.email.services.parser import EmailParser
+from superapp.apps.email.services.postprocess import queue_postprocessing
+
+logger = logging.getLogger(__name__)
+
+
+class EmailBodyService:
+    """
+    Service downloading the bodies of emails that were synced headers-first
+    """
+    
+    def __init__(self, force_tls=False, force_ssl=False, fetch_batch_size=None):
+        """
+        Initialize the body service
+        
+        Args:
+            force_tls: Force TLS connection instead of the configured type
+            force_ssl: Force SSL connection instead of the configured type
+            fetch_batch_size: Messages per UID FETCH, defaults to EMAIL_SYNC_FETCH_BATCH_SIZE
+        """
+        self.force_tls = force_tls
+        self.force_ssl = force_ssl
+        self.fetch_batch_size = fetch_batch_size or get_setting('EMAIL_SYNC_FETCH_BATCH_SIZE')
+        self.max_body_size = get_setting('EMAIL_SYNC_MAX_BODY_SIZE')
+        self.parser = EmailParser()
+    
+    def load_pending(self, email_ids):
+        """
+        Download the pending bodies of the given emails
+        
+        Args:
+            email_ids: UUIDs of the emails to complete
+        """
+        emails = Email.objects.filter(
+            id__in=email_ids,
+            body_status='pending'
+        ).select_related('email_address')
+        
+        self.load_bodies(emails)
+    
+    def load_bodies(self, emails):
+        """
+        Download and store the text and HTML parts of pending emails
+        
+        Emails are grouped per account and folder so every group costs one
+        connection and one FETCH per chunk of messages.
+        
+        Args:
+            emails: Iterable of Email instances
+        """
+        groups = defaultdict(list)
+        for email_obj in emails:
+            if email_obj.body_status == 'pending':
+                groups[(email_obj.email_address_id, email_obj.imap_folder or 'INBOX')].append(email_obj)
+        
+        for (_, folder), group in groups.items():
+            email_address = group[0].email_address
+            
+            try:
+                with connection_pool.connection(
+                    email_address,
+                    force_tls=self.force_tls,
+                    force_ssl=self.force_ssl
+                ) as client:
+                    self.load_folder(client, folder, group)
+            
+            except Exception as e:
+                logger.error(f"Error loading email bodies for {email_address.email}: {str(e)}")
+    
+    def load_folder(self, client, folder, emails):
+        """
+        Download the pending bodies of emails stored in one folder
+        
+        Args:
+            client: Logged-in IMAPClient instance
+            folder: Name of the IMAP folder holding the emails
+            emails: List of pending Email instances from that folder
+        """
+        client.select_folder(folder, readonly=True)
+        
+        completed = []
+        groups = defaultdict(list)
+        
+        for email_obj in emails:
+            if email_obj.imap_uid is None:
+                # The UID was dropped after a UIDVALIDITY change, find the message again
+                uids = client.search(['HEADER', 'Message-ID', email_obj.message_id]) if email_obj.message_id else []
+                if not uids:
+                    logger.warning(f"Email {email_obj.id} is no longer available in {folder}")
+                    continue
+                email_obj.imap_uid = uids[0]
+            
+            body_parts = email_obj.metadata.get('body_parts') or {}
+            if not body_parts:
+                # Nothing but attachments
+                email_obj.body_status = 'complete'
+                completed.append(email_obj)
+                continue
+            
+            # Messages with the same layout can share one FETCH command
+            part_numbers = tuple(sorted({descriptor['part'] for descriptor in body_parts.values()}))
+            groups[part_numbers].append(email_obj)
+        
+        for part_numbers, group in groups.items():
+            by_uid = {email_obj.imap_uid: email_obj for email_obj in group}
+            data_items = [f'BODY.PEEK[{number}]<0.{self.max_body_size}>' for number in part_numbers]
+            
+            for chunk, response in iter_fetch_chunks(client, sorted(by_uid), data_items, self.fetch_batch_size):
+                for uid in chunk:
+                    data = response.get(uid)
+                    if not data:
+                        logger.warning(f"Email {by_uid[uid].id} is no longer available in {folder}")
+                        continue
+                    
+                    email_obj = by_uid[uid]
+                    self._apply_parts(email_obj, data)
+                    completed.append(email_obj)
+        
+        if completed:
+            now = timezone.now()
+            for email_obj in completed:
+                email_obj.updated_at = now
+            
+            Email.objects.bulk_update(
+                completed,
+                ['body_text', 'body_html', 'body_status', 'charset', 'imap_uid', 'updated_at']
+            )
+            queue_postprocessing(completed)
+    
+    def _apply_parts(self, email_obj, data):
+        """
+        Decode fetched body parts onto an email
+        
+        Args:
+            email_obj: Email instance to complete
+            data: FETCH response data of the message
+        """
+        body_parts = email_obj.metadata['body_parts']
+        truncated = False
+        
+        if 'text' in body_parts:
+            payload = data.get(f"BODY[{body_parts['text']['part']}]<0>".encode())
+            truncated |= len(payload or b'') >= self.max_body_size
+            email_obj.body_text = self.parser.decode_body_part(payload, body_parts['text'])
+        
+        if 'html' in body_parts:
+            payload = data.get(f"BODY[{body_parts['html']['part']}]<0>".encode())
+            truncated |= len(payload or b'') >= self.max_body_size
+            email_obj.body_html = self.parser.decode_body_part(payload, body_parts['html'])
+        
+        # The text body is generated from the HTML by the post-processing stage
+        email_obj.charset = (body_parts.get('text') or body_parts.get('html'))['charset']
+        
+        email_obj.body_status = 'truncated' if truncated else 'complete'
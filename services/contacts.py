@@ -0,0 +1,169 @@
+import logging
+import threading
+from collections import OrderedDict
+from django.db import transaction
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.models import Contact
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_email(email):
+    """
+    Normalize an email address for contact lookups
+    
+    Args:
+        email: Email address as found in a header
+        
+    Returns:
+        Stripped and lowercased address
+    """
+    return (email or '').strip().lower()
+
+
+class ContactCache:
+    """
+    Bounded LRU of email address to contact ID, shared by the contact resolvers of a process
+    """
+    
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_many(self, emails):
+        """
+        Look up cached contacts
+        
+        Args:
+            emails: Iterable of normalized email addresses
+            
+        Returns:
+            Dictionary mapping the cached addresses to contact IDs
+        """
+        found = {}
+        with self._lock:
+            for email in emails:
+                contact_id = self._entries.get(email)
+                if contact_id is not None:
+                    self._entries.move_to_end(email)
+                    found[email] = contact_id
+        return found
+    
+    def set_many(self, contact_ids):
+        """
+        Remember contacts
+        
+        Args:
+            contact_ids: Dictionary mapping normalized email addresses to contact IDs
+        """
+        max_size = get_setting('EMAIL_CONTACT_CACHE_SIZE')
+        if not max_size:
+            return
+        
+        with self._lock:
+            for email, contact_id in contact_ids.items():
+                self._entries[email] = contact_id
+                self._entries.move_to_end(email)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+    
+    def discard(self, email):
+        """
+        Forget the contact of an email address
+        """
+        with self._lock:
+            self._entries.pop(normalize_email(email), None)
+    
+    def clear(self):
+        """
+        Forget all contacts, e.g. after a cached contact turned out to be deleted
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+contact_cache = ContactCache()
+
+
+class ContactResolver:
+    """
+    Resolver turning the addresses of a batch of messages into contacts
+    
+    Addresses are normalized to lowercase. Known addresses are served from
+    the per-process cache, the others cost one lookup and, when contacts
+    were missing, one insert plus one more lookup for the inserted ones.
+    """
+    
+    def __init__(self, exclude=()):
+        """
+        Initialize the resolver
+        
+        Args:
+            exclude: Email addresses that never become contacts, e.g. the account's own
+        """
+        self.exclude = {normalize_email(email) for email in exclude}
+    
+    def resolve(self, names):
+        """
+        Find or create the contacts of email addresses
+        
+        Args:
+            names: Dictionary mapping email addresses to display names, which
+                may be empty
+                
+        Returns:
+            Dictionary mapping normalized email addresses to contact IDs
+        """
+        normalized = {}
+        for email, name in names.items():
+            email = normalize_email(email)
+            if email and email not in self.exclude and not normalized.get(email):
+                normalized[email] = name or ''
+        
+        if not normalized:
+            return {}
+        
+        contact_ids = contact_cache.get_many(normalized)
+        missing = [email for email in normalized if email not in contact_ids]
+        
+        if missing:
+            found = self._lookup(missing, normalized)
+            contact_cache.set_many(found)
+            contact_ids.update(found)
+            
+            absent = [email for email in missing if email not in found]
+            if absent:
+                # Another worker may insert the same contact concurrently
+                Contact.objects.bulk_create(
+                    [Contact(email=email, name=normalized[email], is_active=True) for email in absent],
+                    ignore_conflicts=True
+                )
+                created = self._lookup(absent, normalized)
+                # Contacts inserted by a transaction that rolls back must not stay cached
+                transaction.on_commit(lambda: contact_cache.set_many(created))
+                contact_ids.update(created)
+        
+        return contact_ids
+    
+    def _lookup(self, emails, names):
+        """
+        Load stored contacts, filling in names that were blank so far
+        
+        Args:
+            emails: List of normalized email addresses
+            names: Dictionary mapping normalized email addresses to display names
+            
+        Returns:
+            Dictionary mapping the stored addresses to contact IDs
+        """
+        contacts = list(Contact.objects.filter(email__in=emails).only('id', 'email', 'name'))
+        
+        unnamed = []
+        for contact in contacts:
+            if not contact.name and names.get(contact.email):
+                contact.name = names[contact.email]
+                unnamed.append(contact)
+        if unnamed:
+            Contact.objects.bulk_update(unnamed, ['name'])
+        
+        return {contact.email: contact.pk for contact in contacts}
@@ -1,3 +1,5 @@
+import base64
+import re
 import smtplib
 import logging
 import email.utils
@@ -5,14 +7,23 @@ import uuid
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
-from email import encoders
+from email.policy import compat32
 from django.utils import timezone
 from django.db import transaction
 from superapp.apps.email.models import Email, EmailAddress
+from superapp.apps.email.services.blobs import raw_message_store
+from superapp.apps.email.services.postprocess import queue_postprocessing
+from superapp.apps.email.services.threads import EmailThreadingService
 from superapp.apps.email.utils import html_to_text
 
 logger = logging.getLogger(__name__)
 
+# Serialization policy of the SMTP DATA phase
+SMTP_POLICY = compat32.clone(linesep='\r\n')
+
+# Attachment bytes base64 encoded at a time, a multiple of 57 so every chunk is whole 76 character lines
+ATTACHMENT_CHUNK_SIZE = 57 * 1024
+
 
 class EmailDeliveryService:
     """
@@ -42,7 +53,7 @@ class EmailDeliveryService:
         status_list = ['draft', 'sending']
         if retry_errors:
             status_list.append('failed')
-            
+        
         emails = Email.objects.filter(
             direction='outgoing',
             status__in=status_list
@@ -128,7 +139,17 @@ class EmailDeliveryService:
                 # Text-only email
                 msg.attach(MIMEText(email_obj.body_text, 'plain'))
             
-            # TODO: Add attachments handling
+            # Attachments are streamed from the attachment store while sending
+            attachments = list(email_obj.attachment_files.all())
+            if attachments:
+                # The body becomes the first part of a multipart/mixed message
+                body, msg = msg, MIMEMultipart('mixed', boundary=f"=_{uuid.uuid4().hex}")
+                for name, value in body.items():
+                    if name.lower() not in ('content-type', 'mime-version'):
+                        msg[name] = value
+                        del body[name]
+                del body['MIME-Version']
+                msg.attach(body)
             
             # Connect to the SMTP server
             if self.force_ssl:
@@ -149,32 +170,174 @@ class EmailDeliveryService:
             # Get all recipients
             all_recipients = email_obj.to_emails + email_obj.cc_emails + email_obj.bcc_emails
             
-            # Send the email
-            server.sendmail(email_obj.from_email, all_recipients, msg.as_string())
-            
-            # Close the connection
-            server.quit()
+            # Send the email, keeping a copy in the raw message store
+            raw_writer = raw_message_store.writer()
+            try:
+                self.send_message(
+                    server,
+                    email_obj.from_email,
+                    all_recipients,
+                    self.iter_message(msg, attachments),
+                    raw_writer
+                )
+                
+                # Close the connection
+                server.quit()
+                
+                raw_blob = raw_writer.close()
+            finally:
+                raw_writer.discard()
             
             # Update the email status
             now = timezone.now()
             email_obj.status = 'sent'
             email_obj.sent_at = now
             email_obj.delivered_at = now
-            email_obj.raw_message = msg.as_string()
+            email_obj.raw_blob = raw_blob
             email_obj.save(update_fields=[
-                'status', 'sent_at', 'delivered_at', 'raw_message', 'updated_at'
+                'status', 'message_id', 'sent_at', 'delivered_at', 'raw_blob', 'updated_at'
             ])
             
             # Update the thread's last_message_at
             if email_obj.thread:
                 email_obj.thread.last_message_at = now
                 email_obj.thread.save(update_fields=['last_message_at', 'updated_at'])
+                # Replies to the sent email join its thread
+                EmailThreadingService(email_address).register(email_obj)
             
-            logger.info(f"Successfully delivered email: {email_obj.id}")
+            queue_postprocessing([email_obj])
             
+            logger.info(f"Successfully delivered email: {email_obj.id}")
+        
         except Exception as e:
             logger.error(f"Error delivering email {email_obj.id}: {str(e)}")
             email_obj.status = 'failed'
             email_obj.error_message = str(e)
             email_obj.save(update_fields=['status', 'error_message', 'updated_at'])
             raise
+    
+    def iter_message(self, msg, attachments):
+        """
+        Serialize a message for the SMTP DATA phase
+        
+        Attachment parts are base64 encoded from the attachment store in
+        chunks, so attachments are never held in memory at once.
+        
+        Args:
+            msg: Message with every part except the attachments, multipart/mixed
+                when there are attachments
+            attachments: Attachment instances appended as the last parts of msg
+            
+        Yields:
+            Message bytes with CRLF line endings
+        """
+        data = msg.as_bytes(policy=SMTP_POLICY)
+        if not attachments:
+            yield data
+            return
+        
+        # Everything up to the closing delimiter, which follows the attachments
+        boundary = msg.get_boundary()
+        closing = f"--{boundary}--".encode()
+        yield data[:data.rindex(closing)]
+        
+        for attachment in attachments:
+            yield f"--{boundary}\r\n".encode() + self._attachment_headers(attachment)
+            
+            with attachment.open() as content:
+                while True:
+                    chunk = content.read(ATTACHMENT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield base64.encodebytes(chunk).replace(b'\n', b'\r\n')
+        
+        yield closing + b'\r\n'
+    
+    def send_message(self, server, from_email, recipients, chunks, raw_writer=None):
+        """
+        Send a message through an SMTP connection without joining it in memory
+        
+        Follows smtplib.SMTP.sendmail() but writes the DATA phase chunk by
+        chunk, dot-stuffing lines as they pass.
+        
+        Args:
+            server: Logged-in smtplib.SMTP instance
+            from_email: Envelope sender
+            recipients: List of envelope recipients
+            chunks: Iterable of message bytes with CRLF line endings
+            raw_writer: Optional BlobWriter receiving a copy of the message
+            
+        Returns:
+            Dictionary of the refused recipients, as returned by sendmail()
+        """
+        server.ehlo_or_helo_if_needed()
+        
+        code, response = server.mail(from_email)
+        if code != 250:
+            server._rset()
+            raise smtplib.SMTPSenderRefused(code, response, from_email)
+        
+        refused = {}
+        for recipient in recipients:
+            code, response = server.rcpt(recipient)
+            if code not in (250, 251):
+                refused[recipient] = (code, response)
+        if len(refused) == len(recipients):
+            server._rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        
+        code, response = server.docmd('DATA')
+        if code != 354:
+            server._rset()
+            raise smtplib.SMTPDataError(code, response)
+        
+        at_line_start = True
+        for chunk in chunks:
+            if raw_writer is not None:
+                raw_writer.write(chunk)
+            
+            stuffed = re.sub(rb'(?m)^\.', b'..', chunk)
+            if chunk.startswith(b'.') and not at_line_start:
+                # The dot continues a line of the previous chunk
+                stuffed = stuffed[1:]
+            at_line_start = chunk.endswith(b'\n')
+            
+            server.send(stuffed)
+        
+        server.send(b'.\r\n' if at_line_start else b'\r\n.\r\n')
+        
+        code, response = server.getreply()
+        if code != 250:
+            server._rset()
+            raise smtplib.SMTPDataError(code, response)
+        
+        return refused
+    
+    def _attachment_headers(self, attachment):
+        """
+        Build the header block of an attachment part
+        
+        Args:
+            attachment: Attachment instance
+            
+        Returns:
+            Header bytes, including the empty line ending the block
+        """
+        maintype, _, subtype = attachment.content_type.partition('/')
+        part = MIMEBase(maintype, subtype) if subtype else MIMEBase('application', 'octet-stream')
+        del part['MIME-Version']
+        
+        filename = attachment.filename or 'attachment'
+        if not filename.isascii():
+            filename = ('utf-8', '', filename)
+        
+        part.add_header(
+            'Content-Disposition',
+            'inline' if attachment.content_id else 'attachment',
+            filename=filename
+        )
+        if attachment.content_id:
+            part['Content-ID'] = attachment.content_id
+        part['Content-Transfer-Encoding'] = 'base64'
+        
+        return part.as_bytes(policy=SMTP_POLICY)
@@ -0,0 +1,262 @@
+import logging
+from collections import defaultdict
+from django.db.models import Q
+from django.utils import timezone
+from superapp.apps.email.models import Email
+from superapp.apps.email.services.imap import parse_vanished, uid_fetch, uid_ranges
+
+logger = logging.getLogger(__name__)
+
+# Email fields mirroring system flags
+FLAG_FIELDS = {
+    '\\Seen': 'is_read',
+    '\\Answered': 'is_answered',
+    '\\Flagged': 'is_flagged',
+    '\\Deleted': 'is_deleted',
+}
+
+
+def flag_field_values(flags):
+    """
+    Build the Email field values for a set of IMAP flags
+    
+    Args:
+        flags: Iterable of flags as bytes or str, e.g. (b'\\Seen',)
+        
+    Returns:
+        Dictionary with the sorted flag list and the boolean flag fields
+    """
+    flags = sorted({flag.decode() if isinstance(flag, bytes) else flag for flag in flags})
+    
+    values = {'flags': flags}
+    for flag, field_name in FLAG_FIELDS.items():
+        values[field_name] = flag in flags
+    
+    return values
+
+
+def fetched_flags(response):
+    """
+    Extract the flags of every message from a FETCH response
+    
+    Args:
+        response: FETCH response mapping UID to fetched data
+        
+    Returns:
+        Dictionary mapping UID to its flags
+    """
+    return {uid: data[b'FLAGS'] for uid, data in response.items() if b'FLAGS' in data}
+
+
+def group_flag_changes(flags_by_uid):
+    """
+    Group messages by their flag set, so each set is written with one UPDATE
+    
+    Args:
+        flags_by_uid: Dictionary mapping UID to its flags
+        
+    Returns:
+        Dictionary mapping sorted flag tuples to lists of UIDs
+    """
+    groups = defaultdict(list)
+    for uid, flags in flags_by_uid.items():
+        groups[tuple(flag_field_values(flags)['flags'])].append(uid)
+    
+    return groups
+
+
+def expunged_ranges(stored_uids, present_uids):
+    """
+    Find the stored UIDs no longer on the server
+    
+    Args:
+        stored_uids: Iterable of UIDs of stored emails
+        present_uids: Set of UIDs still on the server
+        
+    Returns:
+        List of UID ranges
+    """
+    return uid_ranges(uid for uid in stored_uids if uid not in present_uids)
+
+
+class EmailFlagService:
+    """
+    Service mirroring IMAP flag changes and expunges onto stored emails
+    
+    With CONDSTORE only the flags changed since the stored HIGHESTMODSEQ are
+    fetched, with QRESYNC expunged UIDs are reported as VANISHED as well.
+    Servers supporting neither get a FLAGS scan of the synced UID range.
+    Changes are written with one UPDATE per distinct flag set. The asyncio
+    sync shares everything here but the IMAP commands.
+    """
+    
+    def __init__(self, update_batch_size=1000):
+        """
+        Initialize the flag service
+        
+        Args:
+            update_batch_size: Maximum number of UIDs per UPDATE statement
+        """
+        self.update_batch_size = update_batch_size
+    
+    def sync_flags(self, client, state, folder_info, email_address):
+        """
+        Apply the flag changes and expunges since the last pass of a folder
+        
+        Only UIDs up to the checkpoint are checked, newer messages get their
+        flags with the FETCH that imports them.
+        
+        Args:
+            client: IMAPClient instance with the folder selected
+            state: FolderSyncState instance of the folder, before new messages are imported
+            folder_info: Response of the SELECT or EXAMINE command
+            email_address: EmailAddress instance being synced
+            
+        Returns:
+            Number of emails whose flags changed or that were expunged
+        """
+        extension = getattr(client, 'sync_extension', None)
+        highest_modseq = folder_info.get(b'HIGHESTMODSEQ') if extension else None
+        request = self.plan_fetch(state, highest_modseq, extension)
+        
+        changes = 0
+        
+        if request is not None:
+            uid_set, modifiers = request
+            flags_by_uid, vanished = self.fetch_changes(client, uid_set, modifiers)
+            
+            if vanished is None:
+                # A FLAGS scan lists every message still present, CHANGEDSINCE only the changed ones
+                present = set(client.search(['UID', uid_set])) if modifiers else set(flags_by_uid)
+                vanished = self.find_expunged(email_address, state, present)
+            
+            changes = self.apply_changes(email_address, state.folder, flags_by_uid, vanished)
+        
+        state.highest_modseq = highest_modseq
+        
+        return changes
+    
+    def plan_fetch(self, state, highest_modseq, extension):
+        """
+        Decide which flags of a folder have to be fetched
+        
+        Args:
+            state: FolderSyncState instance of the folder
+            highest_modseq: HIGHESTMODSEQ of the selected folder, or None
+            extension: 'QRESYNC', 'CONDSTORE' or None
+            
+        Returns:
+            Tuple of (uid_set, modifiers) for a UID FETCH of FLAGS, with no
+            modifiers for a scan of all flags, or None when nothing changed
+        """
+        if not state.last_uid:
+            return None
+        
+        uid_set = f'1:{state.last_uid}'
+        
+        if highest_modseq is None or state.highest_modseq is None:
+            return uid_set, []
+        
+        if highest_modseq == state.highest_modseq:
+            # Nothing changed in the folder since the last pass
+            return None
+        
+        modifiers = [f'CHANGEDSINCE {state.highest_modseq}']
+        if extension == 'QRESYNC':
+            modifiers.append('VANISHED')
+        
+        return uid_set, modifiers
+    
+    def fetch_changes(self, client, uid_set, modifiers):
+        """
+        Fetch the flags of a folder as planned by plan_fetch()
+        
+        Args:
+            client: IMAPClient instance with the folder selected
+            uid_set: Sequence set of the UIDs to check
+            modifiers: FETCH modifiers, e.g. ['CHANGEDSINCE 12', 'VANISHED']
+            
+        Returns:
+            Tuple of (flags_by_uid, vanished) where vanished is a list of
+            UID ranges, or None when the server did not report expunges
+        """
+        untagged = client._imap.untagged_responses
+        
+        if 'VANISHED' in modifiers:
+            # Drop VANISHED responses left over from earlier commands
+            untagged.pop('VANISHED', None)
+        
+        flags_by_uid = fetched_flags(uid_fetch(client, uid_set, ['FLAGS'], modifiers))
+        
+        if 'VANISHED' not in modifiers:
+            return flags_by_uid, None
+        
+        vanished = []
+        for line in untagged.pop('VANISHED', []):
+            if isinstance(line, bytes):
+                vanished.extend(parse_vanished(line))
+        
+        return flags_by_uid, vanished
+    
+    def find_expunged(self, email_address, state, present_uids):
+        """
+        Find stored emails whose UID is no longer in the folder
+        
+        Args:
+            email_address: EmailAddress instance being synced
+            state: FolderSyncState instance of the folder
+            present_uids: Set of UIDs up to the checkpoint still on the server
+            
+        Returns:
+            List of UID ranges
+        """
+        stored_uids = Email.objects.filter(
+            email_address=email_address,
+            imap_folder=state.folder,
+            imap_uid__lte=state.last_uid
+        ).values_list('imap_uid', flat=True)
+        
+        return expunged_ranges(stored_uids, present_uids)
+    
+    def apply_changes(self, email_address, folder, flags_by_uid, vanished):
+        """
+        Write flag changes and expunges with set-based UPDATEs
+        
+        Args:
+            email_address: EmailAddress instance being synced
+            folder: Name of the IMAP folder
+            flags_by_uid: Dictionary mapping UID to its current flags
+            vanished: List of expunged UID ranges
+            
+        Returns:
+            Number of emails updated
+        """
+        emails = Email.objects.filter(email_address=email_address, imap_folder=folder)
+        now = timezone.now()
+        updated = 0
+        
+        # Few distinct flag combinations exist, so this is a handful of queries
+        for flags, uids in group_flag_changes(flags_by_uid).items():
+            values = flag_field_values(flags)
+            for offset in range(0, len(uids), self.update_batch_size):
+                updated += emails.filter(
+                    imap_uid__in=uids[offset:offset + self.update_batch_size]
+                ).exclude(
+                    flags=values['flags']
+                ).update(updated_at=now, **values)
+        
+        expunged = 0
+        for offset in range(0, len(vanished), self.update_batch_size):
+            condition = Q()
+            for start, end in vanished[offset:offset + self.update_batch_size]:
+                condition |= Q(imap_uid__range=(start, end))
+            # The UID no longer names a message once it has been expunged
+            expunged += emails.filter(condition).update(is_deleted=True, imap_uid=None, updated_at=now)
+        
+        if updated or expunged:
+            logger.info(
+                f"Applied {updated} flag changes and {expunged} expunges in {folder} "
+                f"for {email_address.email}"
+            )
+        
+        return updated + expunged
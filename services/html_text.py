@@ -0,0 +1,333 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import Counter, OrderedDict
+from html import unescape
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from superapp.apps.email.conf import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Converters selectable with EMAIL_HTML_TO_TEXT_BACKEND, any other value is a dotted path
+BACKENDS = {
+    'htmlparser': 'superapp.apps.email.services.html_text.htmlparser_to_text',
+    'beautifulsoup': 'superapp.apps.email.services.html_text.beautifulsoup_to_text',
+}
+
+# Tags followed by a line break in the text
+NEWLINE_TAGS = frozenset(['br', 'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li'])
+
+# Tags html.parser never expects a closing tag for, as treated by Beautiful Soup
+EMPTY_ELEMENT_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer',
+])
+
+# Tags whose text is not part of the document text
+STRING_CONTAINER_TAGS = frozenset(['rt', 'rp', 'style', 'script', 'template'])
+
+# Tags whose whitespace-only strings are kept as they are
+PRESERVE_WHITESPACE_TAGS = frozenset(['pre', 'textarea'])
+
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+def clean_text(text):
+    """
+    Normalize the text extracted from HTML
+    
+    Args:
+        text: Concatenated text of the document
+        
+    Returns:
+        Cleaned up text
+    """
+    text = re.sub(r'\n{3,}', '\n\n', text)  # Replace multiple newlines with double newlines
+    text = re.sub(r' {2,}', ' ', text)      # Replace multiple spaces with single space
+    text = unescape(text)                   # Unescape HTML entities
+    
+    return text.strip()
+
+
+def beautifulsoup_to_text(html_content):
+    """
+    Convert HTML to plain text by building a Beautiful Soup tree
+    
+    Args:
+        html_content: HTML content to convert
+        
+    Returns:
+        Plain text version of the HTML content
+    """
+    # Parse the HTML
+    soup = BeautifulSoup(html_content, 'html.parser')
+    
+    # Replace <br> and <p> tags with newlines
+    for tag in soup.find_all(['br', 'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        tag.append('\n')
+    
+    # Replace <li> tags with "* " prefix and newline
+    for li in soup.find_all('li'):
+        li.insert_before('* ')
+        li.append('\n')
+    
+    return clean_text(soup.get_text())
+
+
+def htmlparser_to_text(html_content):
+    """
+    Convert HTML to plain text in a single streaming pass
+    
+    Produces the same text as beautifulsoup_to_text() without building a
+    tree.
+    
+    Args:
+        html_content: HTML content to convert
+        
+    Returns:
+        Plain text version of the HTML content
+    """
+    parser = HTMLTextParser()
+    parser.feed(html_content)
+    parser.close()
+    
+    return clean_text(''.join(parser.pieces))
+
+
+class HTMLTextParser(HTMLParser):
+    """
+    html.parser handler collecting the text Beautiful Soup's get_text() would return
+    
+    Mirrors how Beautiful Soup builds its tree with html.parser: end tags
+    close the most recent open tag of the same name and everything opened
+    after it, unmatched end tags are ignored, whitespace-only strings
+    collapse to one space or line break, and strings inside script, style
+    and similar tags are dropped.
+    """
+    
+    def __init__(self):
+        # Beautiful Soup resolves character references itself
+        super().__init__(convert_charrefs=False)
+        self.pieces = []
+        self._data = []
+        self._stack = []
+        self._open_tags = Counter()
+        self._preserve_whitespace = []
+        self._string_containers = []
+        self._already_closed = Counter()
+    
+    def handle_starttag(self, tag, attrs, handle_empty_element=True):
+        self._flush()
+        self._push(tag)
+        
+        if handle_empty_element and tag in EMPTY_ELEMENT_TAGS:
+            self.handle_endtag(tag, check_already_closed=False)
+            # A later explicit end tag for it is redundant
+            self._already_closed[tag] += 1
+    
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_empty_element=False)
+        self.handle_endtag(tag)
+    
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and self._already_closed[tag]:
+            self._already_closed[tag] -= 1
+            return
+        
+        self._flush()
+        if self._open_tags[tag]:
+            while self._pop() != tag:
+                pass
+    
+    def handle_data(self, data):
+        self._data.append(data)
+    
+    def handle_charref(self, name):
+        if name[0] in 'xX':
+            codepoint = int(name.lstrip(name[0]), 16)
+        else:
+            codepoint = int(name)
+        
+        data = None
+        if codepoint < 256:
+            # Numeric references below 256 often mean Windows-1252 rather than Unicode
+            try:
+                data = bytearray([codepoint]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(codepoint)
+            except (ValueError, OverflowError):
+                pass
+        
+        self._data.append(data or "\N{REPLACEMENT CHARACTER}")
+    
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self._data.append(character if character is not None else f"&{name}")
+    
+    def handle_comment(self, data):
+        self._flush()
+    
+    def handle_decl(self, decl):
+        self._flush()
+    
+    def handle_pi(self, data):
+        self._flush()
+    
+    def unknown_decl(self, data):
+        self._flush()
+        
+        # CDATA sections count as text, other declarations do not
+        if data.upper().startswith('CDATA['):
+            self._data.append(data[len('CDATA['):])
+            self._flush(force=True)
+    
+    def close(self):
+        super().close()
+        self._flush()
+        
+        # Tags left open end with the document
+        while self._stack:
+            self._pop()
+    
+    def _push(self, tag):
+        """
+        Open a tag
+        """
+        self._stack.append(tag)
+        self._open_tags[tag] += 1
+        depth = len(self._stack)
+        
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_whitespace.append(depth)
+        if tag in STRING_CONTAINER_TAGS:
+            self._string_containers.append(depth)
+        if tag == 'li':
+            self.pieces.append('* ')
+    
+    def _pop(self):
+        """
+        Close the innermost open tag
+        
+        Returns:
+            Name of the closed tag
+        """
+        depth = len(self._stack)
+        tag = self._stack.pop()
+        self._open_tags[tag] -= 1
+        
+        if self._preserve_whitespace and self._preserve_whitespace[-1] == depth:
+            self._preserve_whitespace.pop()
+        if self._string_containers and self._string_containers[-1] == depth:
+            self._string_containers.pop()
+        if tag in NEWLINE_TAGS:
+            self.pieces.append('\n')
+        
+        return tag
+    
+    def _flush(self, force=False):
+        """
+        End the current string
+        
+        Args:
+            force: Keep the string even inside a string container tag
+        """
+        if not self._data:
+            return
+        
+        data = ''.join(self._data)
+        self._data = []
+        
+        if not self._preserve_whitespace and not data.strip(ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        
+        if force or not self._string_containers:
+            self.pieces.append(data)
+
+
+class HTMLTextConverter:
+    """
+    HTML to plain text conversion through the configured backend
+    
+    Results are memoized by the SHA-256 of the HTML in a per-process LRU
+    and, when EMAIL_HTML_TO_TEXT_CACHE names a Django cache, in that cache,
+    so the same newsletter received by many accounts is converted once.
+    """
+    
+    def __init__(self):
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def convert(self, html_content):
+        """
+        Convert HTML content to plain text
+        
+        Args:
+            html_content: HTML content to convert
+            
+        Returns:
+            Plain text version of the HTML content
+        """
+        backend_name = get_setting('EMAIL_HTML_TO_TEXT_BACKEND')
+        digest = hashlib.sha256(html_content.encode('utf-8', errors='surrogatepass')).hexdigest()
+        key = f"{backend_name}:{digest}"
+        
+        text = self._lru_get(key)
+        if text is not None:
+            return text
+        
+        cache_alias = get_setting('EMAIL_HTML_TO_TEXT_CACHE')
+        cache_key = f"email:html_to_text:{key}"
+        if cache_alias:
+            text = caches[cache_alias].get(cache_key)
+        
+        if text is None:
+            text = get_backend(backend_name)(html_content)
+            if cache_alias:
+                caches[cache_alias].set(cache_key, text)
+        
+        self._lru_set(key, text)
+        
+        return text
+    
+    def _lru_get(self, key):
+        with self._lock:
+            text = self._lru.get(key)
+            if text is not None:
+                self._lru.move_to_end(key)
+            return text
+    
+    def _lru_set(self, key, text):
+        max_size = get_setting('EMAIL_HTML_TO_TEXT_LRU_SIZE')
+        if not max_size:
+            return
+        
+        with self._lock:
+            self._lru[key] = text
+            self._lru.move_to_end(key)
+            while len(self._lru) > max_size:
+                self._lru.popitem(last=False)
+
+
+def get_backend(name):
+    """
+    Resolve an html_to_text backend
+    
+    Args:
+        name: Key of BACKENDS or the dotted path of a callable
+        
+    Returns:
+        Callable converting an HTML string to text
+    """
+    return import_string(BACKENDS.get(name, name))
+
+
+html_text_converter = HTMLTextConverter()
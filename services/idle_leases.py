@@ -0,0 +1,181 @@
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import uuid
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.models import IdleLease, IdleWorker
+
+logger = logging.getLogger(__name__)
+
+# Points of every worker on the hash ring, more points spread accounts more evenly
+RING_REPLICAS = 100
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping accounts to workers
+    
+    Adding or removing a worker only moves the accounts between it and its
+    neighbours on the ring, all other accounts keep their worker.
+    """
+    
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        """
+        Initialize the ring
+        
+        Args:
+            nodes: IDs of the workers as strings
+            replicas: Points of every worker on the ring
+        """
+        self.ring = sorted(
+            (self.hash(f"{node}:{replica}"), node)
+            for node in nodes
+            for replica in range(replicas)
+        )
+        self.keys = [key for key, _ in self.ring]
+    
+    @staticmethod
+    def hash(value):
+        """
+        Position of a value on the ring
+        """
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+    
+    def get_node(self, key):
+        """
+        Find the worker owning a key
+        
+        Args:
+            key: Key to look up, e.g. an email address ID as string
+            
+        Returns:
+            ID of the worker, or None when the ring is empty
+        """
+        if not self.ring:
+            return None
+        
+        index = bisect.bisect(self.keys, self.hash(key)) % len(self.ring)
+        return self.ring[index][1]
+
+
+class IdleCoordinator:
+    """
+    Membership and leases of one idle_sync worker
+    
+    Every heartbeat registers the worker, removes workers whose heartbeat
+    stopped, releases the accounts the hash ring moved to other workers and
+    claims or renews the leases of the accounts it assigns to this worker.
+    An account is only monitored while its lease is held, so two workers
+    never keep the same account in IDLE.
+    """
+    
+    def __init__(self, name=None, lease_duration=None):
+        """
+        Initialize the coordinator
+        
+        Args:
+            name: Optional name of the worker, defaults to host:pid
+            lease_duration: Seconds a lease and a heartbeat stay valid, defaults to EMAIL_IDLE_LEASE_DURATION
+        """
+        self.worker_id = uuid.uuid4()
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_duration = lease_duration or get_setting('EMAIL_IDLE_LEASE_DURATION')
+    
+    def heartbeat(self, email_address_ids):
+        """
+        Renew this worker and rebalance the leases of the given accounts
+        
+        Args:
+            email_address_ids: UUIDs as strings of all accounts to monitor
+            
+        Returns:
+            Set of the UUIDs as strings of the accounts this worker holds a lease on
+        """
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.lease_duration)
+        
+        IdleWorker.objects.update_or_create(
+            id=self.worker_id,
+            defaults={'name': self.name, 'heartbeat_at': now}
+        )
+        
+        # Leases of workers whose heartbeat stopped are deleted with them
+        dead_workers = IdleWorker.objects.filter(heartbeat_at__lt=now - timedelta(seconds=self.lease_duration))
+        for worker in dead_workers:
+            logger.warning(f"IDLE worker {worker.name} stopped sending heartbeats, taking over its accounts")
+        dead_workers.delete()
+        
+        ring = HashRing(str(worker_id) for worker_id in IdleWorker.objects.values_list('id', flat=True))
+        assigned = [
+            email_address_id for email_address_id in email_address_ids
+            if ring.get_node(email_address_id) == str(self.worker_id)
+        ]
+        
+        # Accounts moved to other workers are released for them to claim
+        IdleLease.objects.filter(worker_id=self.worker_id).exclude(email_address_id__in=assigned).delete()
+        
+        leased = {
+            str(email_address_id)
+            for email_address_id in IdleLease.objects.filter(email_address_id__in=assigned).values_list(
+                'email_address_id',
+                flat=True
+            )
+        }
+        unleased = [email_address_id for email_address_id in assigned if email_address_id not in leased]
+        if unleased:
+            self.create_leases(unleased, expires_at)
+        
+        IdleLease.objects.filter(
+            Q(worker_id=self.worker_id) | Q(expires_at__lt=now),
+            email_address_id__in=assigned
+        ).update(worker_id=self.worker_id, expires_at=expires_at, updated_at=now)
+        
+        return {
+            str(email_address_id)
+            for email_address_id in IdleLease.objects.filter(worker_id=self.worker_id).values_list(
+                'email_address_id',
+                flat=True
+            )
+        }
+    
+    def create_leases(self, email_address_ids, expires_at):
+        """
+        Insert leases of this worker for accounts nobody leases yet
+        
+        Accounts deleted since they were loaded violate the foreign key, the
+        insert is then repeated one account at a time to claim the others.
+        
+        Args:
+            email_address_ids: UUIDs as strings of the unleased accounts
+            expires_at: Expiry of the new leases
+        """
+        leases = [
+            IdleLease(email_address_id=email_address_id, worker_id=self.worker_id, expires_at=expires_at)
+            for email_address_id in email_address_ids
+        ]
+        
+        try:
+            with transaction.atomic():
+                IdleLease.objects.bulk_create(leases, ignore_conflicts=True)
+            return
+        except IntegrityError:
+            pass
+        
+        for lease in leases:
+            try:
+                with transaction.atomic():
+                    IdleLease.objects.bulk_create([lease], ignore_conflicts=True)
+            except IntegrityError:
+                logger.info(f"Email address {lease.email_address_id} was deleted, not leasing it")
+    
+    def unregister(self):
+        """
+        Remove this worker and release its leases, so other workers take its accounts over at once
+        """
+        IdleWorker.objects.filter(id=self.worker_id).delete()
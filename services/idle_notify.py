@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import select
+import threading
+from django.db import DEFAULT_DB_ALIAS, connections
+from superapp.apps.email.conf import get_setting
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL channel announcing changed email addresses to idle_sync workers
+ACCOUNT_CHANNEL = 'email_idle_accounts'
+
+# Seconds the listener waits for announcements before checking whether it was stopped
+LISTEN_POLL_INTERVAL = 1
+
+# Seconds before the listener reconnects after losing its connection
+LISTEN_RETRY_DELAY = 5
+
+
+def push_supported(using=DEFAULT_DB_ALIAS):
+    """
+    Whether changed email addresses can be pushed to idle_sync workers
+    
+    Only PostgreSQL has LISTEN/NOTIFY, workers on other databases poll for
+    changed email addresses instead.
+    """
+    return connections[using].vendor == 'postgresql' and get_setting('EMAIL_IDLE_PUSH_CHANGES')
+
+
+def notify_account_changed(email_address_id, using=DEFAULT_DB_ALIAS):
+    """
+    Announce a saved or deleted email address to the idle_sync workers
+    
+    Args:
+        email_address_id: UUID of the email address
+        using: Alias of the database the email address was written to
+    """
+    if not push_supported(using):
+        return
+    
+    try:
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [ACCOUNT_CHANNEL, str(email_address_id)])
+    except Exception as e:
+        # Workers still pick the change up with their next reconcile
+        logger.error(f"Error announcing change of email address {email_address_id}: {str(e)}")
+
+
+class AccountChangeListener:
+    """
+    Receiver of changed email addresses on a dedicated PostgreSQL connection
+    
+    LISTEN keeps the connection waiting, so it is held by a thread of its
+    own that hands every announced email address ID to the event loop.
+    After a lost connection None is handed over, as announcements may have
+    been missed while it was down.
+    """
+    
+    def __init__(self, callback):
+        """
+        Initialize the listener
+        
+        Args:
+            callback: Callable run on the event loop with the ID of every
+                changed email address as string, or None when all accounts
+                must be reloaded
+        """
+        self.callback = callback
+        self.loop = None
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """
+        Start listening, must be called from the event loop receiving the changes
+        """
+        self.loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self.run, name='email-idle-listen', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """
+        Stop listening, the thread ends within LISTEN_POLL_INTERVAL seconds
+        """
+        self._stopped.set()
+    
+    def run(self):
+        """
+        Listen for announcements until stopped, reconnecting after errors
+        """
+        reconnecting = False
+        
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = connections.create_connection(DEFAULT_DB_ALIAS)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {ACCOUNT_CHANNEL}")
+                
+                if reconnecting:
+                    self.dispatch(None)
+                
+                logger.info(f"Listening for email address changes on {ACCOUNT_CHANNEL}")
+                self.listen(connection.connection)
+            except Exception as e:
+                logger.error(f"Error listening for email address changes: {str(e)}")
+                reconnecting = True
+                self._stopped.wait(LISTEN_RETRY_DELAY)
+            finally:
+                if connection is not None:
+                    connection.close()
+    
+    def listen(self, raw_connection):
+        """
+        Hand over the announcements arriving on a connection until stopped
+        
+        Args:
+            raw_connection: psycopg2 or psycopg connection that ran LISTEN
+        """
+        # psycopg delivers announcements to handlers, psycopg2 queues them
+        psycopg3 = hasattr(raw_connection, 'add_notify_handler')
+        if psycopg3:
+            raw_connection.add_notify_handler(lambda notify: self.dispatch(notify.payload))
+        
+        while not self._stopped.is_set():
+            readable, _, _ = select.select([raw_connection.fileno()], [], [], LISTEN_POLL_INTERVAL)
+            if not readable:
+                continue
+            
+            if psycopg3:
+                raw_connection.execute("SELECT 1")
+                continue
+            
+            raw_connection.poll()
+            while raw_connection.notifies:
+                self.dispatch(raw_connection.notifies.pop(0).payload)
+    
+    def dispatch(self, payload):
+        """
+        Run the callback with an announced email address ID on the event loop
+        """
+        self.loop.call_soon_threadsafe(self.callback, payload)
@@ -1,360 +1,525 @@
+import asyncio
 import logging
-import time
-import signal
-import threading
-import queue
-from imapclient import IMAPClient
-from django.utils import timezone
-from django.db import transaction
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.db.models import Max
+from superapp.apps.email.conf import get_setting
 from superapp.apps.email.models import EmailAddress
-from superapp.apps.email.services.sync import EmailSyncService
+from superapp.apps.email.services.aioimap import AsyncIMAPError, connect_imap_async
+from superapp.apps.email.services.async_sync import AsyncEmailSyncService
+from superapp.apps.email.services.idle_leases import IdleCoordinator
+from superapp.apps.email.services.idle_notify import AccountChangeListener, push_supported
 
 logger = logging.getLogger(__name__)
 
-class IMAPIdleClient:
+# Untagged response announcing new messages, RECENT accompanies it and is dropped by IMAP4rev2
+NEW_MAIL_RESPONSE = b'EXISTS'
+
+# EmailAddress fields whose change requires a new IDLE connection
+IDLE_CONFIG_FIELDS = [
+    'imap_server', 'imap_port', 'imap_username', 'imap_password', 'imap_connection_type', 'idle_folder'
+]
+
+# Seconds before reconnecting, multiplied by the number of consecutive failures
+RECONNECT_DELAY = 30
+
+# Upper bound in seconds of the delay before reconnecting
+MAX_RECONNECT_DELAY = 300
+
+# Seconds given to a connection to end IDLE and log out when its session stops
+CLOSE_TIMEOUT = 5
+
+
+def count_new_mail(responses):
+    """
+    Count the responses announcing new messages
+    
+    Args:
+        responses: Untagged responses shaped like IMAPClient.idle_check()
+        
+    Returns:
+        Number of EXISTS responses
     """
-    Client for real-time IMAP synchronization using IDLE
+    return sum(1 for response in responses if len(response) > 1 and response[1] == NEW_MAIL_RESPONSE)
+
+
+class IdleSession:
+    """
+    IDLE connection of one account, run as a task on the supervisor's event loop
     """
     
-    def __init__(self, email_address_id):
+    def __init__(self, supervisor, email_address):
         """
-        Initialize the IDLE client
+        Initialize the session
         
         Args:
-            email_address_id: UUID of the email address to monitor
+            supervisor: IdleSupervisor running the session
+            email_address: EmailAddress instance to monitor
         """
-        self.email_address_id = email_address_id
-        self.email_address = EmailAddress.objects.get(id=email_address_id)
+        self.supervisor = supervisor
+        self.email_address = email_address
+        self.folder = email_address.idle_folder or 'INBOX'
+        self.config = tuple(getattr(email_address, name) for name in IDLE_CONFIG_FIELDS)
         self.client = None
-        self.running = False
-        self.idle_thread = None
-        self.event_queue = queue.Queue()
-        self.last_check = timezone.now()
-        self.sync_service = EmailSyncService(email_address_id=email_address_id)
-        
-        # Set up signal handlers
-        signal.signal(signal.SIGINT, self.stop)
-        signal.signal(signal.SIGTERM, self.stop)
+        self.failures = 0
+        self.task = None
+        self.events = 0
+        self.suppressed_events = 0
+        self.fetches = 0
     
-    def connect(self):
+    @property
+    def connected(self):
         """
-        Connect to the IMAP server
+        Whether the session holds a logged-in connection
         """
-        if self.client:
-            try:
-                self.client.logout()
-            except:
-                pass
-            self.client = None
+        return self.client is not None
+    
+    async def run(self):
+        """
+        Keep the account in IDLE, reconnecting with a growing delay after failures
         
-        try:
-            # Connect to the IMAP server
-            if self.email_address.imap_connection_type == EmailAddress.SSL:
-                self.client = IMAPClient(
-                    self.email_address.imap_server, 
-                    port=self.email_address.imap_port,
-                    ssl=True
-                )
-            elif self.email_address.imap_connection_type == EmailAddress.TLS:
-                self.client = IMAPClient(
-                    self.email_address.imap_server, 
-                    port=self.email_address.imap_port,
-                    ssl=False,
-                    use_uid=True
-                )
-                self.client.starttls()
-            else:
-                self.client = IMAPClient(
-                    self.email_address.imap_server, 
-                    port=self.email_address.imap_port,
-                    ssl=False
-                )
-            
-            # Login
-            self.client.login(self.email_address.imap_username, self.email_address.imap_password)
-            
-            # Select the folder to monitor
-            folder = self.email_address.idle_folder or 'INBOX'
-            self.client.select_folder(folder)
+        The session gives up after max_failures consecutive failures, the
+        supervisor starts it again with the next reconcile pass or when the
+        account is changed.
+        """
+        while True:
+            try:
+                await self.connect()
+                await self.idle_loop()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Error in IDLE session for {self.email_address.email}: {e.__class__.__name__}: {str(e)}")
+            finally:
+                await self.close()
             
-            logger.info(f"Connected to IMAP server for {self.email_address.email}")
-            return True
+            if self.failures >= self.supervisor.max_failures:
+                logger.error(
+                    f"Giving up IDLE for {self.email_address.email} after {self.failures} consecutive failures "
+                    f"until the next reconcile"
+                )
+                self.supervisor.given_up.add(str(self.email_address.id))
+                return
             
-        except Exception as e:
-            logger.error(f"Error connecting to IMAP server for {self.email_address.email}: {str(e)}")
-            self.client = None
-            return False
+            delay = min(RECONNECT_DELAY * self.failures, MAX_RECONNECT_DELAY)
+            logger.info(f"Reconnecting to IMAP server for {self.email_address.email} in {delay} seconds")
+            await asyncio.sleep(delay)
     
-    def idle_loop(self):
+    async def connect(self):
         """
-        Run the IDLE loop in a separate thread
+        Log in and sync the monitored folder, which leaves it selected
         """
-        logger.info(f"Starting IDLE loop for {self.email_address.email}")
+        self.client = await connect_imap_async(self.email_address, timeout=get_setting('EMAIL_SYNC_SOCKET_TIMEOUT'))
         
-        while self.running:
-            try:
-                if not self.client:
-                    logger.warning(f"No IMAP client for {self.email_address.email}, reconnecting...")
-                    if not self.connect():
-                        # Failed to connect, wait before retrying
-                        time.sleep(30)
-                        continue
-                
-                # Start IDLE mode
-                self.client.idle()
-                
-                # Wait for up to 10 minutes for an event
-                responses = self.client.idle_check(timeout=600)
-                
-                # End IDLE mode
-                self.client.idle_done()
-                
-                # Process responses
-                if responses:
-                    logger.debug(f"IDLE responses for {self.email_address.email}: {responses}")
-                    self.event_queue.put(responses)
-                
-                # Check if we need to reconnect (every 29 minutes to prevent timeouts)
-                if (timezone.now() - self.last_check).total_seconds() > 1740:  # 29 minutes
-                    logger.debug(f"Refreshing IMAP connection for {self.email_address.email}")
-                    try:
-                        self.client.noop()  # Send NOOP to keep connection alive
-                        self.last_check = timezone.now()
-                    except Exception as e:
-                        logger.warning(f"Error refreshing connection for {self.email_address.email}: {str(e)}")
-                        # Force reconnection
-                        self.event_queue.put(None)
-                        break
-                
-            except ConnectionError as e:
-                logger.error(f"Connection error in IDLE loop for {self.email_address.email}: {str(e)}")
-                self.event_queue.put(None)  # Signal to reconnect
-                time.sleep(5)  # Wait before reconnecting
-                break
-            except TimeoutError as e:
-                logger.error(f"Timeout error in IDLE loop for {self.email_address.email}: {str(e)}")
-                self.event_queue.put(None)  # Signal to reconnect
-                time.sleep(5)  # Wait before reconnecting
-                break
-            except Exception as e:
-                logger.error(f"Error in IDLE loop for {self.email_address.email}: {e.__class__.__name__}: {str(e)}")
-                self.event_queue.put(None)  # Signal to reconnect
-                time.sleep(5)  # Wait before reconnecting
-                break
+        # Catch up on messages that arrived while the account was not idling
+        await self.supervisor.sync_service.sync_folder(self.client, self.email_address, self.folder)
+        
+        logger.info(f"Connected to IMAP server for {self.email_address.email}")
     
-    def process_events(self):
+    async def idle_loop(self):
         """
-        Process events from the IDLE loop
+        Wait in IDLE and fetch new mail on the same connection whenever it is announced
+        
+        Announcements are coalesced: the first one is fetched at once, and
+        announcements within EMAIL_IDLE_DEBOUNCE seconds of a fetch, also
+        those arriving while it runs, are collected in IDLE until the window
+        ends and lead to one trailing fetch.
         """
-        reconnect_attempts = 0
-        max_reconnect_attempts = 5
-        reconnect_delay = 30  # seconds
+        loop = asyncio.get_running_loop()
+        renew_interval = get_setting('EMAIL_IDLE_RENEW_INTERVAL')
+        debounce = get_setting('EMAIL_IDLE_DEBOUNCE')
         
-        while self.running:
-            try:
-                # Get an event from the queue
-                event = self.event_queue.get(timeout=1)
-                
-                if event is None:
-                    # Reconnect signal
-                    reconnect_attempts += 1
-                    backoff_delay = min(reconnect_delay * reconnect_attempts, 300)  # Max 5 minutes
-                    
-                    logger.info(f"Reconnecting to IMAP server for {self.email_address.email} (attempt {reconnect_attempts})")
-                    
-                    if self.connect():
-                        # Restart the IDLE thread
-                        self.start_idle_thread()
-                        reconnect_attempts = 0  # Reset counter on successful connection
-                    else:
-                        # Wait before trying again with exponential backoff
-                        logger.warning(
-                            f"Failed to reconnect to IMAP server for {self.email_address.email}, "
-                            f"retrying in {backoff_delay} seconds..."
-                        )
-                        time.sleep(backoff_delay)
-                        
-                        # If we've tried too many times, pause for longer
-                        if reconnect_attempts >= max_reconnect_attempts:
-                            logger.error(
-                                f"Failed to reconnect after {max_reconnect_attempts} attempts for "
-                                f"{self.email_address.email}, pausing for 10 minutes"
-                            )
-                            time.sleep(600)  # 10 minutes
-                            reconnect_attempts = 0  # Reset counter
-                else:
-                    # Process the event
-                    has_new_mail = False
-                    for response in event:
-                        if response[1] == b'EXISTS' or response[1] == b'RECENT':
-                            has_new_mail = True
-                            break
-                    
-                    if has_new_mail:
-                        logger.info(f"New mail detected for {self.email_address.email}, syncing...")
-                        try:
-                            # Sync the account
-                            with transaction.atomic():
-                                self.sync_service.sync_account(self.email_address)
-                        except Exception as e:
-                            logger.error(f"Error syncing account {self.email_address.email}: {e.__class__.__name__}: {str(e)}")
-                            # If sync fails, we might need to reconnect
-                            if "Connection" in str(e) or "socket" in str(e) or "timeout" in str(e).lower():
-                                logger.warning(f"Connection issue detected, triggering reconnect for {self.email_address.email}")
-                                self.event_queue.put(None)  # Signal to reconnect
-                
-                self.event_queue.task_done()
+        fetched_at = None
+        events = 0
+        
+        while True:
+            window = fetched_at + debounce - loop.time() if fetched_at is not None else 0
+            
+            if not events or window > 0:
+                await self.client.idle()
+                self.failures = 0
                 
-            except queue.Empty:
-                # No events, continue
-                pass
-            except Exception as e:
-                logger.error(f"Error processing events for {self.email_address.email}: {e.__class__.__name__}: {str(e)}")
-                time.sleep(5)
+                if not events:
+                    # Servers end IDLE after 30 minutes, it is renewed before that
+                    events = count_new_mail(await self.client.idle_check(timeout=renew_interval))
+                    window = fetched_at + debounce - loop.time() if fetched_at is not None else 0
                 
-                # If there's a serious error, try to reconnect
-                if "Connection" in str(e) or "socket" in str(e) or "timeout" in str(e).lower():
-                    logger.warning(f"Connection issue detected in event processing, triggering reconnect for {self.email_address.email}")
-                    self.event_queue.put(None)  # Signal to reconnect
+                if events and window > 0:
+                    events += await self.debounce(window)
+                events += count_new_mail(await self.client.idle_done())
+            
+            if not events:
+                continue
+            
+            logger.info(f"New mail detected for {self.email_address.email}, syncing...")
+            self.events += events
+            self.suppressed_events += events - 1
+            await self.fetch_new_mail()
+            fetched_at = loop.time()
+            
+            # Messages announced during the fetch are fetched after the window
+            events = count_new_mail(self.client.mailbox_updates)
+            self.client.mailbox_updates = []
     
-    def start_idle_thread(self):
+    async def debounce(self, window):
         """
-        Start the IDLE thread
+        Stay in IDLE to collect further announcements until the window ends
+        
+        Args:
+            window: Seconds left until the window after the previous fetch ends
+            
+        Returns:
+            Number of announcements collected
         """
-        if self.idle_thread and self.idle_thread.is_alive():
-            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + window
+        
+        events = 0
+        while loop.time() < deadline:
+            events += count_new_mail(await self.client.idle_check(timeout=deadline - loop.time()))
         
-        self.idle_thread = threading.Thread(target=self.idle_loop)
-        self.idle_thread.daemon = True
-        self.idle_thread.start()
+        return events
     
-    def start(self):
+    async def fetch_new_mail(self):
         """
-        Start the IDLE client
+        Import the new messages on the IDLE connection before IDLE is resumed
+        
+        Errors of the connection end the session, which reconnects. Other
+        errors, e.g. from the database, are logged and the next announcement
+        retries from the checkpoint.
         """
-        if self.running:
+        try:
+            count = await self.supervisor.sync_service.sync_selected_folder(
+                self.client,
+                self.email_address,
+                self.folder
+            )
+        except (OSError, asyncio.TimeoutError, AsyncIMAPError):
+            raise
+        except Exception as e:
+            logger.error(f"Error syncing account {self.email_address.email}: {e.__class__.__name__}: {str(e)}")
             return
         
-        self.running = True
-        
-        # Connect to the IMAP server
-        if not self.connect():
-            logger.error(f"Failed to connect to IMAP server for {self.email_address.email}")
-            self.running = False
-            return False
-        
-        # Start the IDLE thread
-        self.start_idle_thread()
-        
-        # Start processing events
-        self.process_events()
-        
-        return True
+        self.fetches += 1
+        logger.info(
+            f"Fetched {count} new messages for {self.email_address.email} "
+            f"({self.suppressed_events} of {self.events} announcements coalesced so far)"
+        )
     
-    def stop(self, *args):
+    async def close(self):
         """
-        Stop the IDLE client
+        End IDLE and log out, dropping connections that do not answer in time
         """
-        logger.info(f"Stopping IDLE client for {self.email_address.email}")
-        self.running = False
-        
-        if self.idle_thread and self.idle_thread.is_alive():
-            self.idle_thread.join(timeout=5)
+        client, self.client = self.client, None
+        if client is None:
+            return
         
-        if self.client:
-            try:
-                self.client.idle_done()
-                self.client.logout()
-            except:
-                pass
-            self.client = None
+        try:
+            if client.idling:
+                await asyncio.wait_for(client.idle_done(), CLOSE_TIMEOUT)
+            await asyncio.wait_for(client.logout(), CLOSE_TIMEOUT)
+        except Exception:
+            await client.close()
 
 
-class IdleSyncManager:
+class IdleSupervisor:
     """
-    Manager for IDLE-based email synchronization
+    Supervisor holding the IDLE connections of all accounts on one asyncio event loop
+    
+    Waiting in IDLE costs one socket and one task per account. New mail is
+    fetched on the account's IDLE connection, parsed on a shared pool of
+    EMAIL_IDLE_SYNC_WORKERS threads and stored from the single thread that
+    runs database queries for the event loop, so threads and database
+    connections stay bounded however many accounts are monitored.
+    
+    Several supervisors, e.g. one idle_sync process per node, share the
+    accounts: every heartbeat claims the leases of the accounts the hash
+    ring assigns to this worker, and only accounts whose lease is held are
+    kept in IDLE.
+    
+    Saved and deleted email addresses are announced over PostgreSQL
+    LISTEN/NOTIFY, or polled by their update time on other databases, so
+    only the changed accounts are reloaded and only sessions whose
+    connection settings changed reconnect.
     """
     
-    def __init__(self):
+    def __init__(self, email_address_id=None, sync_workers=None, max_failures=10, worker_name=None):
         """
-        Initialize the IDLE sync manager
+        Initialize the supervisor
+        
+        Args:
+            email_address_id: Optional UUID of the only email address to monitor
+            sync_workers: Threads parsing new mail, defaults to EMAIL_IDLE_SYNC_WORKERS
+            max_failures: Consecutive failures after which a session waits for the next reconcile
+                or a change of its account
+            worker_name: Optional name of this worker, defaults to host:pid
         """
-        self.clients = {}
-        self.running = False
+        self.email_address_id = email_address_id
+        self.sync_workers = sync_workers or get_setting('EMAIL_IDLE_SYNC_WORKERS')
+        self.max_failures = max_failures
+        self.sessions = {}
+        self.accounts = {}
+        self.given_up = set()
+        self.sync_service = AsyncEmailSyncService(email_address_id=email_address_id)
+        self.coordinator = IdleCoordinator(name=worker_name)
+        self.leases_valid_until = None
+        self.listener = None
+        self.changed_accounts = set()
+        self.changes_since = None
+        self.reload_requested = False
+        self._stopping = None
+        self._wakeup = None
     
-    def start_client(self, email_address_id):
+    async def run(self, reconcile_interval=300):
         """
-        Start an IDLE client for an email address
+        Monitor the accounts with IDLE enabled until stop() is called
         
         Args:
-            email_address_id: UUID of the email address to monitor
+            reconcile_interval: Seconds between passes that reload all accounts,
+                a safety net for changes that were not announced. Changed
+                accounts and leases are handled every
+                EMAIL_IDLE_HEARTBEAT_INTERVAL seconds, and at once when a
+                change is announced.
         """
-        if email_address_id in self.clients:
-            return
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self.sync_service.parse_executor = ThreadPoolExecutor(
+            max_workers=self.sync_workers,
+            thread_name_prefix='email-idle-parse'
+        )
+        
+        loop = asyncio.get_running_loop()
+        heartbeat_interval = get_setting('EMAIL_IDLE_HEARTBEAT_INTERVAL')
+        next_reconcile = loop.time()
+        
+        if push_supported():
+            self.listener = AccountChangeListener(self.account_changed)
+            self.listener.start()
         
         try:
-            email_address = EmailAddress.objects.get(id=email_address_id)
-            
-            if not email_address.is_active or not email_address.use_idle:
-                logger.info(f"IDLE not enabled for {email_address.email}")
-                return
-            
-            if not email_address.imap_server or not email_address.imap_username or not email_address.imap_password:
-                logger.warning(f"Missing IMAP configuration for {email_address.email}")
-                return
+            while not self._stopping.is_set():
+                try:
+                    if self.reload_requested or loop.time() >= next_reconcile:
+                        self.reload_requested = False
+                        await self.reconcile()
+                        next_reconcile = loop.time() + reconcile_interval
+                    else:
+                        await self.reload_changed_accounts()
+                        await self.rebalance()
+                except Exception as e:
+                    logger.error(f"Error reconciling IDLE sessions: {str(e)}")
+                    await self.check_leases()
+                
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), heartbeat_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
             
-            logger.info(f"Starting IDLE client for {email_address.email}")
-            client = IMAPIdleClient(email_address_id)
-            self.clients[email_address_id] = client
+            for email_address_id in list(self.sessions):
+                await self.stop_session(email_address_id)
             
-            # Start the client in a separate thread
-            thread = threading.Thread(target=client.start)
-            thread.daemon = True
-            thread.start()
+            try:
+                await sync_to_async(self.coordinator.unregister)()
+            except Exception as e:
+                logger.error(f"Error releasing IDLE leases: {str(e)}")
             
-        except EmailAddress.DoesNotExist:
-            logger.error(f"Email address with ID {email_address_id} does not exist")
-        except Exception as e:
-            logger.error(f"Error starting IDLE client for {email_address_id}: {str(e)}")
+            self.sync_service.parse_executor.shutdown(wait=True)
+            self.sync_service.parse_executor = None
     
-    def stop_client(self, email_address_id):
+    def stop(self):
         """
-        Stop an IDLE client
+        Ask run() to stop all sessions and return
+        """
+        if self._stopping is not None:
+            self._stopping.set()
+            self._wakeup.set()
+    
+    def account_changed(self, email_address_id):
+        """
+        Queue an announced email address for reloading and wake run() up
         
         Args:
-            email_address_id: UUID of the email address to stop monitoring
+            email_address_id: UUID of the changed email address as string,
+                or None to reload all accounts
         """
-        if email_address_id not in self.clients:
-            return
+        if email_address_id is None:
+            self.reload_requested = True
+        else:
+            self.changed_accounts.add(email_address_id)
         
-        try:
-            client = self.clients[email_address_id]
-            client.stop()
-            del self.clients[email_address_id]
-            logger.info(f"Stopped IDLE client for {email_address_id}")
-        except Exception as e:
-            logger.error(f"Error stopping IDLE client for {email_address_id}: {str(e)}")
+        self._wakeup.set()
+    
+    async def reload_changed_accounts(self):
+        """
+        Reload the email addresses that were announced or polled as changed
+        """
+        if self.listener is None:
+            self.changed_accounts |= await sync_to_async(self.poll_changes)()
+        
+        pending = set(self.changed_accounts)
+        changed = set(pending)
+        if self.email_address_id:
+            changed &= {str(self.email_address_id)}
+        
+        if changed:
+            accounts = await sync_to_async(self.load_accounts)(changed)
+            for email_address_id in changed:
+                # A changed account may work again, e.g. with corrected credentials
+                self.given_up.discard(email_address_id)
+                if email_address_id in accounts:
+                    self.accounts[email_address_id] = accounts[email_address_id]
+                else:
+                    self.accounts.pop(email_address_id, None)
+            
+            logger.info(f"Reloaded {len(changed)} changed email addresses")
+        
+        self.changed_accounts -= pending
     
-    def start(self):
+    def poll_changes(self):
         """
-        Start all IDLE clients
+        Find the email addresses saved since the last poll, on databases without LISTEN/NOTIFY
+        
+        Deleted email addresses are not found, their sessions stop as their
+        leases are deleted with them and the next reconcile forgets them.
+        
+        Returns:
+            Set of the UUIDs as strings of the changed email addresses
+        """
+        if self.changes_since is None:
+            self.changes_since = EmailAddress.objects.aggregate(updated_at=Max('updated_at'))['updated_at']
+            return set()
+        
+        changed = set()
+        for email_address_id, updated_at in EmailAddress.objects.filter(
+            updated_at__gt=self.changes_since
+        ).values_list('id', 'updated_at'):
+            changed.add(str(email_address_id))
+            self.changes_since = max(self.changes_since, updated_at)
+        
+        return changed
+    
+    async def reconcile(self):
+        """
+        Reload the accounts with IDLE enabled and rebalance the sessions
+        
+        Sessions that gave up are started again.
         """
-        if self.running:
+        self.accounts = await sync_to_async(self.load_accounts)()
+        self.given_up.clear()
+        await self.rebalance()
+    
+    async def rebalance(self):
+        """
+        Send a heartbeat and start, restart and stop sessions to match the held leases
+        
+        Sessions whose connection settings changed are restarted, sessions
+        that gave up wait for the next reconcile or a change of their account.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        
+        leased = await sync_to_async(self.coordinator.heartbeat)(list(self.accounts))
+        self.leases_valid_until = started + self.coordinator.lease_duration
+        
+        for email_address_id in list(self.sessions):
+            if email_address_id not in self.accounts:
+                logger.info(f"IDLE no longer enabled for {self.sessions[email_address_id].email_address.email}")
+                await self.stop_session(email_address_id)
+            elif email_address_id not in leased:
+                logger.info(f"IDLE of {self.sessions[email_address_id].email_address.email} moved to another worker")
+                await self.stop_session(email_address_id)
+        
+        for email_address_id in leased:
+            email_address = self.accounts.get(email_address_id)
+            if email_address is None or email_address_id in self.given_up:
+                continue
+            
+            session = self.sessions.get(email_address_id)
+            if session is not None:
+                config = tuple(getattr(email_address, name) for name in IDLE_CONFIG_FIELDS)
+                if not session.task.done() and session.config == config:
+                    continue
+                await self.stop_session(email_address_id)
+            
+            self.start_session(email_address)
+    
+    async def check_leases(self):
+        """
+        Stop all sessions once their leases expired without a successful heartbeat
+        
+        Other workers take the accounts over after that, so they must no
+        longer be monitored here.
+        """
+        if not self.sessions or self.leases_valid_until is None:
             return
         
-        self.running = True
+        if asyncio.get_running_loop().time() < self.leases_valid_until:
+            return
         
-        # Get all active email addresses with IDLE enabled
+        logger.error(f"IDLE leases expired without a heartbeat, stopping {len(self.sessions)} sessions")
+        for email_address_id in list(self.sessions):
+            await self.stop_session(email_address_id)
+    
+    def load_accounts(self, email_address_ids=None):
+        """
+        Load the accounts to monitor
+        
+        Args:
+            email_address_ids: Optional UUIDs as strings limiting the accounts to load
+            
+        Returns:
+            Dictionary mapping email address ID as string to EmailAddress
+        """
         email_addresses = EmailAddress.objects.filter(is_active=True, use_idle=True)
         
+        if self.email_address_id:
+            email_addresses = email_addresses.filter(id=self.email_address_id)
+        
+        if email_address_ids is not None:
+            email_addresses = email_addresses.filter(id__in=email_address_ids)
+        
+        accounts = {}
         for email_address in email_addresses:
-            self.start_client(str(email_address.id))
+            if not email_address.imap_server or not email_address.imap_username or not email_address.imap_password:
+                logger.warning(f"Missing IMAP configuration for {email_address.email}")
+                continue
+            accounts[str(email_address.id)] = email_address
+        
+        return accounts
     
-    def stop(self):
+    def start_session(self, email_address):
         """
-        Stop all IDLE clients
+        Start the IDLE session of an account
+        
+        Args:
+            email_address: EmailAddress instance to monitor
+        """
+        logger.info(f"Starting IDLE client for {email_address.email}")
+        
+        session = IdleSession(self, email_address)
+        session.task = asyncio.create_task(session.run(), name=f"idle-{email_address.email}")
+        self.sessions[str(email_address.id)] = session
+    
+    async def stop_session(self, email_address_id):
         """
-        self.running = False
+        Stop the IDLE session of an account and wait until its connection is closed
+        
+        Args:
+            email_address_id: UUID of the email address as string
+        """
+        session = self.sessions.pop(email_address_id, None)
+        if session is None:
+            return
         
-        for email_address_id in list(self.clients.keys()):
-            self.stop_client(email_address_id)
+        session.task.cancel()
+        await asyncio.gather(session.task, return_exceptions=True)
+        logger.info(
+            f"Stopped IDLE client for {session.email_address.email} after {session.fetches} fetches "
+            f"for {session.events} announcements, {session.suppressed_events} coalesced"
+        )
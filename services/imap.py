@@ -0,0 +1,213 @@
+import logging
+from imapclient import IMAPClient
+from imapclient.response_parser import parse_fetch_response
+from superapp.apps.email.models import EmailAddress
+
+logger = logging.getLogger(__name__)
+
+# Extensions used to sync flag changes, in order of preference
+SYNC_EXTENSIONS = ('QRESYNC', 'CONDSTORE')
+
+
+def connect_imap(email_address, force_tls=False, force_ssl=False, timeout=None):
+    """
+    Open an authenticated IMAP connection for an email address
+    
+    Args:
+        email_address: EmailAddress instance to connect with
+        force_tls: Force TLS connection instead of the configured type
+        force_ssl: Force SSL connection instead of the configured type
+        timeout: Optional socket timeout in seconds
+        
+    Returns:
+        Logged-in IMAPClient instance operating on UIDs, with sync_extension
+        set to the flag sync extension enabled on the connection
+    """
+    if force_ssl:
+        use_ssl, use_starttls = True, False
+    elif force_tls:
+        use_ssl, use_starttls = False, True
+    else:
+        use_ssl = email_address.imap_connection_type == EmailAddress.SSL
+        use_starttls = email_address.imap_connection_type == EmailAddress.TLS
+    
+    client = IMAPClient(
+        email_address.imap_server,
+        port=email_address.imap_port,
+        ssl=use_ssl,
+        use_uid=True,
+        timeout=timeout
+    )
+    
+    try:
+        if use_starttls:
+            client.starttls()
+        
+        client.login(email_address.imap_username, email_address.imap_password)
+        client.sync_extension = enable_sync_extension(client)
+    except Exception:
+        try:
+            client.shutdown()
+        except Exception:
+            pass
+        raise
+    
+    return client
+
+
+def enable_sync_extension(client):
+    """
+    Enable QRESYNC, or CONDSTORE when QRESYNC is unavailable
+    
+    ENABLE is only accepted before a folder is selected, so this runs
+    right after login.
+    
+    Args:
+        client: Logged-in IMAPClient instance
+        
+    Returns:
+        'QRESYNC', 'CONDSTORE' or None when the server supports neither
+    """
+    capabilities = client.capabilities()
+    
+    for extension in SYNC_EXTENSIONS:
+        if extension.encode() not in capabilities:
+            continue
+        
+        if b'ENABLE' not in capabilities:
+            # CONDSTORE also turns on with the first CHANGEDSINCE, QRESYNC cannot
+            if extension == 'CONDSTORE':
+                return extension
+            continue
+        
+        try:
+            client.enable(extension)
+        except Exception as e:
+            logger.warning(f"Could not enable {extension}: {str(e)}")
+            continue
+        
+        return extension
+    
+    return None
+
+
+def uid_ranges(uids):
+    """
+    Collapse UIDs into inclusive (start, end) ranges
+    
+    Args:
+        uids: Iterable of integer UIDs
+        
+    Returns:
+        Sorted list of (start, end) tuples
+    """
+    ranges = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    
+    return [(start, end) for start, end in ranges]
+
+
+def format_uid_set(uids):
+    """
+    Build a compact IMAP sequence set such as "1:5,9,12:14" from UIDs
+    
+    Args:
+        uids: Iterable of integer UIDs
+        
+    Returns:
+        Sequence set string
+    """
+    return ','.join(f"{start}:{end}" if start != end else str(start) for start, end in uid_ranges(uids))
+
+
+def parse_uid_set(uid_set):
+    """
+    Parse an IMAP sequence set such as "1:5,9" into inclusive ranges
+    
+    Args:
+        uid_set: Sequence set as str or bytes, without "*"
+        
+    Returns:
+        List of (start, end) tuples
+    """
+    if isinstance(uid_set, bytes):
+        uid_set = uid_set.decode()
+    
+    ranges = []
+    for part in uid_set.split(','):
+        if not part:
+            continue
+        start, _, end = part.partition(':')
+        start, end = int(start), int(end or start)
+        ranges.append((min(start, end), max(start, end)))
+    
+    return ranges
+
+
+def parse_vanished(data):
+    """
+    Parse the UIDs of a QRESYNC VANISHED response into inclusive ranges
+    
+    Args:
+        data: Response data after the VANISHED keyword, e.g. b"(EARLIER) 1:5,9"
+        
+    Returns:
+        List of (start, end) tuples
+    """
+    return parse_uid_set(data.replace(b'(EARLIER)', b'').strip())
+
+
+def uid_fetch(client, uid_set, data_items, modifiers=None):
+    """
+    Run UID FETCH on a sequence set string
+    
+    IMAPClient.fetch() drops every message it was not given as an
+    individual UID, so sequence sets go through the imaplib connection.
+    Untagged responses other than FETCH, such as QRESYNC VANISHED, stay
+    in client._imap.untagged_responses.
+    
+    Args:
+        client: IMAPClient instance with a folder selected
+        uid_set: Sequence set string, e.g. "1:5,9"
+        data_items: FETCH data items, e.g. ['BODY.PEEK[]']
+        modifiers: Optional FETCH modifiers, e.g. ['CHANGEDSINCE 12']
+        
+    Returns:
+        Dictionary mapping UID to fetched data, shaped like IMAPClient.fetch()
+    """
+    args = [uid_set, f"({' '.join(data_items)})"]
+    if modifiers:
+        args.append(f"({' '.join(modifiers)})")
+    
+    typ, data = client._imap.uid('FETCH', *args)
+    if typ != 'OK':
+        raise IMAPClient.Error(f"UID FETCH failed: {data}")
+    
+    return dict(parse_fetch_response(
+        [item for item in data if item is not None],
+        client.normalise_times,
+        True
+    ))
+
+
+def iter_fetch_chunks(client, uids, data_items, batch_size):
+    """
+    Fetch messages in chunks of UIDs, one FETCH command per chunk
+    
+    Args:
+        client: IMAPClient instance with a folder selected
+        uids: Sorted list of UIDs to fetch
+        data_items: FETCH data items, e.g. ['BODY.PEEK[]']
+        batch_size: Maximum number of UIDs per FETCH command
+        
+    Yields:
+        Tuple of (chunk_uids, response) where response maps UID to fetched data
+    """
+    for offset in range(0, len(uids), batch_size):
+        chunk = uids[offset:offset + batch_size]
+        response = uid_fetch(client, format_uid_set(chunk), data_items)
+        yield chunk, response
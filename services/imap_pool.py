@@ -0,0 +1,246 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.services.imap import connect_imap
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """
+    Authenticated IMAP connection tracked by the connection pool
+    """
+    
+    def __init__(self, key, client):
+        self.key = key
+        self.client = client
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+    
+    def is_expired(self, max_lifetime, idle_timeout):
+        """
+        Whether the connection is too old or has been idle for too long
+        """
+        now = time.monotonic()
+        return now - self.created_at > max_lifetime or now - self.last_used_at > idle_timeout
+    
+    def close(self):
+        """
+        Log out, ignoring errors from connections that are already broken
+        """
+        try:
+            self.client.logout()
+        except Exception:
+            try:
+                self.client.shutdown()
+            except Exception:
+                pass
+
+
+class IMAPConnectionPool:
+    """
+    Per-process pool of authenticated IMAP connections keyed by email address
+    
+    Borrowed connections are exclusive to the borrower. Connections that sat
+    idle for EMAIL_IMAP_POOL_HEALTH_CHECK_AFTER seconds are checked with NOOP
+    before they are handed out, connections idle for longer than
+    EMAIL_IMAP_POOL_IDLE_TIMEOUT or older than EMAIL_IMAP_POOL_MAX_LIFETIME
+    are closed, and broken connections are replaced by a fresh login.
+    """
+    
+    def __init__(self):
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+    
+    @contextmanager
+    def connection(self, email_address, folder=None, readonly=True, force_tls=False, force_ssl=False):
+        """
+        Borrow a logged-in connection for the duration of a with block
+        
+        A connection that raised inside the block is closed instead of
+        being returned to the pool.
+        
+        Args:
+            email_address: EmailAddress instance to connect with
+            folder: Optional folder to have selected on the connection
+            readonly: Select the folder read-only
+            force_tls: Force TLS connection instead of the configured type
+            force_ssl: Force SSL connection instead of the configured type
+            
+        Yields:
+            IMAPClient instance
+        """
+        pooled = self.checkout(email_address, force_tls=force_tls, force_ssl=force_ssl)
+        
+        try:
+            if folder:
+                pooled.client.select_folder(folder, readonly=readonly)
+            yield pooled.client
+        except BaseException:
+            self.discard(pooled)
+            raise
+        else:
+            self.checkin(pooled)
+    
+    def checkout(self, email_address, force_tls=False, force_ssl=False):
+        """
+        Take a healthy connection out of the pool, or open a new one
+        
+        Args:
+            email_address: EmailAddress instance to connect with
+            force_tls: Force TLS connection instead of the configured type
+            force_ssl: Force SSL connection instead of the configured type
+            
+        Returns:
+            PooledConnection instance, to be given back with checkin() or discard()
+        """
+        key = self._key(email_address, force_tls, force_ssl)
+        
+        while True:
+            pooled = self._pop_idle(key)
+            if pooled is None:
+                break
+            
+            if time.monotonic() - pooled.last_used_at < get_setting('EMAIL_IMAP_POOL_HEALTH_CHECK_AFTER'):
+                return pooled
+            
+            try:
+                pooled.client.noop()
+                return pooled
+            except Exception as e:
+                logger.info(f"Dropping broken IMAP connection for {email_address.email}: {str(e)}")
+                pooled.close()
+        
+        client = connect_imap(
+            email_address,
+            force_tls=force_tls,
+            force_ssl=force_ssl,
+            timeout=get_setting('EMAIL_SYNC_SOCKET_TIMEOUT')
+        )
+        return PooledConnection(key, client)
+    
+    def checkin(self, pooled):
+        """
+        Give a borrowed connection back to the pool
+        
+        Args:
+            pooled: PooledConnection returned by checkout()
+        """
+        pooled.last_used_at = time.monotonic()
+        
+        if pooled.is_expired(get_setting('EMAIL_IMAP_POOL_MAX_LIFETIME'), get_setting('EMAIL_IMAP_POOL_IDLE_TIMEOUT')):
+            pooled.close()
+            return
+        
+        with self._lock:
+            self._check_fork()
+            idle = self._idle[pooled.key]
+            if len(idle) < get_setting('EMAIL_IMAP_POOL_MAX_IDLE_PER_ACCOUNT'):
+                idle.append(pooled)
+                pooled = None
+        
+        if pooled is not None:
+            pooled.close()
+        
+        self.evict_expired()
+    
+    def discard(self, pooled):
+        """
+        Close a borrowed connection instead of giving it back
+        
+        Args:
+            pooled: PooledConnection returned by checkout()
+        """
+        pooled.close()
+    
+    def evict_expired(self):
+        """
+        Close idle connections past their idle timeout or maximum lifetime
+        """
+        max_lifetime = get_setting('EMAIL_IMAP_POOL_MAX_LIFETIME')
+        idle_timeout = get_setting('EMAIL_IMAP_POOL_IDLE_TIMEOUT')
+        expired = []
+        
+        with self._lock:
+            self._check_fork()
+            for key in list(self._idle):
+                keep = []
+                for pooled in self._idle[key]:
+                    (expired if pooled.is_expired(max_lifetime, idle_timeout) else keep).append(pooled)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        
+        for pooled in expired:
+            pooled.close()
+    
+    def close_all(self):
+        """
+        Close every idle connection of the pool
+        """
+        with self._lock:
+            self._check_fork()
+            connections = [pooled for idle in self._idle.values() for pooled in idle]
+            self._idle.clear()
+        
+        for pooled in connections:
+            pooled.close()
+    
+    def _pop_idle(self, key):
+        """
+        Take the most recently used idle connection for a key
+        """
+        max_lifetime = get_setting('EMAIL_IMAP_POOL_MAX_LIFETIME')
+        idle_timeout = get_setting('EMAIL_IMAP_POOL_IDLE_TIMEOUT')
+        
+        while True:
+            with self._lock:
+                self._check_fork()
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                pooled = idle.pop()
+            
+            if not pooled.is_expired(max_lifetime, idle_timeout):
+                return pooled
+            pooled.close()
+    
+    def _check_fork(self):
+        """
+        Forget connections inherited from a parent process
+        
+        Must be called with the lock held. Sockets shared with the parent
+        cannot be used safely, so they are dropped without logging out.
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = defaultdict(list)
+    
+    def _key(self, email_address, force_tls, force_ssl):
+        """
+        Pool key, changing whenever the account's IMAP settings change
+        """
+        settings_fingerprint = hashlib.sha256(
+            '\0'.join([
+                email_address.imap_server,
+                str(email_address.imap_port),
+                email_address.imap_connection_type,
+                email_address.imap_username,
+                email_address.imap_password,
+                str(force_tls),
+                str(force_ssl),
+            ]).encode()
+        ).hexdigest()
+        
+        return (str(email_address.id), settings_fingerprint)
+
+
+# Shared by every service running in this worker process
+connection_pool = IMAPConnectionPool()
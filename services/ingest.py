@@ -0,0 +1,248 @@
+import logging
+from dataclasses import dataclass, field
+from django.db import transaction
+from django.utils import timezone
+from superapp.apps.email.models import Attachment, Email
+from superapp.apps.email.services.flags import flag_field_values
+from superapp.apps.email.services.blobs import raw_message_store
+from superapp.apps.email.services.contacts import ContactResolver, normalize_email
+from superapp.apps.email.services.postprocess import queue_postprocessing
+from superapp.apps.email.services.threads import EmailThreadingService
+from superapp.apps.email.utils import truncate_header
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestResult:
+    """
+    Outcome of ingesting a batch of parsed emails
+    """
+    inserted: int = 0
+    skipped: int = 0
+    emails: list = field(default_factory=list)
+    # UIDs of the messages that could not be stored
+    failed: list = field(default_factory=list)
+
+
+class EmailIngestService:
+    """
+    Service persisting batches of parsed incoming emails with set-based queries
+    
+    A batch costs a fixed number of queries regardless of its size: one
+    duplicate check, the contact upsert of ContactResolver, the thread resolution
+    of EmailThreadingService, one insert for the emails and one insert for
+    their attachments. Deriving text bodies and snippets is left to the post-processing
+    stage, queued when the transaction commits.
+    """
+    
+    def __init__(self, email_address):
+        """
+        Initialize the ingest service
+        
+        Args:
+            email_address: EmailAddress instance receiving the emails
+        """
+        self.email_address = email_address
+    
+    @transaction.atomic
+    def ingest(self, parsed_emails):
+        """
+        Persist a batch of parsed emails
+        
+        Args:
+            parsed_emails: Iterable of ParsedEmail instances
+            
+        Returns:
+            IngestResult with the inserted and skipped counts and the created emails
+        """
+        result = IngestResult()
+        
+        parsed_emails = list(parsed_emails)
+        for parsed in parsed_emails:
+            # Long Message-IDs are stored cut short, so duplicates are found by the stored value
+            parsed.message_id = truncate_header(parsed.message_id)
+        
+        parsed_emails = self._drop_duplicates(parsed_emails, result)
+        if not parsed_emails:
+            return result
+        
+        own_address = self.email_address.email.lower()
+        
+        contact_ids = self._resolve_contacts(parsed_emails)
+        threads = EmailThreadingService(self.email_address).resolve(parsed_emails, contact_ids)
+        
+        emails = [
+            Email(
+                email_address=self.email_address,
+                thread=threads[index],
+                # Copies from the Sent folder were written by the account itself
+                direction='outgoing' if parsed.from_email.lower() == own_address else 'incoming',
+                status='sent' if parsed.from_email.lower() == own_address else 'received',
+                message_id=parsed.message_id,
+                in_reply_to=truncate_header(parsed.in_reply_to),
+                references=parsed.references,
+                from_email=parsed.from_email,
+                from_name=truncate_header(parsed.from_name),
+                to_emails=parsed.to_emails,
+                cc_emails=parsed.cc_emails,
+                subject=truncate_header(parsed.subject),
+                body_text=parsed.body_text,
+                body_html=parsed.body_html,
+                sent_at=parsed.date,
+                delivered_at=parsed.date,
+                contact_id=contact_ids[index],
+                raw_blob=parsed.raw_blob or (raw_message_store.save(parsed.raw_message) if parsed.raw_message else ''),
+                body_status=parsed.body_status,
+                size=parsed.size,
+                charset=parsed.charset,
+                imap_folder=parsed.imap_folder,
+                imap_uid=parsed.imap_uid,
+                metadata={'body_parts': parsed.body_parts} if parsed.body_parts else {},
+                **flag_field_values(parsed.flags)
+            )
+            for index, parsed in enumerate(parsed_emails)
+        ]
+        Email.objects.bulk_create(emails)
+        
+        Attachment.objects.bulk_create([
+            Attachment(email=email_obj, **descriptor)
+            for email_obj, parsed in zip(emails, parsed_emails)
+            for descriptor in parsed.attachments
+        ])
+        
+        result.inserted = len(emails)
+        result.emails = emails
+        
+        # Derived fields are filled in once the batch is committed
+        queue_postprocessing(emails)
+        
+        logger.info(
+            f"Ingested {result.inserted} emails for {self.email_address.email} "
+            f"({result.skipped} skipped)"
+        )
+        
+        return result
+    
+    def existing_message_ids(self, message_ids):
+        """
+        Look up which Message-IDs are already stored for this email address
+        
+        Args:
+            message_ids: Iterable of Message-ID header values
+            
+        Returns:
+            Set of the given Message-IDs that already exist
+        """
+        message_ids = {message_id for message_id in message_ids if message_id}
+        if not message_ids:
+            return set()
+        
+        return set(
+            Email.objects.filter(
+                email_address=self.email_address,
+                message_id__in=message_ids
+            ).values_list('message_id', flat=True)
+        )
+    
+    def _drop_duplicates(self, parsed_emails, result):
+        """
+        Remove messages that are already stored or repeated within the batch
+        
+        Args:
+            parsed_emails: List of ParsedEmail instances
+            result: IngestResult to record skipped messages on
+            
+        Returns:
+            List of ParsedEmail instances that still need to be stored
+        """
+        stored = self.existing_message_ids(parsed.message_id for parsed in parsed_emails)
+        seen = set(stored)
+        
+        unique = []
+        copies = []
+        for parsed in parsed_emails:
+            if parsed.message_id and parsed.message_id in seen:
+                logger.info(f"Email with Message-ID {parsed.message_id} already exists, skipping")
+                result.skipped += 1
+                if parsed.message_id in stored and parsed.imap_uid is not None:
+                    copies.append(parsed)
+                continue
+            
+            if parsed.message_id:
+                seen.add(parsed.message_id)
+            unique.append(parsed)
+        
+        self._relocate(copies)
+        
+        return unique
+    
+    def _relocate(self, copies):
+        """
+        Point stored emails without a UID at a copy found in another folder
+        
+        A message stays stored once even when it shows up in several folders,
+        e.g. Gmail labels. When its original copy was expunged, or its UID
+        dropped after a UIDVALIDITY change, it follows the copy found now.
+        
+        Args:
+            copies: ParsedEmail instances of messages that are already stored
+        """
+        if not copies:
+            return
+        
+        lost = set(
+            Email.objects.filter(
+                email_address=self.email_address,
+                message_id__in={parsed.message_id for parsed in copies},
+                imap_uid__isnull=True
+            ).values_list('message_id', flat=True)
+        )
+        
+        now = timezone.now()
+        for parsed in copies:
+            if parsed.message_id not in lost:
+                continue
+            
+            Email.objects.filter(
+                email_address=self.email_address,
+                message_id=parsed.message_id
+            ).update(
+                imap_folder=parsed.imap_folder,
+                imap_uid=parsed.imap_uid,
+                updated_at=now,
+                **flag_field_values(parsed.flags)
+            )
+            lost.discard(parsed.message_id)
+    
+    def _resolve_contacts(self, parsed_emails):
+        """
+        Find or create the contacts of all senders and recipients of a batch
+        
+        Args:
+            parsed_emails: List of ParsedEmail instances
+            
+        Returns:
+            List of the contact ID of each message's correspondent, aligned
+            with parsed_emails: the sender, or the first recipient of messages
+            sent by the account itself
+        """
+        names = {}
+        for parsed in parsed_emails:
+            # Recipient headers are parsed without display names
+            for email in parsed.to_emails + parsed.cc_emails:
+                names.setdefault(email, '')
+            if parsed.from_email and (parsed.from_name or parsed.from_email not in names):
+                names[parsed.from_email] = parsed.from_name or ''
+        
+        contacts = ContactResolver(exclude=[self.email_address.email]).resolve(names)
+        
+        contact_ids = []
+        for parsed in parsed_emails:
+            correspondents = [parsed.from_email] + parsed.to_emails + parsed.cc_emails
+            contact_ids.append(next(
+                (contacts[normalize_email(email)] for email in correspondents if normalize_email(email) in contacts),
+                None
+            ))
+        
+        return contact_ids
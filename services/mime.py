@@ -0,0 +1,259 @@
+import binascii
+import logging
+from email.parser import BytesFeedParser
+from tempfile import SpooledTemporaryFile
+
+logger = logging.getLogger(__name__)
+
+# Body parts, everything else carrying a filename is stored as an attachment
+BODY_CONTENT_TYPES = ('text/plain', 'text/html')
+
+
+def is_attachment(part):
+    """
+    Whether a MIME part is an attachment rather than part of the body
+    
+    Args:
+        part: email.message.Message holding the part headers
+        
+    Returns:
+        True for parts with an attachment disposition and for named non-text parts
+    """
+    if 'attachment' in str(part.get('Content-Disposition')):
+        return True
+    
+    return bool(part.get_filename()) and part.get_content_type() not in BODY_CONTENT_TYPES
+
+
+class StreamedPart:
+    """
+    Leaf MIME part whose body was spooled while the message was streamed
+    """
+    
+    def __init__(self, headers, spool_max_memory):
+        """
+        Initialize the part
+        
+        Args:
+            headers: email.message.Message holding the part headers
+            spool_max_memory: Bytes kept in memory before the body spills to disk
+        """
+        self.headers = headers
+        self.body = SpooledTemporaryFile(max_size=spool_max_memory)
+        self.size = 0
+    
+    @property
+    def content_type(self):
+        return self.headers.get_content_type()
+    
+    @property
+    def is_attachment(self):
+        return is_attachment(self.headers)
+    
+    def write(self, data):
+        self.body.write(data)
+        self.size += len(data)
+    
+    def read(self, limit=None):
+        """
+        Read the transfer-encoded body
+        
+        Args:
+            limit: Optional maximum number of bytes to read
+            
+        Returns:
+            Body bytes, still transfer-encoded
+        """
+        self.body.seek(0)
+        return self.body.read(-1 if limit is None else limit)
+    
+    def iter_decoded(self, chunk_size=64 * 1024):
+        """
+        Read the body in chunks, undoing the transfer encoding
+        
+        Args:
+            chunk_size: Bytes of encoded data read at a time
+            
+        Yields:
+            Decoded body bytes
+        """
+        encoding = str(self.headers.get('Content-Transfer-Encoding', '7bit')).strip().lower()
+        remainder = b''
+        
+        self.body.seek(0)
+        while True:
+            data = self.body.read(chunk_size)
+            if not data:
+                break
+            
+            if encoding == 'base64':
+                # Decode whole quanta only, the rest waits for the next chunk
+                data = remainder + b''.join(data.split())
+                usable = len(data) - len(data) % 4
+                data, remainder = data[:usable], data[usable:]
+                yield binascii.a2b_base64(data)
+            elif encoding == 'quoted-printable':
+                # Decode whole lines only, so soft line breaks stay intact
+                data = remainder + data
+                usable = data.rfind(b'\n') + 1
+                data, remainder = data[:usable], data[usable:]
+                yield binascii.a2b_qp(data)
+            else:
+                yield data
+        
+        # An incomplete base64 quantum can only come from a truncated part
+        if remainder and encoding == 'quoted-printable':
+            yield binascii.a2b_qp(remainder)
+    
+    def close(self):
+        self.body.close()
+
+
+class StreamingMIMEParser:
+    """
+    Incremental MIME parser with bounded memory use
+    
+    Data is fed in arbitrary chunks, e.g. the literals of partial FETCH
+    responses. Header blocks go through email.parser.BytesFeedParser and the
+    bodies of leaf parts are written to SpooledTemporaryFile instances, so
+    memory use depends on the chunk and spool sizes rather than on the size
+    of the message.
+    """
+    
+    def __init__(self, spool_max_memory=1024 * 1024, max_line_length=64 * 1024):
+        """
+        Initialize the parser
+        
+        Args:
+            spool_max_memory: Bytes of a part body kept in memory before it spills to disk
+            max_line_length: Longest body line buffered while looking for a line break
+        """
+        self.spool_max_memory = spool_max_memory
+        self.max_line_length = max_line_length
+        self.message = None
+        self.parts = []
+        self.size = 0
+        self._buffer = b''
+        self._boundaries = []
+        self._state = 'headers'
+        self._header_parser = BytesFeedParser()
+        self._current = None
+        self._pending_eol = b''
+        self._continued_line = False
+    
+    def feed(self, data):
+        """
+        Feed the next chunk of the raw message
+        
+        Args:
+            data: Raw message bytes following the previously fed chunk
+        """
+        self.size += len(data)
+        data = self._buffer + data
+        lines = data.splitlines(keepends=True)
+        
+        # Keep an incomplete last line, and a lone CR whose LF may be in the next chunk
+        self._buffer = b''
+        if lines and (not lines[-1].endswith((b'\n', b'\r')) or lines[-1].endswith(b'\r')):
+            self._buffer = lines.pop()
+        
+        for line in lines:
+            self._feed_line(line)
+        
+        if self._state == 'body' and len(self._buffer) > self.max_line_length:
+            # Part bodies without line breaks, e.g. binary data, are written as they come
+            self._write_body(self._buffer, b'')
+            self._buffer = b''
+            self._continued_line = True
+    
+    def close(self):
+        """
+        Finish parsing
+        
+        Returns:
+            email.message.Message with the top-level headers, or None when
+            the header block was never completed
+        """
+        if self._buffer:
+            self._feed_line(self._buffer)
+            self._buffer = b''
+        
+        if self._current is not None:
+            self._current.write(self._pending_eol)
+            self._pending_eol = b''
+        self._current = None
+        
+        return self.message
+    
+    def release(self):
+        """
+        Delete the spooled part bodies
+        """
+        for part in self.parts:
+            part.close()
+    
+    def _feed_line(self, line):
+        """
+        Process one line, including its line ending
+        """
+        continued_line, self._continued_line = self._continued_line, False
+        
+        if self._state == 'headers':
+            self._header_parser.feed(line)
+            if not line.strip(b'\r\n'):
+                self._start_entity(self._header_parser.close())
+            return
+        
+        if self._boundaries and line.startswith(b'--') and not continued_line:
+            marker = line.rstrip()
+            for depth in range(len(self._boundaries) - 1, -1, -1):
+                boundary = b'--' + self._boundaries[depth]
+                if marker == boundary:
+                    self._end_part()
+                    del self._boundaries[depth + 1:]
+                    self._state = 'headers'
+                    self._header_parser = BytesFeedParser()
+                    return
+                if marker == boundary + b'--':
+                    self._end_part()
+                    del self._boundaries[depth:]
+                    self._state = 'epilogue'
+                    return
+        
+        if self._state == 'body':
+            content = line.rstrip(b'\r\n')
+            self._write_body(content, line[len(content):])
+        # Preambles and epilogues are dropped
+    
+    def _write_body(self, content, eol):
+        """
+        Append to the current part, holding back the line ending because it
+        belongs to the next boundary when one follows
+        """
+        self._current.write(self._pending_eol + content)
+        self._pending_eol = eol
+    
+    def _start_entity(self, headers):
+        """
+        Start the body of an entity whose header block is complete
+        """
+        if self.message is None:
+            self.message = headers
+        
+        boundary = headers.get_boundary() if headers.get_content_maintype() == 'multipart' else None
+        if boundary:
+            self._boundaries.append(boundary.encode('latin-1', errors='replace'))
+            self._state = 'preamble'
+            return
+        
+        self._current = StreamedPart(headers, self.spool_max_memory)
+        self.parts.append(self._current)
+        self._pending_eol = b''
+        self._state = 'body'
+    
+    def _end_part(self):
+        """
+        Close the current leaf part, dropping the line ending before its boundary
+        """
+        self._current = None
+        self._pending_eol = b''
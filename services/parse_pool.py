@@ -0,0 +1,132 @@
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import django
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.services.blobs import attachment_store, raw_message_store
+from superapp.apps.email.services.parser import EmailParser
+
+logger = logging.getLogger(__name__)
+
+# Parser of the current worker process, created on first use
+_worker_parser = None
+
+
+def parse_messages(raw_emails):
+    """
+    Parse a slice of raw messages inside a pool worker
+    
+    Raw messages are written to the raw message store here, so only the
+    compact parsed record travels back to the writer.
+    
+    Args:
+        raw_emails: List of raw email data as bytes
+        
+    Returns:
+        List of (ParsedEmail, None) or (None, error message) tuples
+    """
+    global _worker_parser
+    if _worker_parser is None:
+        _worker_parser = EmailParser(attachment_store=attachment_store)
+    
+    results = []
+    for raw_email in raw_emails:
+        try:
+            parsed = _worker_parser.parse(raw_email)
+            if parsed.raw_message:
+                parsed.raw_blob = raw_message_store.save(parsed.raw_message)
+                parsed.raw_message = ''
+            results.append((parsed, None))
+        except Exception as e:
+            results.append((None, str(e)))
+    
+    return results
+
+
+class ParsePool:
+    """
+    Process pool parsing raw messages off the syncing process
+    
+    Header and charset decoding, attachment hashing and raw message
+    compression are CPU bound, so with EMAIL_SYNC_PARSE_WORKERS set they
+    run in that many worker processes while database writes stay in the
+    syncing process. Workers are spawned rather than forked, since the
+    syncing process may run threads and hold database connections.
+    """
+    
+    def __init__(self):
+        self._executor = None
+        self._max_workers = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        """
+        Whether messages are parsed in worker processes
+        """
+        return get_setting('EMAIL_SYNC_PARSE_WORKERS') > 0
+    
+    def parse_many(self, raw_emails):
+        """
+        Parse raw messages in the worker processes
+        
+        Args:
+            raw_emails: List of raw email data as bytes
+            
+        Returns:
+            List of (ParsedEmail, None) or (None, error message) tuples,
+            aligned with raw_emails
+        """
+        if not raw_emails:
+            return []
+        
+        executor = self._get_executor()
+        
+        # A few slices per worker keep all workers busy with little pickling overhead
+        slice_size = max(1, -(-len(raw_emails) // (self._max_workers * 2)))
+        slices = [raw_emails[start:start + slice_size] for start in range(0, len(raw_emails), slice_size)]
+        
+        try:
+            results = []
+            for slice_results in executor.map(parse_messages, slices):
+                results.extend(slice_results)
+            return results
+        except BrokenProcessPool:
+            logger.warning("Parse worker died, parsing the batch in process")
+            self.shutdown()
+            return parse_messages(raw_emails)
+    
+    def shutdown(self):
+        """
+        Stop the worker processes
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _get_executor(self):
+        with self._lock:
+            max_workers = get_setting('EMAIL_SYNC_PARSE_WORKERS')
+            if self._executor is not None and self._max_workers != max_workers:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    # Workers import the app, which needs the app registry
+                    initializer=django.setup
+                )
+                self._max_workers = max_workers
+            
+            return self._executor
+
+
+parse_pool = ParsePool()
+atexit.register(parse_pool.shutdown)
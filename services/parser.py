@@ -0,0 +1,485 @@
+import base64
+import email
+import email.header
+import email.utils
+import logging
+import quopri
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+from django.utils import timezone
+from superapp.apps.email.services.mime import is_attachment
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ParsedEmail:
+    """
+    Plain, picklable representation of an incoming message, ready to be persisted
+    """
+    message_id: str
+    in_reply_to: str
+    references: str
+    subject: str
+    from_name: str
+    from_email: str
+    to_emails: list
+    cc_emails: list
+    date: datetime
+    body_text: str
+    body_html: str
+    raw_message: str
+    size: int = None
+    charset: str = ''
+    body_status: str = 'complete'
+    body_parts: dict = field(default_factory=dict)
+    imap_folder: str = ''
+    imap_uid: int = None
+    flags: tuple = ()
+    raw_blob: str = ''
+    attachments: list = field(default_factory=list)
+    
+    @property
+    def reference_ids(self):
+        """
+        Message-IDs this message refers to, nearest parent last
+        """
+        ids = re.findall(r'<[^>]+>', self.references or '')
+        for parent_id in re.findall(r'<[^>]+>', self.in_reply_to or '')[:1]:
+            if parent_id in ids:
+                ids.remove(parent_id)
+            ids.append(parent_id)
+        return ids
+
+
+class EmailParser:
+    """
+    Parser turning raw RFC 822 messages into ParsedEmail records
+    """
+    
+    def __init__(self, attachment_store=None):
+        """
+        Initialize the parser
+        
+        Args:
+            attachment_store: Optional BlobStore the attachments are written to,
+                attachments are skipped without one
+        """
+        self.attachment_store = attachment_store
+    
+    def parse(self, raw_email):
+        """
+        Parse a raw email
+        
+        Args:
+            raw_email: Raw email data as bytes
+            
+        Returns:
+            ParsedEmail instance
+        """
+        msg = email.message_from_bytes(raw_email)
+        
+        # Extract the body, the text body of HTML-only messages is generated after storing
+        body_text, body_html, charset = self._get_email_body(msg)
+        
+        return ParsedEmail(
+            body_text=body_text,
+            body_html=body_html,
+            raw_message=raw_email.decode('utf-8', errors='replace'),
+            size=len(raw_email),
+            charset=charset,
+            attachments=self._store_attachments(msg),
+            **self._parse_headers(msg)
+        )
+    
+    def parse_stream(self, stream, size=None, truncated=False, max_body_size=None):
+        """
+        Build a ParsedEmail from a message parsed with StreamingMIMEParser
+        
+        Mirrors _get_email_body: attachments are skipped and the last
+        text/plain and text/html parts win. Attachments are decoded from
+        their spooled bodies in chunks. The raw message is not kept.
+        
+        Args:
+            stream: Closed StreamingMIMEParser instance
+            size: Optional RFC822.SIZE of the message
+            truncated: Whether only the start of the message was downloaded
+            max_body_size: Optional limit in bytes for each decoded body part
+            
+        Returns:
+            ParsedEmail instance, or None when the header block was incomplete
+        """
+        if stream.message is None:
+            return None
+        
+        attachments = []
+        if self.attachment_store is not None:
+            for part in stream.parts:
+                # The last part of a truncated message is incomplete
+                if part.is_attachment and not (truncated and part is stream.parts[-1]):
+                    attachments.append(self._store_attachment(part.headers, part.iter_decoded()))
+        
+        bodies = {}
+        for part in stream.parts:
+            if part.content_type in ('text/plain', 'text/html') and not part.is_attachment:
+                bodies[part.content_type] = part
+        
+        decoded = {}
+        charsets = {}
+        for content_type, part in bodies.items():
+            if max_body_size is not None and part.size > max_body_size:
+                truncated = True
+            charsets[content_type] = part.headers.get_content_charset() or 'utf-8'
+            decoded[content_type] = self.decode_body_part(
+                part.read(max_body_size),
+                {
+                    'encoding': str(part.headers.get('Content-Transfer-Encoding', '7bit')).strip().lower(),
+                    'charset': charsets[content_type],
+                }
+            )
+        
+        return ParsedEmail(
+            body_text=decoded.get('text/plain', ''),
+            body_html=decoded.get('text/html', ''),
+            raw_message='',
+            size=size if size is not None else stream.size,
+            charset=charsets.get('text/plain') or charsets.get('text/html', ''),
+            body_status='truncated' if truncated else 'complete',
+            attachments=attachments,
+            **self._parse_headers(stream.message)
+        )
+    
+    def parse_headers(self, raw_header, body_structure=None, size=None):
+        """
+        Parse the header block of an email whose body is fetched later
+        
+        Args:
+            raw_header: Raw header data as bytes, as returned for BODY[HEADER]
+            body_structure: Optional BODYSTRUCTURE of the message
+            size: Optional RFC822.SIZE of the message
+            
+        Returns:
+            ParsedEmail instance with a pending body
+        """
+        msg = email.message_from_bytes(raw_header)
+        
+        return ParsedEmail(
+            body_text='',
+            body_html='',
+            raw_message=raw_header.decode('utf-8', errors='replace'),
+            size=size,
+            body_status='pending',
+            body_parts=self.find_body_parts(body_structure) if body_structure else {},
+            **self._parse_headers(msg)
+        )
+    
+    def find_body_parts(self, body_structure):
+        """
+        Locate the text and HTML parts of a message in its BODYSTRUCTURE
+        
+        Mirrors _get_email_body: attachments are skipped and the last
+        text/plain and text/html parts win.
+        
+        Args:
+            body_structure: BODYSTRUCTURE as parsed by IMAPClient
+            
+        Returns:
+            Dictionary with optional 'text' and 'html' entries holding the IMAP
+            part number, transfer encoding and charset of each part
+        """
+        parts = {}
+        
+        def walk(structure, number):
+            if structure.is_multipart:
+                for index, child in enumerate(structure[0], start=1):
+                    walk(child, f"{number}.{index}" if number else str(index))
+                return
+            
+            content_type = f"{self._to_str(structure[0])}/{self._to_str(structure[1])}".lower()
+            if content_type not in ('text/plain', 'text/html'):
+                return
+            
+            # Text parts carry an extra line count, so the disposition is field 9
+            disposition = structure[9] if len(structure) > 9 else None
+            if disposition and self._to_str(disposition[0]).lower() == 'attachment':
+                return
+            
+            params = structure[2] or ()
+            charset = next(
+                (self._to_str(value) for key, value in zip(params[::2], params[1::2])
+                 if self._to_str(key).lower() == 'charset'),
+                'utf-8'
+            )
+            
+            parts['text' if content_type == 'text/plain' else 'html'] = {
+                'part': number or '1',
+                'encoding': self._to_str(structure[5] or '7bit').lower(),
+                'charset': charset,
+            }
+        
+        walk(body_structure, '')
+        
+        return parts
+    
+    def decode_body_part(self, payload, descriptor):
+        """
+        Decode a body part fetched with BODY[<part>]
+        
+        Args:
+            payload: Raw part data as bytes
+            descriptor: Part description as returned by find_body_parts
+            
+        Returns:
+            Decoded part as a string
+        """
+        if payload is None:
+            return ""
+        
+        encoding = descriptor.get('encoding')
+        if encoding == 'base64':
+            # Drop line breaks and any incomplete quantum left by truncation
+            payload = b''.join(payload.split())
+            payload = base64.b64decode(payload[:len(payload) - len(payload) % 4])
+        elif encoding == 'quoted-printable':
+            payload = quopri.decodestring(payload)
+        
+        charset = descriptor.get('charset') or 'utf-8'
+        try:
+            return payload.decode(charset, errors='replace')
+        except (LookupError, TypeError):
+            return payload.decode('utf-8', errors='replace')
+    
+    def _parse_headers(self, msg):
+        """
+        Extract the header fields stored on an Email
+        
+        Args:
+            msg: Email message
+            
+        Returns:
+            Dictionary of ParsedEmail header fields
+        """
+        message_id = msg.get('Message-ID', '')
+        in_reply_to = msg.get('In-Reply-To', '')
+        references = msg.get('References', '')
+        subject = self._decode_header(msg.get('Subject', 'No Subject'))
+        from_header = self._decode_header(msg.get('From', ''))
+        to_header = self._decode_header(msg.get('To', ''))
+        cc_header = self._decode_header(msg.get('Cc', ''))
+        date_header = msg.get('Date', '')
+        
+        # Parse the from header
+        from_name, from_email = self._parse_email_header(from_header)
+        
+        # Parse the date
+        date = email.utils.parsedate_to_datetime(date_header) if date_header else timezone.now()
+        if timezone.is_naive(date):
+            # "-0000" means UTC without a known local offset
+            date = timezone.make_aware(date, dt_timezone.utc)
+        
+        return {
+            'message_id': message_id,
+            'in_reply_to': in_reply_to,
+            'references': references,
+            'subject': subject,
+            'from_name': from_name,
+            'from_email': from_email,
+            'to_emails': self._parse_recipients(to_header),
+            'cc_emails': self._parse_recipients(cc_header),
+            'date': date,
+        }
+    
+    def _store_attachments(self, msg):
+        """
+        Write the attachments of a message to the attachment store
+        
+        Args:
+            msg: Email message
+            
+        Returns:
+            List of attachment descriptors as returned by _store_attachment
+        """
+        if self.attachment_store is None:
+            return []
+        
+        attachments = []
+        for part in msg.walk():
+            if part.is_multipart() or not is_attachment(part):
+                continue
+            
+            payload = part.get_payload(decode=True)
+            if payload is None:
+                continue
+            
+            attachments.append(self._store_attachment(part, [payload]))
+        
+        return attachments
+    
+    def _store_attachment(self, headers, chunks):
+        """
+        Write one attachment to the attachment store
+        
+        Args:
+            headers: email.message.Message holding the part headers
+            chunks: Iterable of decoded content bytes
+            
+        Returns:
+            Dictionary with the filename, content type, content ID, size,
+            SHA-256 and blob key of the attachment
+        """
+        writer = self.attachment_store.writer()
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+            blob = writer.close()
+        finally:
+            writer.discard()
+        
+        return {
+            'filename': self._decode_header(headers.get_filename() or '')[:255],
+            'content_type': headers.get_content_type()[:255],
+            'content_id': str(headers.get('Content-ID', '')).strip()[:255],
+            'size': writer.size,
+            'sha256': writer.digest,
+            'blob': blob,
+        }
+    
+    def _to_str(self, value):
+        """
+        Convert a BODYSTRUCTURE atom to a string
+        """
+        if isinstance(value, bytes):
+            return value.decode('ascii', errors='replace')
+        return str(value) if value is not None else ''
+    
+    def _decode_header(self, header):
+        """
+        Decode an email header
+        
+        Args:
+            header: Email header to decode
+            
+        Returns:
+            Decoded header string
+        """
+        if not header:
+            return ""
+        
+        decoded_header = ""
+        for part, encoding in email.header.decode_header(header):
+            if isinstance(part, bytes):
+                try:
+                    decoded_part = part.decode(encoding or 'utf-8', errors='replace')
+                except (LookupError, TypeError):
+                    decoded_part = part.decode('utf-8', errors='replace')
+            else:
+                decoded_part = part
+            
+            decoded_header += decoded_part
+        
+        return decoded_header
+    
+    def _parse_email_header(self, header):
+        """
+        Parse an email header into name and email
+        
+        Args:
+            header: Email header to parse
+            
+        Returns:
+            Tuple of (name, email)
+        """
+        if not header:
+            return "", ""
+        
+        # Handles "Name <email@example.com>" as well as bare addresses
+        name, email_addr = email.utils.parseaddr(header)
+        
+        if email_addr:
+            return name.strip(), email_addr.strip()
+        
+        # If it cannot be parsed, assume it's just an email address
+        return "", header.strip()
+    
+    def _parse_recipients(self, header):
+        """
+        Parse a recipient header into a list of email addresses
+        
+        Args:
+            header: Recipient header to parse
+            
+        Returns:
+            List of email addresses
+        """
+        if not header:
+            return []
+        
+        emails = []
+        
+        # Split by commas outside of quoted display names
+        for _, email_addr in email.utils.getaddresses([header]):
+            if email_addr:
+                emails.append(email_addr.strip())
+        
+        return emails
+    
+    def _get_email_body(self, msg):
+        """
+        Extract the text and HTML body from an email
+        
+        Args:
+            msg: Email message
+            
+        Returns:
+            Tuple of (text_body, html_body, charset), the charset being the one
+            of the text body, or of the HTML body when there is no text body
+        """
+        text_body = ""
+        html_body = ""
+        charsets = {}
+        
+        if msg.is_multipart():
+            for part in msg.walk():
+                content_type = part.get_content_type()
+                content_disposition = str(part.get("Content-Disposition"))
+                
+                # Skip attachments
+                if "attachment" in content_disposition:
+                    continue
+                
+                payload = part.get_payload(decode=True)
+                if payload is None:
+                    continue
+                
+                charset = part.get_content_charset() or 'utf-8'
+                try:
+                    decoded_payload = payload.decode(charset, errors='replace')
+                except (LookupError, TypeError):
+                    decoded_payload = payload.decode('utf-8', errors='replace')
+                
+                if content_type == "text/plain":
+                    text_body = decoded_payload
+                    charsets[content_type] = charset
+                elif content_type == "text/html":
+                    html_body = decoded_payload
+                    charsets[content_type] = charset
+        else:
+            # Not multipart - get the payload directly
+            payload = msg.get_payload(decode=True)
+            if payload:
+                charset = msg.get_content_charset() or 'utf-8'
+                try:
+                    decoded_payload = payload.decode(charset, errors='replace')
+                except (LookupError, TypeError):
+                    decoded_payload = payload.decode('utf-8', errors='replace')
+                
+                content_type = msg.get_content_type()
+                if content_type == "text/plain":
+                    text_body = decoded_payload
+                    charsets[content_type] = charset
+                elif content_type == "text/html":
+                    html_body = decoded_payload
+                    charsets[content_type] = charset
+        
+        return text_body, html_body, charsets.get('text/plain') or charsets.get('text/html', '')
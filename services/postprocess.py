@@ -0,0 +1,194 @@
+import logging
+import re
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.models import Email
+from superapp.apps.email.utils import html_to_text
+
+try:
+    import langdetect
+    # Detection is randomized unless seeded
+    langdetect.DetectorFactory.seed = 0
+except ImportError:
+    langdetect = None
+
+logger = logging.getLogger(__name__)
+
+# Fields written by the post-processing stage
+DERIVED_FIELDS = ['body_text', 'snippet', 'language', 'processed_at', 'updated_at']
+
+# Characters of body text looked at when detecting the language
+LANGUAGE_SAMPLE_SIZE = 2000
+
+
+def queue_postprocessing(emails):
+    """
+    Post-process emails in the background once the current transaction commits
+    
+    Emails whose body is still pending are skipped, they are queued again
+    when their body has been downloaded.
+    
+    Args:
+        emails: Iterable of stored Email instances
+    """
+    from superapp.apps.email.tasks import postprocess_emails
+    
+    email_ids = [str(email_obj.id) for email_obj in emails if email_obj.body_status != 'pending']
+    batch_size = get_setting('EMAIL_POSTPROCESS_BATCH_SIZE')
+    
+    for start in range(0, len(email_ids), batch_size):
+        batch = email_ids[start:start + batch_size]
+        # A broker outage must not fail the ingest that already committed
+        transaction.on_commit(lambda batch=batch: postprocess_emails.delay(batch), robust=True)
+
+
+class EmailPostProcessService:
+    """
+    Service deriving the text body, snippet and language of stored emails
+    
+    Runs after ingest has committed, so converting HTML bodies does not hold
+    the sync transaction open.
+    """
+    
+    def __init__(self, snippet_length=None):
+        """
+        Initialize the post-processing service
+        
+        Args:
+            snippet_length: Characters kept in snippets, defaults to EMAIL_SNIPPET_LENGTH
+        """
+        self.snippet_length = snippet_length or get_setting('EMAIL_SNIPPET_LENGTH')
+    
+    def process_pending(self, email_ids):
+        """
+        Post-process the given emails that have not been processed yet
+        
+        Args:
+            email_ids: UUIDs of the emails to process
+        """
+        emails = Email.objects.filter(
+            id__in=email_ids,
+            processed_at__isnull=True
+        ).exclude(body_status='pending').only('id', 'body_text', 'body_html', 'body_status', 'processed_at')
+        
+        self.process(emails)
+    
+    def process_backlog(self, limit=None):
+        """
+        Post-process stored emails whose background task never ran
+        
+        The task is queued when ingest commits, so emails stored while the
+        broker was unreachable keep an empty processed_at. Emails newer than
+        EMAIL_POSTPROCESS_SWEEP_DELAY are left to the task queued for them.
+        
+        Args:
+            limit: Maximum number of emails looked at, defaults to EMAIL_POSTPROCESS_SWEEP_LIMIT
+            
+        Returns:
+            Number of emails looked at
+        """
+        limit = limit or get_setting('EMAIL_POSTPROCESS_SWEEP_LIMIT')
+        batch_size = get_setting('EMAIL_POSTPROCESS_BATCH_SIZE')
+        created_before = timezone.now() - timedelta(seconds=get_setting('EMAIL_POSTPROCESS_SWEEP_DELAY'))
+        
+        emails = Email.objects.filter(
+            processed_at__isnull=True,
+            created_at__lt=created_before
+        ).exclude(body_status='pending').only(
+            'id', 'body_text', 'body_html', 'body_status', 'processed_at'
+        ).order_by('id')
+        
+        seen = 0
+        last_id = None
+        
+        while seen < limit:
+            # Page by primary key, emails that fail to process stay unprocessed and must not be fetched again
+            batch = emails if last_id is None else emails.filter(id__gt=last_id)
+            batch = list(batch[:min(batch_size, limit - seen)])
+            if not batch:
+                break
+            
+            self.process(batch)
+            seen += len(batch)
+            last_id = batch[-1].id
+        
+        return seen
+    
+    def process(self, emails):
+        """
+        Fill in the derived fields of emails and store them with one update
+        
+        Args:
+            emails: Iterable of Email instances with a downloaded body
+        """
+        processed = []
+        now = timezone.now()
+        
+        for email_obj in emails:
+            try:
+                self.derive_fields(email_obj)
+            except Exception as e:
+                logger.error(f"Error post-processing email {email_obj.id}: {str(e)}")
+                continue
+            
+            email_obj.processed_at = now
+            email_obj.updated_at = now
+            processed.append(email_obj)
+        
+        if processed:
+            Email.objects.bulk_update(processed, DERIVED_FIELDS)
+        
+        logger.info(f"Post-processed {len(processed)} emails")
+    
+    def derive_fields(self, email_obj):
+        """
+        Compute the derived fields of one email
+        
+        Args:
+            email_obj: Email instance to update in place
+        """
+        # Generate plain text from HTML if needed
+        if email_obj.body_html and not email_obj.body_text:
+            email_obj.body_text = html_to_text(email_obj.body_html)
+        
+        email_obj.snippet = self.make_snippet(email_obj.body_text)
+        email_obj.language = self.detect_language(email_obj.body_text)
+    
+    def make_snippet(self, body_text):
+        """
+        Build the preview shown in email lists
+        
+        Args:
+            body_text: Plain text body
+            
+        Returns:
+            Start of the body on a single line, without quoted lines
+        """
+        lines = [line for line in body_text.splitlines() if not line.lstrip().startswith('>')]
+        snippet = re.sub(r'\s+', ' ', ' '.join(lines)).strip()
+        
+        if len(snippet) > self.snippet_length:
+            snippet = snippet[:self.snippet_length - 1].rstrip() + '…'
+        
+        return snippet
+    
+    def detect_language(self, body_text):
+        """
+        Detect the language of a body
+        
+        Args:
+            body_text: Plain text body
+            
+        Returns:
+            ISO 639-1 language code, or an empty string when it is unknown or
+            the langdetect package is not installed
+        """
+        if langdetect is None or not body_text.strip():
+            return ''
+        
+        try:
+            return langdetect.detect(body_text[:LANGUAGE_SAMPLE_SIZE])
+        except langdetect.LangDetectException:
+            return ''
@@ -1,25 +1,62 @@
-import imaplib
-import email
-import email.header
-import email.utils
+import itertools
 import logging
-import re
-import uuid
-from datetime import datetime
+import socket
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.db import connection, transaction
 from django.utils import timezone
-from django.db import transaction
-from superapp.apps.email.models import EmailAddress, Email, Contact, Thread
-from superapp.apps.email.utils import html_to_text
+from imapclient import IMAPClient
+from superapp.apps.email.models import EmailAddress, Email, FolderSyncState
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.services.flags import EmailFlagService
+from superapp.apps.email.services.imap import iter_fetch_chunks, uid_fetch
+from superapp.apps.email.services.imap_pool import connection_pool
+from superapp.apps.email.services.contacts import contact_cache
+from superapp.apps.email.services.ingest import EmailIngestService, IngestResult
+from superapp.apps.email.services.mime import StreamingMIMEParser
+from superapp.apps.email.services.parse_pool import parse_pool
+from superapp.apps.email.services.blobs import attachment_store, raw_message_store
+from superapp.apps.email.services.parser import EmailParser
 
 logger = logging.getLogger(__name__)
 
+# Data items fetched per message when bodies are downloaded later
+HEADER_DATA_ITEMS = ['BODY.PEEK[HEADER]', 'BODYSTRUCTURE', 'RFC822.SIZE', 'FLAGS']
+
+# Key of the first chunk of a message fetched with BODY.PEEK[]<0.n>
+FIRST_CHUNK_KEY = b'BODY[]<0>'
+
+# LIST attributes of folders that cannot be selected
+UNSELECTABLE_ATTRIBUTES = {b'\\noselect', b'\\nonexistent'}
+
+# Special-use folders that are not synced: virtual copies of other folders, drafts, junk and trash
+SKIPPED_SPECIAL_USE = {b'\\all', b'\\drafts', b'\\flagged', b'\\important', b'\\junk', b'\\trash'}
+
+# Special-use attributes recorded on synced folders, lowercased as compared
+SPECIAL_USE_ATTRIBUTES = {b'\\archive': '\\Archive', b'\\sent': '\\Sent'}
+
+# Failed attempts at parsing or storing a message after which the sync no longer fetches it again
+MAX_PARSE_ATTEMPTS = 3
+
+# FolderSyncState fields owned by the backfill
+BACKFILL_FIELDS = ['backfill_uid', 'backfill_total', 'backfill_done', 'backfill_started_at', 'backfill_completed_at']
+
+
+class SyncTimeoutError(Exception):
+    """
+    Raised when syncing an account runs past its time budget
+    """
+
 
 class EmailSyncService:
     """
     Service for synchronizing emails from IMAP servers
     """
     
-    def __init__(self, email_address_id=None, force_tls=False, force_ssl=False):
+    def __init__(self, email_address_id=None, force_tls=False, force_ssl=False, fetch_batch_size=None,
+                 headers_first=None, all_folders=False):
         """
         Initialize the sync service
         
@@ -27,85 +64,444 @@ class EmailSyncService:
             email_address_id: Optional UUID of the email address to sync
             force_tls: Force TLS connection instead of the configured type
             force_ssl: Force SSL connection instead of the configured type
+            fetch_batch_size: Messages per UID FETCH, defaults to EMAIL_SYNC_FETCH_BATCH_SIZE
+            headers_first: Only fetch headers and download bodies later,
+                defaults to EMAIL_SYNC_HEADERS_FIRST
+            all_folders: Also sync quiet folders whose next poll is not due yet
         """
         self.email_address_id = email_address_id
         self.force_tls = force_tls
         self.force_ssl = force_ssl
+        self.fetch_batch_size = fetch_batch_size or get_setting('EMAIL_SYNC_FETCH_BATCH_SIZE')
+        self.headers_first = get_setting('EMAIL_SYNC_HEADERS_FIRST') if headers_first is None else headers_first
+        self.all_folders = all_folders
+        self.stream_chunk_size = get_setting('EMAIL_SYNC_STREAM_CHUNK_SIZE')
+        self.parser = EmailParser(attachment_store=attachment_store)
+        self.flag_service = EmailFlagService()
     
-    def sync_all_accounts(self):
+    def sync_all_accounts(self, max_workers=None):
         """
         Synchronize all active email accounts
+        
+        Args:
+            max_workers: Number of accounts synced in parallel, defaults to
+                EMAIL_SYNC_MAX_WORKERS. A value of 1 syncs accounts one by one.
         """
         email_addresses = EmailAddress.objects.filter(is_active=True)
         
         if self.email_address_id:
             email_addresses = email_addresses.filter(id=self.email_address_id)
         
+        max_workers = max_workers or get_setting('EMAIL_SYNC_MAX_WORKERS')
+        if max_workers > 1:
+            self.sync_accounts_concurrently(list(email_addresses), max_workers)
+            return
+        
         for email_address in email_addresses:
             try:
                 self.sync_account(email_address)
             except Exception as e:
                 logger.error(f"Error syncing account {email_address.email}: {str(e)}")
     
-    def sync_account(self, email_address):
+    def sync_accounts_concurrently(self, email_addresses, max_workers):
+        """
+        Synchronize several accounts on a bounded pool of worker threads
+        
+        At most EMAIL_SYNC_MAX_CONNECTIONS_PER_HOST accounts of the same IMAP
+        server are synced at once, and every account gets a budget of
+        EMAIL_SYNC_ACCOUNT_TIMEOUT seconds so a slow server cannot hold up
+        the whole pass: the sync stops at the next checkpoint after the
+        budget, and a connection still waiting for the server then is shut
+        down, so every worker is free again by the end of its budget.
+        
+        Args:
+            email_addresses: List of EmailAddress instances to sync
+            max_workers: Number of worker threads
+        """
+        per_host = get_setting('EMAIL_SYNC_MAX_CONNECTIONS_PER_HOST')
+        host_slots = {
+            host: threading.BoundedSemaphore(per_host)
+            for host in {self._host_key(email_address) for email_address in email_addresses}
+        }
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='email-sync') as executor:
+            futures = {
+                executor.submit(
+                    self._sync_account_in_worker,
+                    email_address,
+                    host_slots[self._host_key(email_address)]
+                ): email_address
+                for email_address in self._interleave_by_host(email_addresses)
+            }
+            
+            for future in as_completed(futures):
+                email_address = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error syncing account {email_address.email}: {str(e)}")
+    
+    def sync_account(self, email_address, deadline=None, folders=None, due_only=None):
         """
         Synchronize a single email account
         
         Args:
             email_address: EmailAddress instance to sync
+            deadline: Optional time.monotonic() value after which the sync
+                stops at the next checkpoint, or aborts its connection when
+                the server does not answer by then
+            folders: Optional list of folder names to sync instead of the
+                account's folder set
+            due_only: Skip quiet folders whose next poll is not due yet,
+                defaults to the opposite of all_folders
         """
+        if due_only is None:
+            due_only = not self.all_folders
+        
         if not email_address.imap_server or not email_address.imap_username or not email_address.imap_password:
             logger.warning(f"Skipping sync for {email_address.email}: Missing IMAP configuration")
             return
         
         try:
-            # Connect to the IMAP server
-            if self.force_ssl:
-                mail = imaplib.IMAP4_SSL(email_address.imap_server, email_address.imap_port)
-            elif self.force_tls:
-                mail = imaplib.IMAP4(email_address.imap_server, email_address.imap_port)
-                mail.starttls()
-            elif email_address.imap_connection_type == EmailAddress.SSL:
-                mail = imaplib.IMAP4_SSL(email_address.imap_server, email_address.imap_port)
-            elif email_address.imap_connection_type == EmailAddress.TLS:
-                mail = imaplib.IMAP4(email_address.imap_server, email_address.imap_port)
-                mail.starttls()
-            else:
-                mail = imaplib.IMAP4(email_address.imap_server, email_address.imap_port)
+            # Reuse the worker's authenticated connection from the previous pass
+            with connection_pool.connection(
+                email_address,
+                force_tls=self.force_tls,
+                force_ssl=self.force_ssl
+            ) as client:
+                watchdog = None
+                timed_out = threading.Event()
+                if deadline is not None:
+                    # Reads blocked on a stalling server fail once the budget is used up
+                    watchdog = threading.Timer(
+                        max(deadline - time.monotonic(), 0),
+                        self._abort_connection,
+                        args=(client, email_address, timed_out)
+                    )
+                    watchdog.daemon = True
+                    watchdog.start()
+                
+                try:
+                    if folders is None:
+                        listing = None if email_address.sync_folders else client.list_folders()
+                        folders = self.get_sync_folders(email_address, listing, due_only=due_only)
+                    
+                    for folder in folders:
+                        try:
+                            self.sync_folder(client, email_address, folder, deadline=deadline)
+                        except IMAPClient.AbortError:
+                            raise
+                        except IMAPClient.Error as e:
+                            # The server refused this folder, the others can still be synced
+                            logger.error(f"Error syncing folder {folder} for {email_address.email}: {str(e)}")
+                finally:
+                    if watchdog is not None:
+                        watchdog.cancel()
+                        watchdog.join()
+                    
+                    # Also replaces the error of the aborted read, the connection is then not pooled again
+                    if timed_out.is_set():
+                        raise SyncTimeoutError(f"Sync of {email_address.email} ran out of time waiting for the server")
+        
+        except Exception as e:
+            logger.error(f"Error syncing account {email_address.email}: {str(e)}")
+            raise
+    
+    def sync_folder(self, client, email_address, folder, deadline=None):
+        """
+        Import the messages that arrived in a folder since the last checkpoint
+        
+        Only UIDs above the stored checkpoint are fetched. When the server
+        reports a different UIDVALIDITY the checkpoint is discarded and the
+        folder is resynced from the start; already imported messages are
+        skipped by the Message-ID check in process_email. Flag changes and
+        expunges of already imported messages are applied first.
+        
+        Args:
+            client: Logged-in IMAPClient instance
+            email_address: EmailAddress instance being synced
+            folder: Name of the IMAP folder to sync
             
-            # Login
-            mail.login(email_address.imap_username, email_address.imap_password)
+        Returns:
+            Number of messages fetched from the server
+        """
+        state = self.get_folder_state(email_address, folder)
+        
+        # EXAMINE keeps the folder read-only so syncing never changes \Seen flags
+        folder_info = client.select_folder(folder, readonly=True)
+        has_new_messages = self.apply_folder_info(state, folder_info, email_address)
+        
+        flag_changes = self.flag_service.sync_flags(client, state, folder_info, email_address)
+        
+        # Messages that failed to parse in earlier passes are fetched again
+        uids = state.retry_uids()
+        
+        if has_new_messages:
+            # "UID n:*" always matches the highest UID, even when it is below n
+            uids += sorted(
+                uid for uid in client.search(['UID', f'{state.last_uid + 1}:*'])
+                if uid > state.last_uid
+            )
+        
+        for chunk, response in iter_fetch_chunks(client, uids, self.fetch_data_items, self.fetch_batch_size):
+            parsed_emails = self.parse_fetch_response(chunk, response, folder, email_address)
+            parsed_emails += self.stream_partial_messages(client, chunk, response, folder, email_address)
+            self.store_chunk(state, chunk, parsed_emails, email_address, response=response)
             
-            # Select the inbox
-            mail.select('INBOX')
+            if deadline is not None and time.monotonic() > deadline:
+                raise SyncTimeoutError(
+                    f"Sync of {folder} for {email_address.email} ran out of time at UID {state.last_uid}"
+                )
+        
+        self.finish_folder(state, active=bool(uids or flag_changes))
+        
+        return len(uids)
+    
+    @property
+    def fetch_data_items(self):
+        """
+        FETCH data items requested for every new message
+        """
+        if self.headers_first:
+            return HEADER_DATA_ITEMS
+        
+        # Larger messages are completed by stream_partial_messages
+        return [f'BODY.PEEK[]<0.{self.stream_chunk_size}>', 'RFC822.SIZE', 'FLAGS']
+    
+    def get_sync_folders(self, email_address, listing=None, due_only=True):
+        """
+        Determine the folders of an account to sync in this pass
+        
+        Args:
+            email_address: EmailAddress instance being synced
+            listing: Result of LIST as (flags, delimiter, name) tuples, used
+                when the account has no configured sync_folders
+            due_only: Skip quiet folders whose next poll is not due yet
             
-            # Search for all unseen emails
-            status, data = mail.search(None, 'UNSEEN')
+        Returns:
+            List of folder names, INBOX first
+        """
+        folders = self.resolve_folders(email_address, listing)
+        states = {
+            state.folder: state
+            for state in FolderSyncState.objects.filter(email_address=email_address, folder__in=list(folders))
+        }
+        
+        # Record newly discovered folders and their special use
+        for folder, special_use in folders.items():
+            state = states.get(folder)
+            if state is None:
+                states[folder], _ = FolderSyncState.objects.get_or_create(
+                    email_address=email_address,
+                    folder=folder,
+                    defaults={'special_use': special_use}
+                )
+            elif state.special_use != special_use:
+                state.special_use = special_use
+                state.save(update_fields=['special_use', 'updated_at'])
+        
+        now = timezone.now()
+        return [
+            folder for folder in folders
+            if not due_only or folder == 'INBOX' or states[folder].is_due(now)
+        ]
+    
+    def resolve_folders(self, email_address, listing=None):
+        """
+        Build the folder set of an account
+        
+        Configured sync_folders win. Otherwise every selectable folder from
+        LIST is used except the special-use folders that only hold copies
+        of other folders, drafts, junk or trash.
+        
+        Args:
+            email_address: EmailAddress instance being synced
+            listing: Result of LIST as (flags, delimiter, name) tuples
+            
+        Returns:
+            Dictionary mapping folder name to its special-use attribute, INBOX first
+        """
+        if email_address.sync_folders:
+            return {folder: '' for folder in email_address.sync_folders}
+        
+        folders = {'INBOX': ''}
+        
+        for flags, _, name in listing or []:
+            attributes = {flag.lower() if isinstance(flag, bytes) else flag.lower().encode() for flag in flags}
+            if attributes & UNSELECTABLE_ATTRIBUTES or attributes & SKIPPED_SPECIAL_USE:
+                continue
             
-            if status != 'OK':
-                logger.error(f"Error searching for emails: {status}")
-                return
+            if isinstance(name, bytes):
+                name = name.decode()
+            if name.upper() == 'INBOX':
+                continue
             
-            # Process each email
-            for num in data[0].split():
-                status, data = mail.fetch(num, '(RFC822)')
+            folders[name] = next(
+                (SPECIAL_USE_ATTRIBUTES[attribute] for attribute in attributes if attribute in SPECIAL_USE_ATTRIBUTES),
+                ''
+            )
+        
+        return folders
+    
+    def get_folder_state(self, email_address, folder):
+        """
+        Load or create the sync checkpoint of a folder
+        
+        Args:
+            email_address: EmailAddress instance being synced
+            folder: Name of the IMAP folder
+            
+        Returns:
+            FolderSyncState instance
+        """
+        state, _ = FolderSyncState.objects.get_or_create(
+            email_address=email_address,
+            folder=folder
+        )
+        return state
+    
+    def apply_folder_info(self, state, folder_info, email_address):
+        """
+        Reconcile a checkpoint with the SELECT response of its folder
+        
+        Args:
+            state: FolderSyncState instance of the selected folder
+            folder_info: Response of the SELECT or EXAMINE command
+            email_address: EmailAddress instance being synced
+            
+        Returns:
+            False when the folder has no new messages, True otherwise
+        """
+        uid_validity = folder_info.get(b'UIDVALIDITY')
+        uid_next = folder_info.get(b'UIDNEXT')
+        
+        if state.uid_validity != uid_validity:
+            if state.uid_validity is not None:
+                logger.warning(
+                    f"UIDVALIDITY of {state.folder} changed for {email_address.email} "
+                    f"({state.uid_validity} -> {uid_validity}), resyncing folder"
+                )
+                # Stored UIDs now point at unrelated messages
+                Email.objects.filter(email_address=email_address, imap_folder=state.folder).update(imap_uid=None)
+            had_backfill = state.backfill_uid is not None
+            had_failures = bool(state.failed_uids)
+            state.reset(uid_validity)
+            if had_backfill or had_failures:
+                # Stop a running backfill and forget failed messages, their UIDs are no longer valid
+                state.save(
+                    update_fields=['uid_validity', 'last_uid', 'highest_modseq', 'failed_uids']
+                    + BACKFILL_FIELDS + ['updated_at']
+                )
+        
+        # New folders only import new messages, their history is left to the backfill
+        if (not state.last_uid and state.backfill_uid is None and uid_next is not None
+                and get_setting('EMAIL_SYNC_BACKFILL_HISTORY')):
+            state.start_backfill(uid_next)
+            state.save(update_fields=['uid_validity', 'last_uid'] + BACKFILL_FIELDS + ['updated_at'])
+            return False
+        
+        # The SELECT response already tells us whether anything new arrived
+        if uid_next is not None and uid_next <= state.last_uid + 1:
+            return False
+        
+        return True
+    
+    def store_chunk(self, state, uids, parsed_emails, email_address, response=None):
+        """
+        Store the messages of one FETCH chunk and advance the checkpoint
+        
+        Args:
+            state: FolderSyncState instance of the synced folder
+            uids: UIDs requested in the FETCH command
+            parsed_emails: List of ParsedEmail instances from the chunk
+            email_address: EmailAddress instance being synced
+            response: Optional FETCH response of the chunk, used to record
+                the messages that failed to parse or to be stored
                 
-                if status != 'OK':
-                    logger.error(f"Error fetching email {num}: {status}")
+        Returns:
+            IngestResult for the chunk
+        """
+        result = self.store_emails(parsed_emails, email_address)
+        
+        if self.headers_first and result.emails:
+            self._queue_body_download(result.emails)
+        
+        if response is not None:
+            self.record_failures(state, uids, response, parsed_emails, email_address, unstored=result.failed)
+        
+        # Checkpoint after every chunk so an interrupted pass resumes here, retried UIDs lie below it
+        state.last_uid = max(state.last_uid, max(uids))
+        state.save(update_fields=['uid_validity', 'last_uid', 'highest_modseq', 'updated_at'])
+        
+        return result
+    
+    def record_failures(self, state, uids, response, parsed_emails, email_address, unstored=()):
+        """
+        Remember the messages of a chunk that failed to parse or to be stored, so later passes fetch them again
+        
+        A message is given up after MAX_PARSE_ATTEMPTS failed attempts. The
+        record is updated under a row lock, as the incremental sync and the
+        backfill of a folder may run at the same time.
+        
+        Args:
+            state: FolderSyncState instance of the synced folder
+            uids: UIDs requested in the FETCH command
+            response: FETCH response of the chunk
+            parsed_emails: List of ParsedEmail instances from the chunk
+            email_address: EmailAddress instance being synced
+            unstored: UIDs of the parsed messages that could not be stored
+        """
+        parsed_uids = {parsed.imap_uid for parsed in parsed_emails} - set(unstored)
+        
+        # UIDs missing from the response were expunged and are not retried either
+        failed = {uid for uid in uids if response.get(uid) and uid not in parsed_uids}
+        retried = {uid for uid in uids if str(uid) in state.failed_uids}
+        if not failed and not retried:
+            return
+        
+        with transaction.atomic():
+            failed_uids = FolderSyncState.objects.select_for_update().values_list(
+                'failed_uids',
+                flat=True
+            ).get(pk=state.pk)
+            
+            for uid in failed | retried:
+                attempts = failed_uids.pop(str(uid), 0) + 1
+                if uid not in failed:
                     continue
                 
-                raw_email = data[0][1]
-                self.process_email(raw_email, email_address)
-            
-            # Close the connection
-            mail.close()
-            mail.logout()
+                if attempts < MAX_PARSE_ATTEMPTS:
+                    failed_uids[str(uid)] = attempts
+                else:
+                    logger.error(
+                        f"Giving up email {uid} from {state.folder} for {email_address.email} "
+                        f"after {attempts} failed attempts at parsing or storing it"
+                    )
             
-        except Exception as e:
-            logger.error(f"Error syncing account {email_address.email}: {str(e)}")
-            raise
+            FolderSyncState.objects.filter(pk=state.pk).update(failed_uids=failed_uids)
+        
+        state.failed_uids = failed_uids
+    
+    def finish_folder(self, state, active=False):
+        """
+        Record the end of a successful folder sync and schedule the next one
+        
+        Args:
+            state: FolderSyncState instance of the synced folder
+            active: Whether the sync found new messages or flag changes
+        """
+        state.last_synced_at = timezone.now()
+        # INBOX is synced on every pass, other folders back off while quiet
+        state.schedule_next(
+            active or state.folder == 'INBOX',
+            get_setting('EMAIL_SYNC_FOLDER_MIN_INTERVAL'),
+            get_setting('EMAIL_SYNC_FOLDER_MAX_INTERVAL')
+        )
+        state.save(update_fields=[
+            'uid_validity', 'last_uid', 'highest_modseq', 'last_synced_at',
+            'poll_interval', 'next_sync_at', 'updated_at'
+        ])
     
-    @transaction.atomic
     def process_email(self, raw_email, email_address):
         """
         Process a single email
@@ -113,244 +509,365 @@ class EmailSyncService:
         Args:
             raw_email: Raw email data
             email_address: EmailAddress instance
+            
+        Returns:
+            The created Email instance, or None if it already existed
         """
         try:
-            # Parse the email
-            msg = email.message_from_bytes(raw_email)
-            
-            # Extract headers
-            message_id = msg.get('Message-ID', '')
-            in_reply_to = msg.get('In-Reply-To', '')
-            references = msg.get('References', '')
-            subject = self._decode_header(msg.get('Subject', 'No Subject'))
-            from_header = self._decode_header(msg.get('From', ''))
-            to_header = self._decode_header(msg.get('To', ''))
-            cc_header = self._decode_header(msg.get('Cc', ''))
-            date_header = msg.get('Date', '')
-            
-            # Parse the from header
-            from_name, from_email = self._parse_email_header(from_header)
-            
-            # Parse the to header
-            to_emails = self._parse_recipients(to_header)
-            
-            # Parse the cc header
-            cc_emails = self._parse_recipients(cc_header)
-            
-            # Parse the date
-            date = email.utils.parsedate_to_datetime(date_header) if date_header else timezone.now()
+            parsed = self.parser.parse(raw_email)
+            result = EmailIngestService(email_address).ingest([parsed])
+        except Exception as e:
+            logger.error(f"Error processing email: {str(e)}")
+            raise
+        
+        if not result.emails:
+            return None
+        
+        email_obj = result.emails[0]
+        logger.info(f"Successfully processed incoming email: {email_obj.id}")
+        
+        return email_obj
+    
+    def process_emails(self, raw_emails, email_address):
+        """
+        Parse and store a batch of emails with a single bulk ingest
+        
+        Messages that fail to parse are logged and skipped.
+        
+        Args:
+            raw_emails: Iterable of raw email data
+            email_address: EmailAddress instance
             
-            # Extract the body
-            body_text, body_html = self._get_email_body(msg)
+        Returns:
+            IngestResult for the batch
+        """
+        raw_emails = list(raw_emails)
+        if parse_pool.enabled:
+            results = parse_pool.parse_many(raw_emails)
+        else:
+            results = [self._parse_raw(raw_email) for raw_email in raw_emails]
+        
+        parsed_emails = []
+        for parsed, error in results:
+            if parsed is None:
+                logger.error(f"Error parsing email for {email_address.email}: {error}")
+                continue
+            parsed_emails.append(parsed)
+        
+        return self.store_emails(parsed_emails, email_address)
+    
+    def store_emails(self, parsed_emails, email_address):
+        """
+        Store a batch of parsed emails with a single bulk ingest
+        
+        If the batch cannot be stored as a whole, its messages are retried
+        one by one so a single bad message does not hold back the others.
+        The UIDs of messages that still fail are listed in the result, so
+        the sync fetches them again.
+        
+        Args:
+            parsed_emails: List of ParsedEmail instances
+            email_address: EmailAddress instance
             
-            # Generate plain text from HTML if needed
-            if body_html and not body_text:
-                body_text = html_to_text(body_html)
+        Returns:
+            IngestResult for the batch
+        """
+        ingest_service = EmailIngestService(email_address)
+        
+        try:
+            return ingest_service.ingest(parsed_emails)
+        except Exception as e:
+            logger.error(f"Error storing email batch for {email_address.email}, retrying one by one: {str(e)}")
+            # A contact deleted by another process may still be cached here
+            contact_cache.clear()
+        
+        result = IngestResult()
+        for parsed in parsed_emails:
+            try:
+                single = ingest_service.ingest([parsed])
+            except Exception as e:
+                logger.error(f"Error processing email {parsed.message_id}: {str(e)}")
+                if parsed.imap_uid is not None:
+                    result.failed.append(parsed.imap_uid)
+                continue
+            result.inserted += single.inserted
+            result.skipped += single.skipped
+            result.emails.extend(single.emails)
+        
+        return result
+    
+    def parse_fetch_response(self, uids, response, folder, email_address):
+        """
+        Parse the messages of a FETCH response
+        
+        With EMAIL_SYNC_PARSE_WORKERS set, complete messages are parsed in
+        the parse pool and only the parsed records come back for storing.
+        
+        Args:
+            uids: UIDs requested in the FETCH command
+            response: FETCH response mapping UID to fetched data
+            folder: Name of the IMAP folder the messages were fetched from
+            email_address: EmailAddress instance
             
-            # Check if this email already exists
-            if message_id and Email.objects.filter(message_id=message_id).exists():
-                logger.info(f"Email with Message-ID {message_id} already exists, skipping")
-                return
+        Returns:
+            List of ParsedEmail instances
+        """
+        parsed_emails = []
+        
+        # UIDs missing from the response were expunged between SEARCH and FETCH
+        uids = [uid for uid in uids if response.get(uid)]
+        if not self.headers_first:
+            uids = [uid for uid in uids if not self.is_partial(response[uid])]
+        
+        if not self.headers_first and parse_pool.enabled and len(uids) > 1:
+            results = parse_pool.parse_many([response[uid][FIRST_CHUNK_KEY] for uid in uids])
+        else:
+            results = [self._parse_fetched(response[uid]) for uid in uids]
+        
+        for uid, (parsed, error) in zip(uids, results):
+            if parsed is None:
+                logger.error(f"Error parsing email {uid} from {folder} for {email_address.email}: {error}")
+                continue
             
-            # Find or create the contact
-            contact = None
-            if from_email:
-                contact, _ = Contact.objects.get_or_create(
-                    email=from_email,
-                    defaults={
-                        'name': from_name or '',
-                        'is_active': True
-                    }
-                )
+            data = response[uid]
+            parsed.imap_folder = folder
+            parsed.imap_uid = uid
+            parsed.flags = data.get(b'FLAGS', ())
+            parsed_emails.append(parsed)
+        
+        return parsed_emails
+    
+    def is_partial(self, data):
+        """
+        Whether only the first chunk of a message was fetched
+        
+        Args:
+            data: FETCH response data of the message
+        """
+        size = data.get(b'RFC822.SIZE')
+        return not self.headers_first and size is not None and len(data.get(FIRST_CHUNK_KEY) or b'') < size
+    
+    def stream_partial_messages(self, client, uids, response, folder, email_address):
+        """
+        Download and parse the messages of a FETCH response that did not fit in one chunk
+        
+        Args:
+            client: IMAPClient instance with the folder selected
+            uids: UIDs requested in the FETCH command
+            response: FETCH response mapping UID to fetched data
+            folder: Name of the IMAP folder the messages were fetched from
+            email_address: EmailAddress instance
             
-            # Find the thread based on In-Reply-To or References
-            thread = None
-            if in_reply_to:
-                # Try to find an email with this message ID
-                try:
-                    reply_to_email = Email.objects.get(message_id=in_reply_to)
-                    thread = reply_to_email.thread
-                except Email.DoesNotExist:
-                    pass
+        Returns:
+            List of ParsedEmail instances
+        """
+        parsed_emails = []
+        
+        for uid in uids:
+            data = response.get(uid)
+            if not data or not self.is_partial(data):
+                continue
             
-            if not thread and references:
-                # Try to find an email with any of the references
-                ref_ids = re.findall(r'<([^>]+)>', references)
-                if ref_ids:
-                    thread_emails = Email.objects.filter(message_id__in=ref_ids).select_related('thread')
-                    if thread_emails.exists():
-                        thread = thread_emails.first().thread
+            try:
+                parsed = self.stream_message(client, uid, data[FIRST_CHUNK_KEY], data[b'RFC822.SIZE'])
+            except IMAPClient.AbortError:
+                raise
+            except Exception as e:
+                logger.error(f"Error streaming email {uid} from {folder} for {email_address.email}: {str(e)}")
+                continue
             
-            # If no thread found, create a new one
-            if not thread:
-                thread = Thread.objects.create(
-                    subject=subject,
-                    participants=to_emails + ([from_email] if from_email else []),
-                    email_address=email_address,
-                    contact=contact,
-                    last_message_at=date
-                )
+            parsed.imap_folder = folder
+            parsed.imap_uid = uid
+            parsed.flags = data.get(b'FLAGS', ())
+            parsed_emails.append(parsed)
+        
+        return parsed_emails
+    
+    def stream_message(self, client, uid, first_chunk, size):
+        """
+        Download a message in partial FETCHes and parse it incrementally
+        
+        Only EMAIL_SYNC_MAX_MESSAGE_SIZE bytes are downloaded; larger
+        messages are stored truncated, or as a header-only stub when even
+        their header block did not fit.
+        
+        Args:
+            client: IMAPClient instance with the folder selected
+            uid: UID of the message
+            first_chunk: Message bytes returned by the initial FETCH
+            size: RFC822.SIZE of the message
             
-            # Create the email
-            email_obj = Email.objects.create(
-                email_address=email_address,
-                thread=thread,
-                direction='incoming',
-                status='received',
-                message_id=message_id,
-                in_reply_to=in_reply_to,
-                references=references,
-                from_email=from_email,
-                from_name=from_name,
-                to_emails=to_emails,
-                cc_emails=cc_emails,
-                subject=subject,
-                body_text=body_text,
-                body_html=body_html,
-                sent_at=date,
-                delivered_at=date,
-                contact=contact,
-                raw_message=raw_email.decode('utf-8', errors='replace')
-            )
+        Returns:
+            ParsedEmail instance
+        """
+        stream = StreamingMIMEParser(spool_max_memory=get_setting('EMAIL_SYNC_SPOOL_MAX_MEMORY'))
+        raw_writer = raw_message_store.writer()
+        limit = min(size, get_setting('EMAIL_SYNC_MAX_MESSAGE_SIZE'))
+        
+        try:
+            stream.feed(first_chunk)
+            raw_writer.write(first_chunk)
             
-            # Update the thread's last_message_at
-            thread.last_message_at = date
-            thread.save(update_fields=['last_message_at', 'updated_at'])
+            while stream.size < limit:
+                length = min(self.stream_chunk_size, limit - stream.size)
+                response = uid_fetch(client, str(uid), [f'BODY.PEEK[]<{stream.size}.{length}>'])
+                chunk = response.get(uid, {}).get(f'BODY[]<{stream.size}>'.encode())
+                if not chunk:
+                    break
+                stream.feed(chunk)
+                raw_writer.write(chunk)
             
-            logger.info(f"Successfully processed incoming email: {email_obj.id}")
+            stream.close()
+            parsed = self.finish_stream(client, uid, stream, size)
             
-            return email_obj
+            # Truncated messages keep no raw copy
+            if stream.size >= size:
+                parsed.raw_blob = raw_writer.close()
             
-        except Exception as e:
-            logger.error(f"Error processing email: {str(e)}")
-            raise
+            return parsed
+        finally:
+            raw_writer.discard()
+            stream.release()
     
-    def _decode_header(self, header):
+    def finish_stream(self, client, uid, stream, size):
         """
-        Decode an email header
+        Build the ParsedEmail of a streamed message, falling back to a stub
         
         Args:
-            header: Email header to decode
+            client: IMAPClient instance with the folder selected
+            uid: UID of the message
+            stream: Closed StreamingMIMEParser instance
+            size: RFC822.SIZE of the message
             
         Returns:
-            Decoded header string
+            ParsedEmail instance
         """
-        if not header:
-            return ""
+        parsed = self.parser.parse_stream(
+            stream,
+            size=size,
+            truncated=stream.size < size,
+            max_body_size=get_setting('EMAIL_SYNC_MAX_BODY_SIZE')
+        )
+        if parsed is not None:
+            return parsed
         
-        decoded_header = ""
-        for part, encoding in email.header.decode_header(header):
-            if isinstance(part, bytes):
-                try:
-                    decoded_part = part.decode(encoding or 'utf-8', errors='replace')
-                except (LookupError, TypeError):
-                    decoded_part = part.decode('utf-8', errors='replace')
-            else:
-                decoded_part = part
-            
-            decoded_header += decoded_part
-        
-        return decoded_header
+        raw_header = uid_fetch(client, str(uid), ['BODY.PEEK[HEADER]']).get(uid, {}).get(b'BODY[HEADER]', b'')
+        parsed = self.parser.parse_headers(raw_header, size=size)
+        parsed.body_status = 'truncated'
+        return parsed
     
-    def _parse_email_header(self, header):
+    def _parse_fetched(self, data):
         """
-        Parse an email header into name and email
+        Parse the FETCH data of one message in this process
         
         Args:
-            header: Email header to parse
+            data: FETCH response data of the message
             
         Returns:
-            Tuple of (name, email)
+            (ParsedEmail, None) tuple, or (None, error message) when parsing failed
         """
-        if not header:
-            return "", ""
-        
-        # Try to match "Name <email@example.com>" format
-        match = re.match(r'"?([^"<]+)"?\s*<?([^>]+)>?', header)
+        if not self.headers_first:
+            return self._parse_raw(data[FIRST_CHUNK_KEY])
         
-        if match:
-            name = match.group(1).strip()
-            email_addr = match.group(2).strip()
-            return name, email_addr
-        
-        # If no match, assume it's just an email address
-        return "", header.strip()
+        try:
+            return self.parser.parse_headers(
+                data[b'BODY[HEADER]'],
+                body_structure=data.get(b'BODYSTRUCTURE'),
+                size=data.get(b'RFC822.SIZE')
+            ), None
+        except Exception as e:
+            return None, str(e)
     
-    def _parse_recipients(self, header):
+    def _parse_raw(self, raw_email):
         """
-        Parse a recipient header into a list of email addresses
+        Parse a complete raw message in this process
         
         Args:
-            header: Recipient header to parse
+            raw_email: Raw email data as bytes
             
         Returns:
-            List of email addresses
+            (ParsedEmail, None) tuple, or (None, error message) when parsing failed
+        """
+        try:
+            return self.parser.parse(raw_email), None
+        except Exception as e:
+            return None, str(e)
+    
+    def _queue_body_download(self, emails):
         """
-        if not header:
-            return []
+        Download the bodies of emails synced headers-first in the background
         
-        emails = []
+        Args:
+            emails: List of newly created Email instances
+        """
+        from superapp.apps.email.tasks import load_email_bodies
+        
+        email_ids = [str(email_obj.id) for email_obj in emails if email_obj.body_status == 'pending']
+        if email_ids:
+            transaction.on_commit(lambda: load_email_bodies.delay(email_ids))
+    
+    def _sync_account_in_worker(self, email_address, host_slot):
+        """
+        Sync one account from a worker thread of the concurrent pool
+        
+        Args:
+            email_address: EmailAddress instance to sync
+            host_slot: Semaphore limiting connections to the account's IMAP server
+        """
+        try:
+            with host_slot:
+                deadline = time.monotonic() + get_setting('EMAIL_SYNC_ACCOUNT_TIMEOUT')
+                self.sync_account(email_address, deadline=deadline)
+        finally:
+            # Worker threads get their own database connection
+            connection.close()
+    
+    def _abort_connection(self, client, email_address, timed_out):
+        """
+        Shut down the connection of an account whose time budget is used up
         
-        # Split by commas
-        parts = header.split(',')
+        Reads blocked on the server fail at once and the sync stops at its
+        last checkpoint.
         
-        for part in parts:
-            _, email_addr = self._parse_email_header(part)
-            if email_addr:
-                emails.append(email_addr)
+        Args:
+            client: IMAPClient instance of the account
+            email_address: EmailAddress instance being synced
+            timed_out: Event set to report the abort to the syncing thread
+        """
+        timed_out.set()
+        logger.warning(f"Sync of {email_address.email} ran out of time, closing its IMAP connection")
         
-        return emails
+        try:
+            client.socket().shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
     
-    def _get_email_body(self, msg):
+    def _host_key(self, email_address):
+        """
+        Key used to group accounts by IMAP server
         """
-        Extract the text and HTML body from an email
+        return (email_address.imap_server or '').lower()
+    
+    def _interleave_by_host(self, email_addresses):
+        """
+        Order accounts round-robin across IMAP servers
+        
+        Workers then rarely block on the per-host limit while accounts of
+        other servers are still waiting.
         
         Args:
-            msg: Email message
+            email_addresses: List of EmailAddress instances
             
         Returns:
-            Tuple of (text_body, html_body)
+            List of EmailAddress instances
         """
-        text_body = ""
-        html_body = ""
-        
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-                
-                # Skip attachments
-                if "attachment" in content_disposition:
-                    continue
-                
-                payload = part.get_payload(decode=True)
-                if payload is None:
-                    continue
-                
-                charset = part.get_content_charset() or 'utf-8'
-                try:
-                    decoded_payload = payload.decode(charset, errors='replace')
-                except (LookupError, TypeError):
-                    decoded_payload = payload.decode('utf-8', errors='replace')
-                
-                if content_type == "text/plain":
-                    text_body = decoded_payload
-                elif content_type == "text/html":
-                    html_body = decoded_payload
-        else:
-            # Not multipart - get the payload directly
-            payload = msg.get_payload(decode=True)
-            if payload:
-                charset = msg.get_content_charset() or 'utf-8'
-                try:
-                    decoded_payload = payload.decode(charset, errors='replace')
-                except (LookupError, TypeError):
-                    decoded_payload = payload.decode('utf-8', errors='replace')
-                
-                content_type = msg.get_content_type()
-                if content_type == "text/plain":
-                    text_body = decoded_payload
-                elif content_type == "text/html":
-                    html_body = decoded_payload
+        by_host = defaultdict(list)
+        for email_address in email_addresses:
+            by_host[self._host_key(email_address)].append(email_address)
         
-        return text_body, html_body
+        return [
+            email_address
+            for group in itertools.zip_longest(*by_host.values())
+            for email_address in group
+            if email_address is not None
+        ]
@@ -0,0 +1,593 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from django.utils import timezone
+from superapp.apps.email.conf import get_setting
+from superapp.apps.email.models import Email, Thread, ThreadReference
+from superapp.apps.email.utils import is_reply_subject, subject_hash, truncate_header
+
+logger = logging.getLogger(__name__)
+
+
+class Container:
+    """
+    Node of the JWZ threading tree, holding a message or standing in for a referenced one
+    """
+    __slots__ = ('message_id', 'parent', 'children', 'messages')
+    
+    def __init__(self, message_id):
+        self.message_id = message_id
+        self.parent = None
+        self.children = []
+        self.messages = []
+    
+    def has_descendant(self, container):
+        """
+        Whether container is this node or one of its descendants
+        """
+        while container is not None:
+            if container is self:
+                return True
+            container = container.parent
+        return False
+    
+    def set_parent(self, parent):
+        """
+        Move this node below parent
+        """
+        if self.parent is not None:
+            self.parent.children.remove(self)
+        self.parent = parent
+        parent.children.append(self)
+    
+    def walk(self):
+        """
+        Yield this node and all its descendants
+        """
+        stack = [self]
+        while stack:
+            container = stack.pop()
+            yield container
+            stack.extend(container.children)
+
+
+class MessageIdCache:
+    """
+    Bounded LRU of Message-ID to thread ID, shared by the threading services of a process
+    
+    Entries may point at threads another process merged away, so callers
+    verify the threads they get from it. The keys of every thread are
+    indexed as well, so merges repoint their entries without a scan.
+    """
+    
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._keys_by_thread = {}
+        self._lock = threading.Lock()
+    
+    def get_many(self, email_address_id, message_ids):
+        """
+        Look up cached threads
+        
+        Args:
+            email_address_id: ID of the email address owning the threads
+            message_ids: Iterable of Message-IDs
+            
+        Returns:
+            Dictionary mapping the cached Message-IDs to thread IDs
+        """
+        found = {}
+        with self._lock:
+            for message_id in message_ids:
+                key = (email_address_id, message_id)
+                thread_id = self._entries.get(key)
+                if thread_id is not None:
+                    self._entries.move_to_end(key)
+                    found[message_id] = thread_id
+        return found
+    
+    def set_many(self, email_address_id, thread_ids):
+        """
+        Remember the threads of Message-IDs
+        
+        Args:
+            email_address_id: ID of the email address owning the threads
+            thread_ids: Dictionary mapping Message-IDs to thread IDs
+        """
+        max_size = get_setting('EMAIL_THREADING_CACHE_SIZE')
+        if not max_size:
+            return
+        
+        with self._lock:
+            for message_id, thread_id in thread_ids.items():
+                key = (email_address_id, message_id)
+                previous = self._entries.get(key)
+                if previous is not None and previous != thread_id:
+                    self._forget(key, previous)
+                self._entries[key] = thread_id
+                self._entries.move_to_end(key)
+                self._keys_by_thread.setdefault(thread_id, set()).add(key)
+            while len(self._entries) > max_size:
+                key, thread_id = self._entries.popitem(last=False)
+                self._forget(key, thread_id)
+    
+    def repoint(self, old_thread_ids, thread_id):
+        """
+        Point the entries of merged threads at the thread they were merged into
+        
+        Args:
+            old_thread_ids: IDs of the merged threads
+            thread_id: ID of the remaining thread
+        """
+        with self._lock:
+            for old_thread_id in old_thread_ids:
+                keys = self._keys_by_thread.pop(old_thread_id, set())
+                for key in keys:
+                    self._entries[key] = thread_id
+                if keys:
+                    self._keys_by_thread.setdefault(thread_id, set()).update(keys)
+    
+    def clear(self):
+        """
+        Forget all entries, e.g. after the threads were deleted
+        """
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_thread.clear()
+    
+    def _forget(self, key, thread_id):
+        """
+        Remove a key from the index of its thread, the lock must be held
+        """
+        keys = self._keys_by_thread.get(thread_id)
+        if keys is None:
+            return
+        
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_thread[thread_id]
+
+
+message_id_cache = MessageIdCache()
+
+
+class EmailThreadingService:
+    """
+    Service grouping messages into threads with the JWZ algorithm
+    
+    A batch is arranged into JWZ trees from its References and In-Reply-To
+    headers. Every Message-ID of a tree, stored or only referenced, is then
+    looked up in the ThreadReference index with one query, so a tree joins
+    the thread of any message it shares an ID with. When a tree touches
+    several threads, e.g. because a parent arrived after replies that
+    started threads of their own, those threads are merged into the oldest
+    one. With EMAIL_THREADING_SUBJECT_FALLBACK enabled, replies without
+    any References or In-Reply-To join a recent thread with the same
+    normalized subject and a participant in common.
+    """
+    
+    def __init__(self, email_address):
+        """
+        Initialize the threading service
+        
+        Args:
+            email_address: EmailAddress instance owning the threads
+        """
+        self.email_address = email_address
+    
+    def resolve(self, parsed_emails, contact_ids=None):
+        """
+        Assign a thread to every message of a batch
+        
+        New threads are inserted at once, every touched thread gets its
+        last_message_at updated once and the Message-IDs of the batch are
+        added to the index.
+        
+        Args:
+            parsed_emails: List of ParsedEmail instances
+            contact_ids: Optional list of contact IDs, aligned with parsed_emails
+            
+        Returns:
+            List of Thread instances, aligned with parsed_emails
+        """
+        contact_ids = contact_ids or [None] * len(parsed_emails)
+        roots = self.build_trees(parsed_emails)
+        
+        # Message-IDs of each tree, including referenced messages that were never seen
+        tree_ids = [
+            [container.message_id for container in root.walk() if container.message_id]
+            for root in roots
+        ]
+        threads_by_message_id = self._lookup({message_id for ids in tree_ids for message_id in ids})
+        
+        groups = self._group_trees(roots, tree_ids, threads_by_message_id)
+        
+        conversations = []
+        for group in groups:
+            indexes = []
+            message_ids = set()
+            for root in group:
+                for container in root.walk():
+                    indexes.extend(container.messages)
+                    if container.message_id:
+                        message_ids.add(container.message_id)
+            indexes.sort(key=lambda index: parsed_emails[index].date)
+            
+            existing = {}
+            for message_id in message_ids:
+                thread = threads_by_message_id.get(message_id)
+                if thread is not None:
+                    existing[thread.pk] = thread
+            
+            match_subject = not existing and self._needs_subject_match([parsed_emails[index] for index in indexes])
+            conversations.append((indexes, message_ids, existing, match_subject))
+        
+        # Earlier conversations first, so replies can find threads started in the same batch
+        conversations.sort(key=lambda conversation: parsed_emails[conversation[0][0]].date)
+        
+        subject_threads = self._subject_candidates([
+            parsed_emails[indexes[0]]
+            for indexes, _, _, match_subject in conversations
+            if match_subject
+        ])
+        
+        assigned = [None] * len(parsed_emails)
+        new_threads = []
+        updated_threads = {}
+        references = {}
+        now = timezone.now()
+        
+        for indexes, message_ids, existing, match_subject in conversations:
+            parsed = parsed_emails[indexes[0]]
+            latest = parsed_emails[indexes[-1]].date
+            
+            if match_subject:
+                matched = self._match_subject(parsed, subject_threads)
+                if matched is not None:
+                    existing[matched.pk] = matched
+            
+            if not existing:
+                thread = Thread(
+                    subject=truncate_header(parsed.subject),
+                    subject_hash=subject_hash(parsed.subject),
+                    participants=parsed.to_emails + ([parsed.from_email] if parsed.from_email else []),
+                    email_address=self.email_address,
+                    contact_id=contact_ids[indexes[0]],
+                    last_message_at=latest
+                )
+                new_threads.append(thread)
+                subject_threads.setdefault(thread.subject_hash, []).insert(0, thread)
+            elif len(existing) == 1 and next(iter(existing.values()))._state.adding:
+                # Matched by subject to a thread started earlier in this batch
+                thread = next(iter(existing.values()))
+                thread.last_message_at = max(thread.last_message_at, latest)
+            else:
+                thread = self._merge(list(existing.values()))
+                self._repoint_candidates(subject_threads, existing.values(), thread)
+                if thread.last_message_at is None or thread.last_message_at < latest:
+                    thread.last_message_at = latest
+                    thread.updated_at = now
+                    updated_threads[thread.pk] = thread
+            
+            for index in indexes:
+                assigned[index] = thread
+            for message_id in message_ids:
+                references[message_id] = thread
+        
+        Thread.objects.bulk_create(new_threads)
+        if updated_threads:
+            Thread.objects.bulk_update(list(updated_threads.values()), ['last_message_at', 'participants', 'updated_at'])
+        
+        self._index(references)
+        
+        return assigned
+    
+    def _needs_subject_match(self, parsed_emails):
+        """
+        Whether a conversation without stored thread should be matched by subject
+        
+        Only replies and forwards whose client dropped References and
+        In-Reply-To are matched.
+        
+        Args:
+            parsed_emails: Iterable of ParsedEmail instances of the conversation, oldest first
+        """
+        if not get_setting('EMAIL_THREADING_SUBJECT_FALLBACK'):
+            return False
+        
+        parsed_emails = list(parsed_emails)
+        return (
+            is_reply_subject(parsed_emails[0].subject)
+            and not any(parsed.reference_ids for parsed in parsed_emails)
+        )
+    
+    def _subject_candidates(self, parsed_emails):
+        """
+        Load the recent threads whose normalized subject matches one of the messages
+        
+        Args:
+            parsed_emails: List of ParsedEmail instances to match by subject
+            
+        Returns:
+            Dictionary mapping subject hashes to Thread instances, most recent first
+        """
+        if not parsed_emails:
+            return {}
+        
+        window = timedelta(seconds=get_setting('EMAIL_THREADING_SUBJECT_WINDOW'))
+        threads = Thread.objects.filter(
+            email_address=self.email_address,
+            subject_hash__in={subject_hash(parsed.subject) for parsed in parsed_emails},
+            last_message_at__gte=min(parsed.date for parsed in parsed_emails) - window
+        ).order_by('-last_message_at')
+        
+        candidates = {}
+        for thread in threads:
+            candidates.setdefault(thread.subject_hash, []).append(thread)
+        
+        return candidates
+    
+    def _repoint_candidates(self, candidates, threads, thread):
+        """
+        Replace threads merged away earlier in the batch by the thread they were merged into
+        
+        The candidates are loaded before the batch is resolved, without this
+        later replies could join a deleted thread.
+        
+        Args:
+            candidates: Dictionary as returned by _subject_candidates, updated in place
+            threads: Thread instances that were merged
+            thread: The remaining Thread instance
+        """
+        merged_ids = {other.pk for other in threads if other.pk != thread.pk}
+        if not merged_ids:
+            return
+        
+        for key, candidate_threads in candidates.items():
+            repointed = []
+            for candidate in candidate_threads:
+                if candidate.pk in merged_ids:
+                    candidate = thread
+                if candidate not in repointed:
+                    repointed.append(candidate)
+            candidates[key] = repointed
+    
+    def _match_subject(self, parsed, candidates):
+        """
+        Find the thread a reply without References belongs to
+        
+        Args:
+            parsed: ParsedEmail instance of the reply
+            candidates: Dictionary as returned by _subject_candidates
+            
+        Returns:
+            The most recent thread with the same normalized subject, activity
+            within EMAIL_THREADING_SUBJECT_WINDOW and a participant in common,
+            or None
+        """
+        own_address = self.email_address.email.lower()
+        participants = {
+            address.lower() for address in [parsed.from_email] + parsed.to_emails + parsed.cc_emails
+        } - {own_address, ''}
+        earliest = parsed.date - timedelta(seconds=get_setting('EMAIL_THREADING_SUBJECT_WINDOW'))
+        
+        for thread in candidates.get(subject_hash(parsed.subject), []):
+            if thread.last_message_at is None or thread.last_message_at < earliest:
+                continue
+            if participants & {address.lower() for address in thread.participants}:
+                return thread
+        
+        return None
+    
+    def build_trees(self, parsed_emails):
+        """
+        Arrange a batch into JWZ trees
+        
+        Args:
+            parsed_emails: List of ParsedEmail instances
+            
+        Returns:
+            List of root Container instances; the messages attribute of each
+            container lists the indexes of its messages in parsed_emails
+        """
+        containers = {}
+        
+        def get_container(message_id):
+            # Message-IDs are indexed cut to the length of the index field, and looked up the same way
+            message_id = truncate_header(message_id)
+            if message_id not in containers:
+                containers[message_id] = Container(message_id)
+            return containers[message_id]
+        
+        anonymous = []
+        for index, parsed in enumerate(parsed_emails):
+            if parsed.message_id:
+                container = get_container(parsed.message_id)
+            else:
+                # Messages without a Message-ID can still be replies, but nothing can refer to them
+                container = Container(None)
+                anonymous.append(container)
+            container.messages.append(index)
+            
+            # Link the References chain, keeping links made by earlier messages
+            parent = None
+            for reference_id in parsed.reference_ids:
+                child = get_container(reference_id)
+                if child is container:
+                    continue
+                if parent is not None and child.parent is None and not child.has_descendant(parent):
+                    child.set_parent(parent)
+                parent = child
+            
+            # The message's own headers decide its parent
+            if parent is not None and parent is not container.parent and not container.has_descendant(parent):
+                container.set_parent(parent)
+        
+        return [container for container in list(containers.values()) + anonymous if container.parent is None]
+    
+    def register(self, email_obj):
+        """
+        Add the Message-IDs of a stored email to the index of its thread
+        
+        Args:
+            email_obj: Email instance with a thread, e.g. a delivered outgoing email
+        """
+        if email_obj.thread_id is None:
+            return
+        
+        message_ids = [
+            truncate_header(message_id)
+            for message_id in re.findall(r'<[^>]+>', f"{email_obj.message_id} {email_obj.in_reply_to} {email_obj.references}")
+        ]
+        self._index({message_id: email_obj.thread for message_id in message_ids})
+    
+    def _lookup(self, message_ids):
+        """
+        Find the threads of Message-IDs, through the cache and the index
+        
+        Args:
+            message_ids: Set of Message-IDs
+            
+        Returns:
+            Dictionary mapping Message-IDs with a thread to Thread instances
+        """
+        cached = message_id_cache.get_many(self.email_address.pk, message_ids)
+        thread_ids = dict(cached)
+        
+        missing = message_ids.difference(cached)
+        if missing:
+            thread_ids.update(self._query(missing))
+        
+        threads = Thread.objects.in_bulk(set(thread_ids.values()))
+        
+        # Cached threads may have been merged away by another process
+        stale = [message_id for message_id, thread_id in cached.items() if thread_id not in threads]
+        if stale:
+            refreshed = self._query(stale)
+            threads.update(Thread.objects.in_bulk(set(refreshed.values()) - set(threads)))
+            for message_id in stale:
+                thread_ids.pop(message_id)
+            thread_ids.update(refreshed)
+        
+        return {
+            message_id: threads[thread_id]
+            for message_id, thread_id in thread_ids.items()
+            if thread_id in threads
+        }
+    
+    def _query(self, message_ids):
+        """
+        Look Message-IDs up in the ThreadReference index
+        
+        Returns:
+            Dictionary mapping the indexed Message-IDs to thread IDs
+        """
+        return dict(
+            ThreadReference.objects.filter(
+                email_address=self.email_address,
+                message_id__in=message_ids
+            ).order_by().values_list('message_id', 'thread_id')
+        )
+    
+    def _group_trees(self, roots, tree_ids, threads_by_message_id):
+        """
+        Join trees that share a stored thread
+        
+        Args:
+            roots: List of root Container instances
+            tree_ids: Message-IDs of each tree, aligned with roots
+            threads_by_message_id: Dictionary mapping Message-IDs to Thread instances
+            
+        Returns:
+            List of lists of root Container instances belonging together
+        """
+        parents = list(range(len(roots)))
+        
+        def find(index):
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+        
+        first_tree = {}
+        for index, ids in enumerate(tree_ids):
+            for message_id in ids:
+                thread = threads_by_message_id.get(message_id)
+                if thread is None:
+                    continue
+                if thread.pk in first_tree:
+                    parents[find(index)] = find(first_tree[thread.pk])
+                else:
+                    first_tree[thread.pk] = index
+        
+        groups = {}
+        for index, root in enumerate(roots):
+            groups.setdefault(find(index), []).append(root)
+        
+        return [group for group in groups.values() if any(container.messages for root in group for container in root.walk())]
+    
+    def _merge(self, threads):
+        """
+        Merge threads into the oldest of them
+        
+        Args:
+            threads: List of Thread instances belonging to one conversation
+            
+        Returns:
+            The remaining Thread instance
+        """
+        threads = sorted(threads, key=lambda thread: thread.created_at)
+        thread, merged = threads[0], threads[1:]
+        if not merged:
+            return thread
+        
+        merged_ids = {other.pk for other in merged}
+        logger.info(f"Merging threads {', '.join(str(pk) for pk in merged_ids)} into {thread.pk}")
+        
+        Email.objects.filter(thread_id__in=merged_ids).update(thread=thread)
+        ThreadReference.objects.filter(thread_id__in=merged_ids).update(thread=thread)
+        
+        for other in merged:
+            thread.participants = thread.participants + [
+                participant for participant in other.participants if participant not in thread.participants
+            ]
+            if other.last_message_at and (thread.last_message_at is None or thread.last_message_at < other.last_message_at):
+                thread.last_message_at = other.last_message_at
+        
+        thread.updated_at = timezone.now()
+        Thread.objects.filter(pk=thread.pk).update(
+            participants=thread.participants,
+            last_message_at=thread.last_message_at,
+            updated_at=thread.updated_at
+        )
+        Thread.objects.filter(pk__in=merged_ids).delete()
+        
+        message_id_cache.repoint(merged_ids, thread.pk)
+        
+        return thread
+    
+    def _index(self, references):
+        """
+        Add Message-IDs to the ThreadReference index and the cache
+        
+        Args:
+            references: Dictionary mapping Message-IDs to Thread instances
+        """
+        if not references:
+            return
+        
+        # Another worker may index the same Message-ID concurrently, the first one wins
+        ThreadReference.objects.bulk_create(
+            [
+                ThreadReference(email_address=self.email_address, message_id=message_id, thread=thread)
+                for message_id, thread in references.items()
+            ],
+            ignore_conflicts=True
+        )
+        
+        message_id_cache.set_many(
+            self.email_address.pk,
+            {message_id: thread.pk for message_id, thread in references.items()}
+        )
@@ -17,6 +17,14 @@ def extend_superapp_settings(main_settings):
             'task': 'superapp.apps.email.tasks.sync_all_email_accounts',
             'schedule': 300.0,  # Every 5 minutes
         },
+        'backfill_email_accounts': {
+            'task': 'superapp.apps.email.tasks.backfill_email_accounts',
+            'schedule': 300.0,  # Every 5 minutes
+        },
+        'postprocess_pending_emails': {
+            'task': 'superapp.apps.email.tasks.postprocess_pending_emails',
+            'schedule': 600.0,  # Every 10 minutes
+        },
         'deliver_pending_emails': {
             'task': 'superapp.apps.email.tasks.deliver_pending_emails',
             'schedule': 60.0,  # Every minute
@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from superapp.apps.email.models import Email
+from superapp.apps.email.models import Contact, Email, EmailAddress
+from superapp.apps.email.services.contacts import contact_cache
+from superapp.apps.email.services.idle_notify import notify_account_changed
 from superapp.apps.email.tasks import deliver_email
 
 
@@ -10,7 +13,33 @@ def handle_email_post_save(sender, instance, created, **kwargs):
     Handle post-save signal for Email model
     
     If a new outgoing email is created with status 'draft', queue it for delivery
+    once the transaction commits, so attachments added in the same transaction
+    are sent along
     """
     if created and instance.direction == 'outgoing' and instance.status == 'draft':
         # Queue the email for delivery
-        deliver_email.delay(str(instance.id))
+        email_id = str(instance.id)
+        transaction.on_commit(lambda: deliver_email.delay(email_id))
+
+
+@receiver(post_delete, sender=Contact)
+def handle_contact_post_delete(sender, instance, **kwargs):
+    """
+    Handle post-delete signal for Contact model
+    
+    Forget the deleted contact, so this process does not link new emails to it
+    """
+    contact_cache.discard(instance.email)
+
+
+@receiver(post_save, sender=EmailAddress)
+@receiver(post_delete, sender=EmailAddress)
+def handle_email_address_change(sender, instance, using, **kwargs):
+    """
+    Handle post-save and post-delete signals for EmailAddress model
+    
+    Announce the change to the idle_sync workers once the transaction
+    commits, so only the IDLE connection of this account is restarted
+    """
+    email_address_id = str(instance.id)
+    transaction.on_commit(lambda: notify_account_changed(email_address_id, using=using), using=using)
@@ -1,6 +1,12 @@
+import asyncio
 from celery import shared_task
+from superapp.apps.email.conf import get_setting
 from superapp.apps.email.services.sync import EmailSyncService
+from superapp.apps.email.services.async_sync import AsyncEmailSyncService
+from superapp.apps.email.services.backfill import EmailBackfillService
 from superapp.apps.email.services.delivery import EmailDeliveryService
+from superapp.apps.email.services.body import EmailBodyService
+from superapp.apps.email.services.postprocess import EmailPostProcessService
 
 
 @shared_task
@@ -8,22 +14,81 @@ def sync_all_email_accounts():
     """
     Synchronize all email accounts
     """
+    if get_setting('EMAIL_SYNC_ENGINE') == 'asyncio':
+        asyncio.run(AsyncEmailSyncService().sync_all_accounts())
+        return
+    
     service = EmailSyncService()
     service.sync_all_accounts()
 
 
 @shared_task
-def sync_email_account(email_address_id):
+def sync_email_account(email_address_id, all_folders=False):
     """
     Synchronize a specific email account
     
     Args:
         email_address_id: UUID of the email address to sync
+        all_folders: Also sync quiet folders whose next poll is not due yet
     """
-    service = EmailSyncService(email_address_id=email_address_id)
+    service = EmailSyncService(email_address_id=email_address_id, all_folders=all_folders)
     service.sync_all_accounts()
 
 
+@shared_task
+def backfill_email_accounts():
+    """
+    Continue the pending history backfills of all email accounts
+    """
+    service = EmailBackfillService()
+    service.backfill_all_accounts()
+
+
+@shared_task
+def backfill_email_account(email_address_id):
+    """
+    Start and continue the history backfill of a specific email account
+    
+    Args:
+        email_address_id: UUID of the email address to backfill
+    """
+    service = EmailBackfillService(email_address_id=email_address_id)
+    service.backfill_all_accounts(start=True)
+
+
+@shared_task
+def load_email_bodies(email_ids):
+    """
+    Download the bodies of emails that were synced headers-first
+    
+    Args:
+        email_ids: List of UUIDs of the emails to complete
+    """
+    service = EmailBodyService()
+    service.load_pending(email_ids)
+
+
+@shared_task
+def postprocess_emails(email_ids):
+    """
+    Derive the text body, snippet and language of newly stored emails
+    
+    Args:
+        email_ids: List of UUIDs of the emails to process
+    """
+    service = EmailPostProcessService()
+    service.process_pending(email_ids)
+
+
+@shared_task
+def postprocess_pending_emails():
+    """
+    Post-process stored emails whose post-processing task was lost
+    """
+    service = EmailPostProcessService()
+    service.process_backlog()
+
+
 @shared_task
 def deliver_pending_emails():
     """
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import format_datetime
+from django.test import TestCase
+from superapp.apps.email.models import EmailAddress
+from superapp.apps.email.services.contacts import contact_cache
+from superapp.apps.email.services.parser import EmailParser
+from superapp.apps.email.services.threads import message_id_cache
+
+
+class IngestTestCase(TestCase):
+    """
+    Test case emptying the process-wide caches, whose entries would outlive the rolled back rows
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.clear_caches()
+        self.addCleanup(self.clear_caches)
+    
+    def clear_caches(self):
+        contact_cache.clear()
+        message_id_cache.clear()
+
+
+def create_email_address(email='me@example.com', **fields):
+    """
+    Create an email address with placeholder server settings
+    """
+    defaults = {
+        'smtp_server': 'smtp.example.com',
+        'smtp_username': email,
+        'smtp_password': 'password',
+        'imap_server': 'imap.example.com',
+        'imap_username': email,
+        'imap_password': 'password',
+    }
+    defaults.update(fields)
+    return EmailAddress.objects.create(email=email, **defaults)
+
+
+def build_message(number, subject=None, sender='alice@example.com', to='me@example.com', references=None,
+                  message_id=None):
+    """
+    Build the raw bytes of a simple text message
+    
+    Args:
+        number: Number of the message, used in its Message-ID, subject, body and date
+        subject: Optional subject
+        sender: Sender address
+        to: Recipient address
+        references: Optional Message-IDs the message replies to, oldest first
+        message_id: Optional Message-ID
+    """
+    message = EmailMessage()
+    message['Message-ID'] = message_id or f'<message{number}@example.com>'
+    message['Subject'] = subject if subject is not None else f'Message {number}'
+    message['From'] = f'Alice <{sender}>'
+    message['To'] = to
+    message['Date'] = format_datetime(datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=number))
+    if references:
+        message['In-Reply-To'] = references[-1]
+        message['References'] = ' '.join(references)
+    message.set_content(f'Body {number}\n')
+    # Long Message-IDs stay on one line, as mail servers deliver them
+    return message.as_bytes(policy=message.policy.clone(max_line_length=None))
+
+
+def parse_message(raw, uid=None, folder='INBOX', flags=()):
+    """
+    Parse raw message bytes as fetched from folder
+    """
+    parsed = EmailParser().parse(raw)
+    parsed.imap_folder = folder
+    parsed.imap_uid = uid
+    parsed.flags = flags
+    return parsed
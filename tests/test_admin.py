@@ -0,0 +1,66 @@
+from unittest import mock
+from django.test import RequestFactory, TestCase
+from superapp.apps.admin_portal.sites import superapp_admin_site
+from superapp.apps.email.admin.email import EmailAdmin
+from superapp.apps.email.admin.email_address import EmailAddressAdmin
+from superapp.apps.email.models import Email, EmailAddress, Thread
+from superapp.apps.email.tests.helpers import create_email_address
+
+
+class EmailAddressAdminTests(TestCase):
+    """
+    Actions of the email address admin
+    """
+    
+    def setUp(self):
+        self.model_admin = EmailAddressAdmin(EmailAddress, superapp_admin_site)
+        self.request = RequestFactory().post('/')
+    
+    def test_sync_now_queues_a_task(self):
+        email_address = create_email_address()
+        
+        with mock.patch('superapp.apps.email.admin.email_address.sync_email_account') as task, \
+                mock.patch.object(self.model_admin, 'message_user') as message_user:
+            self.model_admin.sync_now(self.request, EmailAddress.objects.all())
+        
+        task.delay.assert_called_once_with(str(email_address.id), all_folders=True)
+        message_user.assert_called_once_with(self.request, "Queued a sync of me@example.com")
+
+
+class EmailAdminTests(TestCase):
+    """
+    Change page of the email admin
+    """
+    
+    def setUp(self):
+        self.model_admin = EmailAdmin(Email, superapp_admin_site)
+        self.email_address = create_email_address()
+    
+    def create_email(self, body_status):
+        return Email.objects.create(
+            email_address=self.email_address,
+            thread=Thread.objects.create(email_address=self.email_address, subject='Hello'),
+            from_email='alice@example.com',
+            to_emails=['me@example.com'],
+            subject='Hello',
+            body_status=body_status
+        )
+    
+    def open(self, email_obj):
+        request = RequestFactory().get('/')
+        with mock.patch('superapp.apps.email.admin.email.load_email_bodies') as task, \
+                mock.patch.object(self.model_admin, 'message_user'), \
+                mock.patch.object(Email, 'load_body') as load_body, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.model_admin.get_object(request, str(email_obj.id)), email_obj)
+        
+        load_body.assert_not_called()
+        return task
+    
+    def test_pending_body_is_queued(self):
+        email_obj = self.create_email('pending')
+        
+        self.open(email_obj).delay.assert_called_once_with([str(email_obj.id)])
+    
+    def test_complete_body_is_not_queued(self):
+        self.open(self.create_email('complete')).delay.assert_not_called()
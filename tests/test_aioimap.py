@@ -0,0 +1,108 @@
+import asyncio
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+from unittest import skipUnless
+from django.test import SimpleTestCase
+from superapp.apps.email.services.aioimap import AsyncIMAPClient
+
+
+class StartTLSServer:
+    """
+    IMAP server answering STARTTLS with a certificate for localhost
+    """
+    
+    def __init__(self, certfile, keyfile):
+        self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.closed = asyncio.Event()
+    
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+    
+    async def handle(self, reader, writer):
+        writer.write(b'* OK ready\r\n')
+        await writer.drain()
+        
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tag, command = line.rstrip(b'\r\n').split(b' ', 1)
+                writer.write(tag + b' OK ' + command + b' completed\r\n')
+                await writer.drain()
+                if command == b'STARTTLS':
+                    await writer.start_tls(self.context)
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+            self.closed.set()
+    
+    async def stop(self):
+        await asyncio.wait_for(self.closed.wait(), 5)
+        self.server.close()
+        await self.server.wait_closed()
+
+
+@skipUnless(shutil.which('openssl'), "openssl is needed to create a test certificate")
+class StartTLSTests(SimpleTestCase):
+    """
+    Certificate checks of STARTTLS connections
+    """
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.certfile = os.path.join(cls.directory.name, 'cert.pem')
+        cls.keyfile = os.path.join(cls.directory.name, 'key.pem')
+        subprocess.run(
+            [
+                'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                '-keyout', cls.keyfile, '-out', cls.certfile,
+                '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost'
+            ],
+            check=True,
+            capture_output=True
+        )
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+    
+    def starttls(self, host):
+        """
+        Connect to host with STARTTLS, trusting the test certificate
+        """
+        async def run():
+            server = StartTLSServer(self.certfile, self.keyfile)
+            await server.start()
+            client = AsyncIMAPClient(
+                host,
+                port=server.port,
+                use_ssl=False,
+                timeout=5,
+                ssl_context=ssl.create_default_context(cafile=self.certfile)
+            )
+            try:
+                await client.connect()
+                await client.starttls()
+                await client.login('user', 'password')
+            finally:
+                client.writer.close()
+                await server.stop()
+        
+        asyncio.run(run())
+    
+    def test_matching_certificate(self):
+        self.starttls('localhost')
+    
+    def test_mismatched_certificate(self):
+        with self.assertRaises(ssl.SSLCertVerificationError):
+            self.starttls('127.0.0.1')
@@ -0,0 +1,59 @@
+from unittest import mock
+from superapp.apps.email.models import Contact
+from superapp.apps.email.services.contacts import ContactResolver, contact_cache
+from superapp.apps.email.tests.helpers import IngestTestCase
+
+
+class ContactResolverTests(IngestTestCase):
+    """
+    Contacts resolved for the addresses of a batch
+    """
+    
+    def test_addresses_are_normalized(self):
+        contacts = ContactResolver(exclude=['Me@Example.com']).resolve({
+            ' Bob@Example.COM ': '',
+            'bob@example.com': 'Bob',
+            'me@example.com': 'Me',
+        })
+        
+        contact = Contact.objects.get()
+        self.assertEqual(contacts, {'bob@example.com': contact.pk})
+        self.assertEqual((contact.email, contact.name), ('bob@example.com', 'Bob'))
+    
+    def test_blank_names_are_filled_in(self):
+        contact = Contact.objects.create(email='bob@example.com')
+        
+        contacts = ContactResolver().resolve({'BOB@example.com': 'Bob'})
+        
+        self.assertEqual(contacts, {'bob@example.com': contact.pk})
+        contact.refresh_from_db()
+        self.assertEqual(contact.name, 'Bob')
+    
+    def test_contacts_inserted_concurrently_are_used(self):
+        # Another worker stores the contact between the lookup and the insert
+        contact = Contact.objects.create(email='bob@example.com', name='Robert')
+        lookup = ContactResolver._lookup
+        calls = []
+        
+        def racing_lookup(resolver, emails, names):
+            calls.append(emails)
+            return {} if len(calls) == 1 else lookup(resolver, emails, names)
+        
+        with mock.patch.object(ContactResolver, '_lookup', racing_lookup):
+            contacts = ContactResolver().resolve({'bob@example.com': 'Bob'})
+        
+        self.assertEqual(contacts, {'bob@example.com': contact.pk})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Contact.objects.get().name, 'Robert')
+    
+    def test_created_contacts_are_cached_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            contacts = ContactResolver().resolve({'bob@example.com': 'Bob'})
+            self.assertEqual(contact_cache.get_many(['bob@example.com']), {})
+        
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(contact_cache.get_many(['bob@example.com']), contacts)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(ContactResolver().resolve({'bob@example.com': ''}), contacts)
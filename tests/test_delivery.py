@@ -0,0 +1,170 @@
+import email
+import io
+import re
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from django.test import SimpleTestCase, override_settings
+from superapp.apps.email.models import Email
+from superapp.apps.email.services.delivery import EmailDeliveryService
+from superapp.apps.email.services.sync import EmailSyncService
+from superapp.apps.email.tests.helpers import IngestTestCase, create_email_address, parse_message
+
+
+def fake_server():
+    """
+    smtplib.SMTP stand-in accepting every command and recording the DATA bytes
+    """
+    server = mock.Mock()
+    server.mail.return_value = (250, b'OK')
+    server.rcpt.return_value = (250, b'OK')
+    server.docmd.return_value = (354, b'Go ahead')
+    server.getreply.return_value = (250, b'Queued')
+    return server
+
+
+def sent_data(server):
+    return b''.join(call.args[0] for call in server.send.call_args_list)
+
+
+def dot_stuff(data):
+    return re.sub(rb'(?m)^\.', b'..', data)
+
+
+class DotStuffingTests(SimpleTestCase):
+    """
+    Dot-stuffing of the DATA phase across chunk boundaries
+    """
+    
+    def send(self, chunks):
+        server = fake_server()
+        EmailDeliveryService().send_message(server, 'alice@example.com', ['bob@example.com'], chunks)
+        return sent_data(server)
+    
+    def test_single_chunk(self):
+        self.assertEqual(self.send([b'a\r\n.b\r\n']), b'a\r\n..b\r\n.\r\n')
+    
+    def test_lines_split_across_chunks(self):
+        chunks = [b'a\r\n', b'.b', b'.c\r\n.', b'd\r\nx', b'.y']
+        self.assertEqual(self.send(chunks), dot_stuff(b''.join(chunks)) + b'\r\n.\r\n')
+    
+    def test_every_split_of_a_message(self):
+        data = b'.start\r\nmiddle.\r\n..two\r\n.\r\nend\r\n'
+        for split in range(1, len(data)):
+            with self.subTest(split=split):
+                self.assertEqual(self.send([data[:split], data[split:]]), dot_stuff(data) + b'.\r\n')
+
+
+class IterMessageTests(SimpleTestCase):
+    """
+    Serialization of messages with attachments streamed from the store
+    """
+    
+    def attachment(self, data, filename, content_type='application/octet-stream', content_id=''):
+        return SimpleNamespace(
+            content_type=content_type,
+            filename=filename,
+            content_id=content_id,
+            open=lambda: io.BytesIO(data)
+        )
+    
+    def test_without_attachments(self):
+        msg = MIMEText('Hello\n.\n')
+        chunks = list(EmailDeliveryService().iter_message(msg, []))
+        
+        self.assertEqual(len(chunks), 1)
+        self.assertNotIn(b'\n', chunks[0].replace(b'\r\n', b''))
+    
+    def test_attachments_are_appended(self):
+        msg = MIMEMultipart('mixed')
+        msg['Subject'] = 'Files'
+        msg.attach(MIMEText('.leading dot\n'))
+        attachments = [
+            self.attachment(bytes(range(256)) * 500, 'data.bin'),
+            self.attachment(b'<svg/>', 'logo.svg', 'image/svg+xml', '<logo@example.com>'),
+        ]
+        
+        with mock.patch('superapp.apps.email.services.delivery.ATTACHMENT_CHUNK_SIZE', 57 * 10):
+            chunks = list(EmailDeliveryService().iter_message(msg, attachments))
+        
+        parsed = email.message_from_bytes(b''.join(chunks))
+        parts = parsed.get_payload()
+        self.assertEqual(parts[0].get_payload(), '.leading dot\r\n')
+        self.assertEqual(parts[1].get_filename(), 'data.bin')
+        self.assertEqual(parts[1].get_payload(decode=True), bytes(range(256)) * 500)
+        self.assertEqual(parts[2].get_content_type(), 'image/svg+xml')
+        self.assertEqual(parts[2]['Content-ID'], '<logo@example.com>')
+        self.assertEqual(parts[2].get_payload(decode=True), b'<svg/>')
+    
+    def test_sent_message_survives_dot_stuffing(self):
+        msg = MIMEMultipart('mixed')
+        msg.attach(MIMEText('.one\n..two\n'))
+        service = EmailDeliveryService()
+        chunks = list(service.iter_message(msg, [self.attachment(b'.' * 1000, 'dots.txt', 'text/plain')]))
+        
+        server = fake_server()
+        service.send_message(server, 'alice@example.com', ['bob@example.com'], chunks)
+        
+        # The receiving server removes the leading dot of every line
+        data = sent_data(server)
+        self.assertTrue(data.endswith(b'\r\n.\r\n'))
+        self.assertEqual(re.sub(rb'(?m)^\.', b'', data[:-3]), b''.join(chunks))
+
+
+class DeliverEmailTests(IngestTestCase):
+    """
+    Delivery of outgoing emails and the import of their Sent copies
+    """
+    
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        
+        self.email_address = create_email_address()
+        self.email_obj = Email.objects.create(
+            email_address=self.email_address,
+            direction='outgoing',
+            status='draft',
+            from_email='me@example.com',
+            to_emails=['bob@example.com'],
+            subject='Hello',
+            body_text='Hi Bob\n'
+        )
+    
+    def deliver(self):
+        """
+        Deliver the email through a fake SMTP server
+        
+        Returns:
+            Message bytes as received by the server
+        """
+        server = fake_server()
+        with mock.patch('superapp.apps.email.services.delivery.smtplib.SMTP_SSL', return_value=server):
+            EmailDeliveryService().deliver_email(self.email_obj)
+        
+        # The receiving server removes the dot-stuffing and the final dot
+        return re.sub(rb'(?m)^\.', b'', sent_data(server)[:-3])
+    
+    def test_message_id_is_stored(self):
+        data = self.deliver()
+        
+        self.email_obj.refresh_from_db()
+        self.assertEqual(self.email_obj.status, 'sent')
+        self.assertTrue(self.email_obj.message_id)
+        self.assertEqual(email.message_from_bytes(data)['Message-ID'], self.email_obj.message_id)
+    
+    def test_sent_copy_is_not_imported_again(self):
+        data = self.deliver()
+        
+        result = EmailSyncService().store_emails([parse_message(data, uid=1, folder='Sent')], self.email_address)
+        
+        self.assertEqual(result.inserted, 0)
+        self.assertEqual(Email.objects.count(), 1)
+        # The delivered email takes the UID of its Sent copy
+        self.assertEqual(Email.objects.get().imap_uid, 1)
@@ -0,0 +1,79 @@
+from django.test import SimpleTestCase
+from superapp.apps.email.models import Email, FolderSyncState
+from superapp.apps.email.services.flags import EmailFlagService, flag_field_values
+from superapp.apps.email.services.ingest import EmailIngestService
+from superapp.apps.email.tests.helpers import IngestTestCase, build_message, create_email_address, parse_message
+
+
+class FlagFieldValuesTests(SimpleTestCase):
+    """
+    Email field values of IMAP flag sets
+    """
+    
+    def test_flags_are_sorted_and_mirrored(self):
+        values = flag_field_values([b'\\Seen', '\\Flagged', b'$Label', '\\Seen'])
+        
+        self.assertEqual(values, {
+            'flags': ['$Label', '\\Flagged', '\\Seen'],
+            'is_read': True,
+            'is_answered': False,
+            'is_flagged': True,
+            'is_deleted': False,
+        })
+    
+    def test_no_flags(self):
+        values = flag_field_values(())
+        
+        self.assertEqual(values['flags'], [])
+        self.assertFalse(any(values[field_name] for field_name in ('is_read', 'is_answered', 'is_flagged', 'is_deleted')))
+
+
+class ApplyChangesTests(IngestTestCase):
+    """
+    Flag changes and expunges written onto stored emails
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.email_address = create_email_address()
+        self.service = EmailFlagService(update_batch_size=2)
+        EmailIngestService(self.email_address).ingest(
+            [parse_message(build_message(uid), uid=uid) for uid in (1, 2, 3, 4)]
+            + [parse_message(build_message(5), uid=1, folder='Archive')]
+        )
+    
+    def email(self, uid, folder='INBOX'):
+        return Email.objects.get(imap_folder=folder, imap_uid=uid)
+    
+    def test_flag_changes_are_applied(self):
+        changes = self.service.apply_changes(
+            self.email_address,
+            'INBOX',
+            {1: (b'\\Seen',), 2: (b'\\Seen',), 3: (b'\\Flagged', b'\\Seen'), 4: ()},
+            []
+        )
+        
+        # The flags of message 4 did not change
+        self.assertEqual(changes, 3)
+        self.assertTrue(self.email(2).is_read)
+        self.assertEqual(self.email(3).flags, ['\\Flagged', '\\Seen'])
+        self.assertTrue(self.email(3).is_flagged)
+        self.assertFalse(self.email(4).is_read)
+        self.assertFalse(self.email(1, folder='Archive').is_read)
+        
+        self.assertEqual(self.service.apply_changes(self.email_address, 'INBOX', {1: (b'\\Seen',)}, []), 0)
+    
+    def test_expunged_emails_lose_their_uid(self):
+        changes = self.service.apply_changes(self.email_address, 'INBOX', {}, [(1, 2), (4, 4)])
+        
+        self.assertEqual(changes, 3)
+        expunged = Email.objects.filter(imap_folder='INBOX', imap_uid__isnull=True)
+        self.assertEqual(expunged.count(), 3)
+        self.assertTrue(all(email_obj.is_deleted for email_obj in expunged))
+        self.assertFalse(self.email(3).is_deleted)
+        self.assertFalse(self.email(1, folder='Archive').is_deleted)
+    
+    def test_find_expunged(self):
+        state = FolderSyncState(email_address=self.email_address, folder='INBOX', last_uid=3)
+        
+        self.assertEqual(self.service.find_expunged(self.email_address, state, {2}), [(1, 1), (3, 3)])
@@ -0,0 +1,48 @@
+import uuid
+from django.test import SimpleTestCase
+from superapp.apps.email.services.idle_leases import HashRing
+
+
+class HashRingTests(SimpleTestCase):
+    """
+    Assignment of accounts to idle_sync workers
+    """
+    
+    def setUp(self):
+        self.keys = [str(uuid.UUID(int=index)) for index in range(1000)]
+    
+    def assignment(self, ring):
+        return {key: ring.get_node(key) for key in self.keys}
+    
+    def test_empty_ring(self):
+        self.assertIsNone(HashRing([]).get_node('account'))
+    
+    def test_deterministic(self):
+        self.assertEqual(
+            self.assignment(HashRing(['a', 'b', 'c'])),
+            self.assignment(HashRing(['c', 'a', 'b']))
+        )
+    
+    def test_spreads_keys(self):
+        counts = {}
+        for node in self.assignment(HashRing(['a', 'b', 'c', 'd'])).values():
+            counts[node] = counts.get(node, 0) + 1
+        
+        self.assertEqual(set(counts), {'a', 'b', 'c', 'd'})
+        self.assertGreater(min(counts.values()), 100)
+    
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        before = self.assignment(HashRing(['a', 'b', 'c']))
+        after = self.assignment(HashRing(['a', 'b', 'c', 'd']))
+        
+        moved = [key for key in self.keys if before[key] != after[key]]
+        self.assertTrue(moved)
+        self.assertTrue(all(after[key] == 'd' for key in moved))
+    
+    def test_removing_a_node_only_moves_its_keys(self):
+        before = self.assignment(HashRing(['a', 'b', 'c']))
+        after = self.assignment(HashRing(['a', 'c']))
+        
+        for key in self.keys:
+            if before[key] != 'b':
+                self.assertEqual(after[key], before[key])
@@ -0,0 +1,23 @@
+from django.test import SimpleTestCase
+from superapp.apps.email.services.idle_sync import count_new_mail
+
+
+class CountNewMailTests(SimpleTestCase):
+    """
+    Detection of new mail in IDLE responses
+    """
+    
+    def test_counts_exists(self):
+        self.assertEqual(count_new_mail([(3, b'EXISTS'), (4, b'EXISTS')]), 2)
+    
+    def test_ignores_other_responses(self):
+        responses = [
+            (3, b'RECENT'),
+            (2, b'EXPUNGE'),
+            (5, b'FETCH', (b'FLAGS', (b'\\Seen',))),
+            (b'OK', b'Still here'),
+        ]
+        self.assertEqual(count_new_mail(responses), 0)
+    
+    def test_empty(self):
+        self.assertEqual(count_new_mail([]), 0)
@@ -0,0 +1,29 @@
+from django.test import SimpleTestCase
+from superapp.apps.email.services.imap import format_uid_set, parse_uid_set, parse_vanished, uid_ranges
+
+
+class UidSetTests(SimpleTestCase):
+    """
+    Conversion between UIDs and IMAP sequence sets
+    """
+    
+    def test_uid_ranges(self):
+        self.assertEqual(uid_ranges([]), [])
+        self.assertEqual(uid_ranges([7]), [(7, 7)])
+        self.assertEqual(uid_ranges([5, 1, 2, 3, 9, 10, 3]), [(1, 3), (5, 5), (9, 10)])
+    
+    def test_format_uid_set(self):
+        self.assertEqual(format_uid_set([1, 2, 3, 5, 9, 12, 13, 14]), '1:3,5,9,12:14')
+    
+    def test_parse_uid_set(self):
+        self.assertEqual(parse_uid_set('1:3,5,9:7'), [(1, 3), (5, 5), (7, 9)])
+        self.assertEqual(parse_uid_set(b'4'), [(4, 4)])
+        self.assertEqual(parse_uid_set(''), [])
+    
+    def test_round_trip(self):
+        uids = [1, 2, 4, 8, 9, 10, 100]
+        self.assertEqual(parse_uid_set(format_uid_set(uids)), uid_ranges(uids))
+    
+    def test_parse_vanished(self):
+        self.assertEqual(parse_vanished(b'(EARLIER) 1:5,9'), [(1, 5), (9, 9)])
+        self.assertEqual(parse_vanished(b'12'), [(12, 12)])
@@ -0,0 +1,83 @@
+from superapp.apps.email.models import Email
+from superapp.apps.email.services.ingest import EmailIngestService
+from superapp.apps.email.tests.helpers import IngestTestCase, build_message, create_email_address, parse_message
+
+
+class DuplicateTests(IngestTestCase):
+    """
+    Duplicate check of ingested batches
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.email_address = create_email_address()
+    
+    def ingest(self, *parsed_emails, email_address=None):
+        return EmailIngestService(email_address or self.email_address).ingest(parsed_emails)
+    
+    def test_stored_messages_are_skipped(self):
+        self.ingest(parse_message(build_message(1), uid=1))
+        
+        result = self.ingest(parse_message(build_message(1), uid=1), parse_message(build_message(2), uid=2))
+        
+        self.assertEqual((result.inserted, result.skipped), (1, 1))
+        self.assertEqual(Email.objects.count(), 2)
+    
+    def test_repeats_within_a_batch_are_stored_once(self):
+        result = self.ingest(
+            parse_message(build_message(1), uid=1),
+            parse_message(build_message(1), uid=2, folder='Archive')
+        )
+        
+        self.assertEqual((result.inserted, result.skipped), (1, 1))
+        email_obj = Email.objects.get()
+        self.assertEqual((email_obj.imap_folder, email_obj.imap_uid), ('INBOX', 1))
+    
+    def test_messages_without_message_id_are_all_stored(self):
+        parsed_emails = [parse_message(build_message(number), uid=number) for number in (1, 2)]
+        for parsed in parsed_emails:
+            parsed.message_id = ''
+        
+        result = self.ingest(*parsed_emails)
+        
+        self.assertEqual((result.inserted, result.skipped), (2, 0))
+    
+    def test_messages_are_deduplicated_per_email_address(self):
+        other_address = create_email_address('other@example.com')
+        self.ingest(parse_message(build_message(1), uid=1))
+        
+        result = self.ingest(parse_message(build_message(1), uid=1), email_address=other_address)
+        
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(Email.objects.filter(message_id='<message1@example.com>').count(), 2)
+
+
+class RelocateTests(IngestTestCase):
+    """
+    Stored emails following their copies in other folders
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.email_address = create_email_address()
+        self.service = EmailIngestService(self.email_address)
+        self.service.ingest([parse_message(build_message(1), uid=1)])
+    
+    def test_expunged_emails_follow_their_copy(self):
+        Email.objects.update(imap_uid=None, is_deleted=True)
+        
+        result = self.service.ingest([parse_message(build_message(1), uid=7, folder='Archive', flags=(b'\\Seen',))])
+        
+        self.assertEqual(result.inserted, 0)
+        email_obj = Email.objects.get()
+        self.assertEqual((email_obj.imap_folder, email_obj.imap_uid), ('Archive', 7))
+        self.assertEqual(email_obj.flags, ['\\Seen'])
+        self.assertTrue(email_obj.is_read)
+        self.assertFalse(email_obj.is_deleted)
+    
+    def test_present_emails_stay_in_their_folder(self):
+        self.service.ingest([parse_message(build_message(1), uid=7, folder='Archive', flags=(b'\\Seen',))])
+        
+        email_obj = Email.objects.get()
+        self.assertEqual((email_obj.imap_folder, email_obj.imap_uid), ('INBOX', 1))
+        self.assertFalse(email_obj.is_read)
@@ -0,0 +1,68 @@
+import email
+from email.message import EmailMessage
+from django.test import SimpleTestCase
+from superapp.apps.email.services.mime import StreamingMIMEParser
+
+
+def build_message():
+    """
+    Multipart message with text, HTML, an encoded text part and a binary attachment
+    """
+    message = EmailMessage()
+    message['Subject'] = 'Report'
+    message['From'] = 'alice@example.com'
+    message['To'] = 'bob@example.com'
+    message.set_content('First line\nSecond line with späcial characters\n' + 'x' * 200)
+    message.add_alternative('<p>Hello</p>\n' * 50, subtype='html')
+    message.add_attachment(bytes(range(256)) * 40, maintype='application', subtype='octet-stream', filename='data.bin')
+    message.add_attachment('a,b\r\n1,2\r\n', subtype='csv', filename='table.csv')
+    return message.as_bytes()
+
+
+class StreamingMIMEParserTests(SimpleTestCase):
+    """
+    Streaming parser results compared to email.message_from_bytes()
+    """
+    
+    def parse(self, raw, chunk_size, spool_max_memory=64):
+        parser = StreamingMIMEParser(spool_max_memory=spool_max_memory)
+        for offset in range(0, len(raw), chunk_size):
+            parser.feed(raw[offset:offset + chunk_size])
+        parser.close()
+        self.addCleanup(parser.release)
+        return parser
+    
+    def assertMatchesEmail(self, raw, chunk_size):
+        expected = [part for part in email.message_from_bytes(raw).walk() if not part.is_multipart()]
+        parser = self.parse(raw, chunk_size)
+        
+        self.assertEqual(parser.message['Subject'], email.message_from_bytes(raw)['Subject'])
+        self.assertEqual([part.content_type for part in parser.parts], [part.get_content_type() for part in expected])
+        for part, reference in zip(parser.parts, expected):
+            self.assertEqual(b''.join(part.iter_decoded(chunk_size=100)), reference.get_payload(decode=True))
+            self.assertEqual(part.is_attachment, bool(reference.get_filename()))
+    
+    def test_multipart_in_chunks(self):
+        raw = build_message()
+        for chunk_size in (1, 7, 64, 1000, len(raw)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertMatchesEmail(raw, chunk_size)
+    
+    def test_single_part(self):
+        message = EmailMessage()
+        message['Subject'] = 'Plain'
+        message.set_content('Only text\n')
+        self.assertMatchesEmail(message.as_bytes(), 5)
+    
+    def test_crlf_split_between_chunks(self):
+        raw = build_message().replace(b'\n', b'\r\n')
+        self.assertMatchesEmail(raw, 2)
+    
+    def test_incomplete_header_block(self):
+        parser = self.parse(b'Subject: cut off\r\nFrom: alice@', 4)
+        self.assertIsNone(parser.message)
+        self.assertEqual(parser.parts, [])
+    
+    def test_size_counts_fed_bytes(self):
+        raw = build_message()
+        self.assertEqual(self.parse(raw, 100).size, len(raw))
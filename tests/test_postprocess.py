@@ -0,0 +1,74 @@
+from datetime import timedelta
+from unittest import mock
+from django.utils import timezone
+from superapp.apps.email.models import Email
+from superapp.apps.email.services.ingest import EmailIngestService
+from superapp.apps.email.services.postprocess import EmailPostProcessService
+from superapp.apps.email.tests.helpers import IngestTestCase, build_message, create_email_address, parse_message
+
+
+class ProcessBacklogTests(IngestTestCase):
+    """
+    Periodic sweep of emails whose post-processing task was lost
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.email_address = create_email_address()
+        self.service = EmailPostProcessService()
+    
+    def store(self, *numbers, age=timedelta(hours=1)):
+        """
+        Store messages whose post-processing task never ran, created age ago
+        """
+        parsed_emails = [parse_message(build_message(number), uid=number) for number in numbers]
+        with self.captureOnCommitCallbacks(execute=False):
+            result = EmailIngestService(self.email_address).ingest(parsed_emails)
+        
+        ids = [email_obj.id for email_obj in result.emails]
+        Email.objects.filter(id__in=ids).update(created_at=timezone.now() - age)
+        return ids
+    
+    def unprocessed(self):
+        return set(Email.objects.filter(processed_at__isnull=True).values_list('id', flat=True))
+    
+    def test_lost_emails_are_processed(self):
+        self.store(1, 2, 3)
+        
+        self.assertEqual(self.service.process_backlog(), 3)
+        
+        self.assertEqual(self.unprocessed(), set())
+        self.assertTrue(Email.objects.get(imap_uid=1).snippet)
+    
+    def test_recent_and_pending_emails_are_left(self):
+        recent = self.store(1, age=timedelta(0))
+        pending = self.store(2)
+        Email.objects.filter(id__in=pending).update(body_status='pending')
+        
+        self.assertEqual(self.service.process_backlog(), 0)
+        self.assertEqual(self.unprocessed(), set(recent + pending))
+    
+    def test_pass_is_limited(self):
+        self.store(1, 2, 3, 4, 5)
+        
+        with self.settings(EMAIL_POSTPROCESS_BATCH_SIZE=2):
+            self.assertEqual(self.service.process_backlog(limit=3), 3)
+        
+        self.assertEqual(len(self.unprocessed()), 2)
+    
+    def test_failing_emails_do_not_stall_the_pass(self):
+        failing = self.store(1)
+        self.store(2, 3)
+        derive_fields = EmailPostProcessService.derive_fields
+        
+        def failing_derive_fields(service, email_obj):
+            if email_obj.id in failing:
+                raise ValueError("Cannot convert body")
+            derive_fields(service, email_obj)
+        
+        with mock.patch.object(EmailPostProcessService, 'derive_fields', failing_derive_fields), \
+                self.settings(EMAIL_POSTPROCESS_BATCH_SIZE=1), \
+                self.assertLogs('superapp.apps.email.services.postprocess', 'ERROR'):
+            self.assertEqual(self.service.process_backlog(), 3)
+        
+        self.assertEqual(self.unprocessed(), set(failing))
@@ -0,0 +1,243 @@
+from unittest import mock
+from django.test import override_settings
+from superapp.apps.email.models import Email, FolderSyncState
+from superapp.apps.email.services.ingest import EmailIngestService
+from superapp.apps.email.services.sync import FIRST_CHUNK_KEY, MAX_PARSE_ATTEMPTS, EmailSyncService
+from superapp.apps.email.tests.helpers import IngestTestCase, build_message, create_email_address, parse_message
+
+
+class StoreChunkTests(IngestTestCase):
+    """
+    Checkpoint and retry record of stored FETCH chunks
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.email_address = create_email_address()
+        self.state = FolderSyncState.objects.create(email_address=self.email_address, folder='INBOX', last_uid=10)
+        self.service = EmailSyncService()
+    
+    def store(self, messages):
+        """
+        Store a chunk of {uid: raw message} as fetched, None standing for a message that failed to parse
+        """
+        uids = sorted(messages)
+        response = {uid: {b'BODY[]': raw or b''} for uid, raw in messages.items()}
+        parsed_emails = [parse_message(raw, uid=uid) for uid, raw in messages.items() if raw]
+        return self.service.store_chunk(self.state, uids, parsed_emails, self.email_address, response=response)
+    
+    def test_long_headers_are_truncated(self):
+        message_id = '<' + 'x' * 300 + '@example.com>'
+        raw = build_message(11, subject='S' * 300, message_id=message_id)
+        
+        self.store({11: raw})
+        self.store({12: raw})
+        
+        email_obj = Email.objects.get()
+        self.assertEqual(len(email_obj.subject), 255)
+        self.assertEqual(email_obj.message_id, message_id[:255])
+        self.assertEqual(len(email_obj.thread.subject), 255)
+    
+    def test_messages_failing_to_store_are_retried(self):
+        ingest = EmailIngestService.ingest
+        
+        def failing_ingest(service, parsed_emails):
+            parsed_emails = list(parsed_emails)
+            if any(parsed.imap_uid == 12 for parsed in parsed_emails):
+                raise ValueError("Cannot store message 12")
+            return ingest(service, parsed_emails)
+        
+        with mock.patch.object(EmailIngestService, 'ingest', failing_ingest), \
+                self.assertLogs('superapp.apps.email.services.sync', 'ERROR'):
+            result = self.store({11: build_message(11), 12: build_message(12), 13: build_message(13)})
+        
+        self.assertEqual(result.failed, [12])
+        self.assertEqual(result.inserted, 2)
+        self.state.refresh_from_db()
+        self.assertEqual(self.state.last_uid, 13)
+        self.assertEqual(self.state.failed_uids, {'12': 1})
+        self.assertEqual(self.state.retry_uids(), [12])
+        
+        self.store({12: build_message(12)})
+        
+        self.state.refresh_from_db()
+        self.assertEqual(self.state.failed_uids, {})
+        self.assertEqual(Email.objects.count(), 3)
+    
+    def test_failed_messages_are_given_up(self):
+        for attempt in range(1, MAX_PARSE_ATTEMPTS):
+            self.store({11: None})
+            self.state.refresh_from_db()
+            self.assertEqual(self.state.failed_uids, {'11': attempt})
+        
+        with self.assertLogs('superapp.apps.email.services.sync', 'ERROR'):
+            self.store({11: None})
+        
+        self.state.refresh_from_db()
+        self.assertEqual(self.state.failed_uids, {})
+    
+    def test_expunged_messages_are_not_retried(self):
+        self.store({11: None})
+        
+        uids = [11]
+        self.service.store_chunk(self.state, uids, [], self.email_address, response={})
+        
+        self.state.refresh_from_db()
+        self.assertEqual(self.state.failed_uids, {})
+
+
+class FolderInfoTests(IngestTestCase):
+    """
+    Handing the history of newly found folders to the backfill
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.email_address = create_email_address()
+        self.service = EmailSyncService()
+    
+    def apply(self, state, uid_next=101):
+        return self.service.apply_folder_info(
+            state,
+            {b'UIDVALIDITY': 7, b'UIDNEXT': uid_next},
+            self.email_address
+        )
+    
+    def test_history_of_new_folders_is_backfilled(self):
+        state = FolderSyncState.objects.create(email_address=self.email_address, folder='INBOX')
+        
+        self.assertFalse(self.apply(state))
+        
+        state.refresh_from_db()
+        self.assertEqual(state.last_uid, 100)
+        self.assertEqual(state.backfill_uid, 101)
+        self.assertTrue(state.backfill_pending)
+    
+    @override_settings(EMAIL_SYNC_BACKFILL_HISTORY=False)
+    def test_history_is_synced_without_backfill(self):
+        state = FolderSyncState.objects.create(email_address=self.email_address, folder='INBOX')
+        
+        self.assertTrue(self.apply(state))
+        
+        state.refresh_from_db()
+        self.assertEqual(state.last_uid, 0)
+        self.assertIsNone(state.backfill_uid)
+    
+    def test_synced_folders_are_not_backfilled(self):
+        state = FolderSyncState.objects.create(
+            email_address=self.email_address,
+            folder='INBOX',
+            uid_validity=7,
+            last_uid=90
+        )
+        
+        self.assertTrue(self.apply(state))
+        self.assertIsNone(state.backfill_uid)
+
+
+class FakeFolderClient:
+    """
+    IMAP client serving one folder of {uid: raw message}
+    """
+    
+    def __init__(self, messages, uid_validity=1):
+        self.messages = messages
+        self.uid_validity = uid_validity
+        self.fetched = []
+    
+    def select_folder(self, folder, readonly=False):
+        return {b'UIDVALIDITY': self.uid_validity, b'UIDNEXT': max(self.messages, default=0) + 1}
+    
+    def search(self, criteria):
+        first = int(criteria[1].split(':')[0])
+        # "UID n:*" always matches the highest UID
+        return [uid for uid in sorted(self.messages) if uid >= first] or sorted(self.messages)[-1:]
+    
+    def fetch_chunks(self, client, uids, data_items, batch_size):
+        for offset in range(0, len(uids), batch_size):
+            chunk = uids[offset:offset + batch_size]
+            self.fetched.extend(chunk)
+            yield chunk, {
+                uid: {FIRST_CHUNK_KEY: self.messages[uid], b'RFC822.SIZE': len(self.messages[uid]), b'FLAGS': ()}
+                for uid in chunk
+                if uid in self.messages
+            }
+
+
+@override_settings(EMAIL_SYNC_BACKFILL_HISTORY=False)
+class SyncFolderTests(IngestTestCase):
+    """
+    Checkpoint and retries of messages that fail to parse across sync passes
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.email_address = create_email_address()
+        self.service = EmailSyncService(fetch_batch_size=2, headers_first=False)
+        self.client = FakeFolderClient({uid: build_message(uid) for uid in (1, 2, 3)})
+        # Messages whose body contains one of these fail to parse
+        self.broken = set()
+        
+        parse_raw = EmailSyncService._parse_raw
+        
+        def broken_parse_raw(service, raw_email):
+            if any(marker in raw_email for marker in self.broken):
+                return None, "Broken message"
+            return parse_raw(service, raw_email)
+        
+        patches = [
+            mock.patch.object(EmailSyncService, '_parse_raw', broken_parse_raw),
+            mock.patch('superapp.apps.email.services.sync.iter_fetch_chunks', self.client.fetch_chunks),
+            mock.patch.object(self.service.flag_service, 'sync_flags', return_value=0),
+            # Parse errors are expected
+            mock.patch('superapp.apps.email.services.sync.logger'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+    
+    def sync(self):
+        self.client.fetched = []
+        self.service.sync_folder(self.client, self.email_address, 'INBOX')
+        return FolderSyncState.objects.get(email_address=self.email_address, folder='INBOX')
+    
+    def test_failed_messages_are_fetched_again(self):
+        self.broken.add(b'Body 2')
+        
+        state = self.sync()
+        
+        self.assertEqual(state.last_uid, 3)
+        self.assertEqual(state.failed_uids, {'2': 1})
+        self.assertEqual(Email.objects.count(), 2)
+        
+        self.broken.clear()
+        self.client.messages[4] = build_message(4)
+        state = self.sync()
+        
+        self.assertEqual(self.client.fetched, [2, 4])
+        self.assertEqual(state.last_uid, 4)
+        self.assertEqual(state.failed_uids, {})
+        self.assertEqual(Email.objects.count(), 4)
+    
+    def test_failed_messages_are_given_up(self):
+        self.broken.add(b'Body 2')
+        
+        for attempt in range(MAX_PARSE_ATTEMPTS):
+            state = self.sync()
+        
+        self.assertEqual(state.failed_uids, {})
+        self.assertEqual(self.sync().last_uid, 3)
+        self.assertEqual(self.client.fetched, [])
+    
+    def test_uidvalidity_change_forgets_failed_messages(self):
+        self.broken.add(b'Body 2')
+        self.sync()
+        
+        self.broken.clear()
+        self.client.uid_validity = 2
+        state = self.sync()
+        
+        self.assertEqual(self.client.fetched, [1, 2, 3])
+        self.assertEqual(state.failed_uids, {})
+        self.assertEqual(Email.objects.count(), 3)
+        self.assertEqual(set(Email.objects.values_list('imap_uid', flat=True)), {1, 2, 3})
@@ -0,0 +1,102 @@
+from superapp.apps.email.models import Email, Thread, ThreadReference
+from superapp.apps.email.services.sync import EmailSyncService
+from superapp.apps.email.services.threads import EmailThreadingService
+from superapp.apps.email.tests.helpers import IngestTestCase, build_message, create_email_address, parse_message
+
+
+def message_id(number):
+    return f'<message{number}@example.com>'
+
+
+class BuildTreesTests(IngestTestCase):
+    """
+    JWZ trees of a batch
+    """
+    
+    def build(self, *raw_messages):
+        parsed_emails = [parse_message(raw) for raw in raw_messages]
+        return EmailThreadingService(create_email_address()).build_trees(parsed_emails)
+    
+    def test_replies_before_their_parent_form_one_tree(self):
+        roots = self.build(
+            build_message(3, references=[message_id(1), message_id(2)]),
+            build_message(1),
+            build_message(2, references=[message_id(1)])
+        )
+        
+        self.assertEqual(len(roots), 1)
+        root = roots[0]
+        self.assertEqual((root.message_id, root.messages), (message_id(1), [1]))
+        child = root.children[0]
+        self.assertEqual((child.message_id, child.messages), (message_id(2), [2]))
+        self.assertEqual([grandchild.messages for grandchild in child.children], [[0]])
+    
+    def test_missing_parents_are_placeholders(self):
+        roots = self.build(build_message(2, references=[message_id(1)]), build_message(3, references=[message_id(1)]))
+        
+        self.assertEqual(len(roots), 1)
+        self.assertEqual((roots[0].message_id, roots[0].messages), (message_id(1), []))
+        self.assertEqual(sorted(child.messages for child in roots[0].children), [[0], [1]])
+    
+    def test_reference_loops_are_broken(self):
+        roots = self.build(
+            build_message(1, references=[message_id(2)]),
+            build_message(2, references=[message_id(1)])
+        )
+        
+        self.assertEqual(len(roots), 1)
+        self.assertEqual(sorted(index for container in roots[0].walk() for index in container.messages), [0, 1])
+
+
+class ThreadingTests(IngestTestCase):
+    """
+    Thread resolution of stored emails
+    """
+    
+    def setUp(self):
+        super().setUp()
+        self.email_address = create_email_address()
+        self.service = EmailSyncService()
+    
+    def store(self, *raw_messages):
+        parsed_emails = [parse_message(raw) for raw in raw_messages]
+        return self.service.store_emails(parsed_emails, self.email_address)
+    
+    def thread_of(self, number):
+        return Email.objects.get(message_id=message_id(number)).thread_id
+    
+    def test_long_message_ids_are_found_again(self):
+        long_id = '<' + 'x' * 300 + '@example.com>'
+        self.store(build_message(1, message_id=long_id))
+        self.clear_caches()
+        
+        self.store(build_message(2, references=[long_id]))
+        
+        self.assertEqual(Thread.objects.count(), 1)
+        self.assertEqual(ThreadReference.objects.get(message_id=long_id[:255]).thread_id, self.thread_of(2))
+    
+    def test_parent_after_reply_joins_its_thread(self):
+        self.store(build_message(2, references=[message_id(1)]))
+        self.store(build_message(1))
+        
+        self.assertEqual(Thread.objects.count(), 1)
+        self.assertEqual(self.thread_of(1), self.thread_of(2))
+    
+    def test_threads_joined_by_a_reply_are_merged(self):
+        self.store(build_message(1))
+        self.store(build_message(2, subject='Other'))
+        self.store(build_message(4, references=[message_id(2)]))
+        first, second = self.thread_of(1), self.thread_of(2)
+        self.assertNotEqual(first, second)
+        
+        self.store(build_message(3, references=[message_id(1), message_id(2)]))
+        
+        self.assertEqual(list(Thread.objects.values_list('id', flat=True)), [first])
+        self.assertEqual({self.thread_of(number) for number in (1, 2, 3, 4)}, {first})
+        self.assertEqual(set(Thread.objects.get().participants), {'me@example.com', 'alice@example.com'})
+        # Message-IDs of the merged thread that the batch did not mention follow it
+        self.assertEqual(ThreadReference.objects.get(message_id=message_id(4)).thread_id, first)
+        
+        self.clear_caches()
+        self.store(build_message(5, references=[message_id(4)]))
+        self.assertEqual(self.thread_of(5), first)
@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase
+from superapp.apps.email.utils import is_reply_subject, normalize_subject, subject_hash
+
+
+class SubjectTests(SimpleTestCase):
+    """
+    Normalization of subjects for threading
+    """
+    
+    def test_normalize_subject(self):
+        self.assertEqual(normalize_subject('Re: Fwd: Quarterly  report'), 'quarterly report')
+        self.assertEqual(normalize_subject('AW[2]: WG: Termin'), 'termin')
+        self.assertEqual(normalize_subject('RE : re(3)：Hello'), 'hello')
+        self.assertEqual(normalize_subject(None), '')
+    
+    def test_keeps_words_starting_like_prefixes(self):
+        self.assertEqual(normalize_subject('Review: budget'), 'review: budget')
+        self.assertEqual(normalize_subject('Report for Q3'), 'report for q3')
+    
+    def test_is_reply_subject(self):
+        self.assertTrue(is_reply_subject('Re: Hello'))
+        self.assertTrue(is_reply_subject('fwd:Hello'))
+        self.assertFalse(is_reply_subject('Hello'))
+        self.assertFalse(is_reply_subject(None))
+    
+    def test_subject_hash(self):
+        self.assertEqual(subject_hash('Re: Hello  World'), subject_hash('hello world'))
+        self.assertNotEqual(subject_hash('Hello'), subject_hash('Goodbye'))
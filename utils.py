@@ -1,12 +1,23 @@
+import hashlib
 import re
-from html import unescape
-from bs4 import BeautifulSoup
+
+# Reply and forward prefixes of common clients and languages, with optional counters like "Re[2]:"
+SUBJECT_PREFIX_RE = re.compile(
+    r'^\s*(?:(?:re|fw|fwd|aw|wg|sv|vs|antw|doorst|tr|rif|r|enc|odp|res|rv)\s*(?:\[\d+\]|\(\d+\))?\s*[:\uff1a]\s*)+',
+    re.IGNORECASE
+)
+
+# Length of the fields storing header values such as subjects and Message-IDs
+HEADER_FIELD_LENGTH = 255
 
 
 def html_to_text(html_content):
     """
     Convert HTML content to plain text
     
+    The conversion runs through the backend set in EMAIL_HTML_TO_TEXT_BACKEND
+    and is memoized by content hash.
+    
     Args:
         html_content: HTML content to convert
         
@@ -16,24 +27,56 @@ def html_to_text(html_content):
     if not html_content:
         return ""
     
-    # Parse the HTML
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Replace <br> and <p> tags with newlines
-    for tag in soup.find_all(['br', 'p', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-        tag.append('\n')
+    from superapp.apps.email.services.html_text import html_text_converter
+    return html_text_converter.convert(html_content)
+
+
+def truncate_header(value):
+    """
+    Cut a header value to the length of the fields storing it
     
-    # Replace <li> tags with "* " prefix and newline
-    for li in soup.find_all('li'):
-        li.insert_before('* ')
-        li.append('\n')
+    Args:
+        value: Header value, e.g. a subject or a Message-ID
+        
+    Returns:
+        The value, shortened to HEADER_FIELD_LENGTH characters
+    """
+    return (value or '')[:HEADER_FIELD_LENGTH]
+
+
+def normalize_subject(subject):
+    """
+    Reduce a subject to the form shared by all messages of a conversation
     
-    # Get the text
-    text = soup.get_text()
+    Args:
+        subject: Subject header value
+        
+    Returns:
+        Subject without reply and forward prefixes, casefolded and with
+        collapsed whitespace
+    """
+    subject = SUBJECT_PREFIX_RE.sub('', subject or '')
+    return ' '.join(subject.split()).casefold()
+
+
+def is_reply_subject(subject):
+    """
+    Whether a subject carries a reply or forward prefix
     
-    # Clean up the text
-    text = re.sub(r'\n{3,}', '\n\n', text)  # Replace multiple newlines with double newlines
-    text = re.sub(r' {2,}', ' ', text)      # Replace multiple spaces with single space
-    text = unescape(text)                   # Unescape HTML entities
+    Args:
+        subject: Subject header value
+    """
+    return bool(SUBJECT_PREFIX_RE.match(subject or ''))
+
+
+def subject_hash(subject):
+    """
+    Hash of the normalized subject, as indexed on threads
     
-    return text.strip()
+    Args:
+        subject: Subject header value
+        
+    Returns:
+        Hex SHA-256 of the normalized subject
+    """
+    return hashlib.sha256(normalize_subject(subject).encode('utf-8')).hexdigest()